@@ -0,0 +1,10 @@
+"""
+This package contains benchmarks of SID API and its library.
+
+Benchmarks are running against a fake Gitolite remote made of local bare
+repositories (see benchmarks.remote) and are writing their results as JSON.
+"""
+
+from .remote import FakeGitolite
+from .stats import percentile, summarize, fit_exponent
+from .fixtures import FixtureGenerator, FixtureParameters, generate
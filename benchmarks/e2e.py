@@ -0,0 +1,398 @@
+"""
+End-to-end benchmark of SID API.
+
+A fake Gitolite remote is provisioned in a temporary directory, the API is
+started in-process (see sid.api.http_server.create_app) and each route is
+driven by concurrent clients. Latency percentiles and throughput of each
+endpoint are written as JSON.
+
+Usage:
+python -m benchmarks.e2e --concurrency 8 --requests 100 --output e2e.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import jwt
+import pygit2
+import tornado
+from Crypto.PublicKey import RSA
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from sid.api.http_server import create_app
+from benchmarks.fixtures import generate
+from benchmarks.stats import summarize
+
+__audience__ = 'sid'
+__request_timeout__ = 300
+
+class Scenario(object):
+    """
+    A benchmarked endpoint.
+    """
+
+    def __init__(self, name, factory, expected=(200,), callback=None):
+        """
+        Construct a scenario.
+
+        Arguments:
+        name -- Scenario name used in results.
+        factory -- Function(index, user) returning the request to send as a
+                   tuple (method, path, body) where body is JSON serializable
+                   or None.
+        expected -- Expected status codes; other ones are counted as errors.
+        callback -- Function(user, response) called with each response (optional)
+        """
+        self.name = name
+        self.factory = factory
+        self.expected = expected
+        self.callback = callback
+
+class Client(object):
+    """
+    HTTP client of the benchmarked API authenticated with generated tokens.
+    """
+
+    def __init__(self, base_url, private_key):
+        """
+        Construct a client.
+
+        Arguments:
+        base_url -- API base URL.
+        private_key -- RSA private key used to sign tokens.
+        """
+        self.base_url = base_url
+        self.private_key = private_key
+        self.http = AsyncHTTPClient(max_clients=1024)
+        self.tokens = {}
+
+    def get_token(self, user):
+        """
+        Return a signed token of given user.
+        """
+        if user not in self.tokens:
+            self.tokens[user] = jwt.encode({
+                'user': user,
+                'aud': __audience__,
+                'exp': int(time.time()) + 86400
+            }, self.private_key, algorithm='RS256')
+        return self.tokens[user]
+
+    @gen.coroutine
+    def fetch(self, user, method, path, body=None):
+        """
+        Send a request and return its response (errors are not raised).
+
+        Arguments:
+        user -- User sending the request.
+        method -- HTTP method.
+        path -- Request path.
+        body -- JSON serializable body or raw string (optional)
+        """
+        headers = {
+            'Authorization': 'Bearer %s' % self.get_token(user),
+            'Accept': '*/*'
+        }
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            body = body if isinstance(body, basestring) else json.dumps(body)
+        elif method in ('POST', 'PUT', 'PATCH'):
+            body = ''
+
+        response = yield self.http.fetch(HTTPRequest(
+            self.base_url + path,
+            method=method,
+            headers=headers,
+            body=body,
+            request_timeout=__request_timeout__
+        ), raise_error=False)
+        raise gen.Return(response)
+
+@gen.coroutine
+def run_scenario(client, scenario, users, requests, concurrency, first=0):
+    """
+    Send requests of a scenario with concurrent clients.
+
+    Arguments:
+    client -- API client.
+    scenario -- Benchmarked scenario.
+    users -- Users sending requests; client N is acting as users[N % len(users)]
+    requests -- Number of requests.
+    concurrency -- Number of concurrent clients.
+    first -- Index of the first request (default: 0)
+
+    Returns:
+    Summary of the run (see benchmarks.stats.summarize) with status codes.
+    """
+    indexes = iter(range(first, first + requests))
+    latencies = []
+    codes = {}
+    errors = [0]
+
+    @gen.coroutine
+    def worker(user):
+        """ Send requests until every index is consumed. """
+        for index in indexes:
+            method, path, body = scenario.factory(index, user)
+            started = time.time()
+            response = yield client.fetch(user, method, path, body)
+            latencies.append(time.time() - started)
+
+            if scenario.callback is not None:
+                scenario.callback(user, response)
+
+            codes[str(response.code)] = codes.get(str(response.code), 0) + 1
+            if response.code not in scenario.expected:
+                errors[0] += 1
+                logging.debug('%s %s: %d %s', method, path, response.code, response.body)
+
+    started = time.time()
+    yield [worker(users[number % len(users)]) for number in range(concurrency)]
+    summary = summarize(latencies, time.time() - started, errors[0])
+    summary['codes'] = codes
+    raise gen.Return(summary)
+
+def provision(directory, options):
+    """
+    Provision fake remote repositories (see benchmarks.fixtures)
+
+    Arguments:
+    directory -- Directory of the fake remote.
+    options -- Command line options.
+
+    Returns:
+    A tuple (remote, dictionnary describing provisioned data)
+    """
+    remote, data = generate(
+        directory,
+        options.seed,
+        repositories=options.projects,
+        templates=options.templates,
+        users=options.users,
+        tags=options.tags,
+        settings=options.settings
+    )
+    data['deployments'] = dict((user, []) for user in data['users'])
+    return remote, data
+
+def build_scenarios(data, run_id):
+    """
+    Build the list of benchmarked scenarios.
+
+    Scenarios are run in order; some of them are using resources created by
+    previous ones (created projects, queued deployments).
+
+    Arguments:
+    data -- Provisioned data (see provision)
+    run_id -- Unique identifier of the run used to name created resources.
+    """
+    projects = data['projects']
+    templates = data['templates']
+    versions = data['versions']
+    settings = data['settings']
+    deployments = data['deployments']
+    rules = [{'perm': 'RW', 'users': ['@all']}]
+
+    def created(index):
+        """ Name of a project created by the benchmark. """
+        return 'bench-%s-%d' % (run_id, index)
+
+    def pick(items, index):
+        """ Pick an item for given request index. """
+        return items[index % len(items)]
+
+    def deployed(user, response):
+        """ Remember location of queued deployments to poll their state. """
+        if response.code == 202:
+            deployments[user].append(response.headers['Location'])
+
+    def deployment(index, user):
+        """ Location of a deployment queued by given user. """
+        if not deployments[user]:
+            return '/projects/%s/deployments/%s' % (projects[0], '0' * 32)
+        return pick(deployments[user], index)
+
+    return [
+        Scenario('GET /version',
+                 lambda index, user: ('GET', '/version', None)),
+        Scenario('GET /projects',
+                 lambda index, user: ('GET', '/projects', None)),
+        Scenario('GET /projects/<name>',
+                 lambda index, user: ('GET', '/projects/%s' % pick(projects, index), None)),
+        Scenario('POST /projects',
+                 lambda index, user: ('POST', '/projects', {'name': created(index), 'rules': rules}),
+                 (200, 201)),
+        Scenario('PUT /projects/<name>',
+                 lambda index, user: ('PUT', '/projects/%s' % created(index),
+                                      {'name': created(index), 'rules': rules})),
+        Scenario('PATCH /projects/<name>',
+                 lambda index, user: ('PATCH', '/projects/%s' % created(index),
+                                      [{'op': 'replace', 'path': '/rules/0', 'value': rules[0]}])),
+        Scenario('DELETE /projects/<name>',
+                 lambda index, user: ('DELETE', '/projects/%s' % created(index), None),
+                 (200, 204)),
+        Scenario('GET /templates',
+                 lambda index, user: ('GET', '/templates', None)),
+        Scenario('GET /templates/<name>',
+                 lambda index, user: ('GET', '/templates/%s' % pick(templates, index), None)),
+        Scenario('GET /projects/<name>/settings',
+                 lambda index, user: ('GET', '/projects/%s/settings' % pick(projects, index), None)),
+        Scenario('GET /projects/<name>/settings/<path>',
+                 lambda index, user: ('GET', '/projects/%s/settings/%s' % (
+                     pick(projects, index), pick(settings, index)), None)),
+        Scenario('PUT /projects/<name>/settings/<path>',
+                 lambda index, user: ('PUT', '/projects/%s/settings/%s' % (
+                     pick(projects, index), pick(settings, index)), {'name': user, 'value': index})),
+        Scenario('PUT /projects/<name>/template',
+                 lambda index, user: ('PUT', '/projects/%s/template' % pick(projects, index), {
+                     'name': templates[0],
+                     'version': pick(versions, index),
+                     'data': {'name': pick(projects, index), 'customer': 'example.com'}
+                 }), (200, 202, 204)),
+        Scenario('GET /projects/<name>/template',
+                 lambda index, user: ('GET', '/projects/%s/template' % pick(projects, index), None)),
+        Scenario('PUT /projects/<name>/deploy',
+                 lambda index, user: ('PUT', '/projects/%s/deploy' % pick(projects, index), None),
+                 (202,), deployed),
+        Scenario('GET /projects/<name>/deployments/<id>',
+                 lambda index, user: ('GET', deployment(index, user), None)),
+        Scenario('POST /deployments',
+                 lambda index, user: ('POST', '/deployments', {'projects': projects[:4]})),
+        Scenario('GET /metrics',
+                 lambda index, user: ('GET', '/metrics', None)),
+    ]
+
+def start_api(workspace_dir, remote_url, app_settings=None):
+    """
+    Start the API in-process on a random port.
+
+    Arguments:
+    workspace_dir -- Workspace directory.
+    remote_url -- Base remote URL (see benchmarks.remote.FakeGitolite.url)
+    app_settings -- Additional 'app' settings (optional)
+
+    Returns:
+    A tuple (HTTP server, client of the API)
+    """
+    settings = dict(app_settings or {}, workspace_dir=workspace_dir, remote_url=remote_url)
+
+    # Authentication is made with a throw-away key pair
+    key = RSA.generate(2048)
+    app = create_app({
+        'app': settings,
+        'auth': {
+            'public_key': key.publickey().exportKey()
+        }
+    })
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    return server, Client('http://127.0.0.1:%d' % port, key.exportKey())
+
+@gen.coroutine
+def run(options):
+    """
+    Provision a fake remote, start the API and run every scenario.
+
+    Arguments:
+    options -- Command line options.
+
+    Returns:
+    Benchmark report.
+    """
+    directory = tempfile.mkdtemp(prefix='sid-bench-')
+    try:
+        remote, data = provision(os.path.join(directory, 'remote'), options)
+
+        server, client = start_api(os.path.join(directory, 'workspace'), remote.url, {
+            'max_deployments': str(options.concurrency),
+            'max_pending_deployments': str(options.requests)
+        })
+
+        scenarios = [
+            scenario for scenario in build_scenarios(data, int(time.time()))
+            if not options.only or scenario.name in options.only
+        ]
+
+        # Warm up requests are using first indexes (created project names, ...)
+        first = len(data['users']) if options.warmup else 0
+
+        results = {}
+        for scenario in scenarios:
+            # Clone repositories in workspace of each user before measuring
+            if options.warmup:
+                yield run_scenario(client, scenario, data['users'], first, first)
+
+            logging.info('Running %s', scenario.name)
+            results[scenario.name] = yield run_scenario(
+                client, scenario, data['users'], options.requests, options.concurrency, first
+            )
+
+        server.stop()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    raise gen.Return({
+        'benchmark': 'e2e',
+        'timestamp': int(time.time()),
+        'environment': {
+            'python': platform.python_version(),
+            'tornado': tornado.version,
+            'pygit2': pygit2.__version__,
+            'libgit2': pygit2.LIBGIT2_VERSION,
+            'platform': platform.platform()
+        },
+        'parameters': dict(
+            (name, getattr(options, name))
+            for name in ('seed', 'users', 'projects', 'templates', 'tags', 'settings', 'requests', 'concurrency',
+                         'warmup')
+        ),
+        'results': results
+    })
+
+def parse_arguments(argv):
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of SID API.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of generated fixtures.')
+    parser.add_argument('--users', type=int, default=4, help='Number of distinct users.')
+    parser.add_argument('--projects', type=int, default=8, help='Number of provisioned projects.')
+    parser.add_argument('--templates', type=int, default=2, help='Number of provisioned templates.')
+    parser.add_argument('--tags', type=int, default=5, help='Number of tags per template.')
+    parser.add_argument('--settings', type=int, default=4, help='Number of settings per project.')
+    parser.add_argument('--requests', type=int, default=50, help='Number of requests per endpoint.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent clients.')
+    parser.add_argument('--no-warmup', dest='warmup', action='store_false',
+                        help='Include first requests of each user (cold workspace) in results.')
+    parser.add_argument('--only', action='append', help='Only run given scenario (can be repeated).')
+    parser.add_argument('--output', help='Output file (default: standard output).')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run end-to-end benchmark from command line.
+    """
+    options = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    report = IOLoop.current().run_sync(lambda: run(options))
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+
+if __name__ == "__main__": # pragma: no cover
+    main()
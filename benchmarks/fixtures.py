@@ -0,0 +1,299 @@
+"""
+Synthetic large-scale fixtures.
+
+Builds a fake Gitolite remote (see benchmarks.remote) populated with
+generated data: a gitolite-admin repository with many repositories, rules,
+users and groups; project repositories with deep Whiriho catalogs, large
+settings and many files; templates with many tags. Generated data only
+depends on the seed, so two runs with the same parameters produce the same
+repositories (commit identifiers included).
+
+Usage:
+python -m benchmarks.fixtures --seed 42 --repositories 50000 --tags 5000 /tmp/remote
+"""
+
+import sys
+import json
+import random
+import logging
+import argparse
+from benchmarks.remote import FakeGitolite
+
+__permissions__ = ('R', 'RW', 'RW+')
+__timestamp__ = 1500000000
+
+class FixtureParameters(object): # pylint: disable=R0902,R0903
+    """
+    Sizes of generated fixtures.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Construct fixture parameters.
+
+        Keyword arguments:
+        repositories -- Repositories listed in gitolite.conf (default: 10)
+        projects -- Project repositories actually created, the first listed
+                    ones (default: all of them)
+        templates -- Number of templates (default: 2)
+        rules -- Rules per repository (default: 2)
+        users -- Number of users (default: 4)
+        groups -- Number of groups (default: 2)
+        tags -- Tags per template (default: 5)
+        settings -- Settings per project (default: 4)
+        depth -- Depth of settings paths in Whiriho catalog (default: 1)
+        keys -- Keys per settings level (default: 4)
+        nesting -- Nesting levels of settings data (default: 1)
+        files -- Additional files per project (default: 0)
+        file_format -- Format of settings: 'json' or 'yaml' (default: 'json')
+        """
+        self.repositories = kwargs.get('repositories', 10)
+        self.projects = kwargs.get('projects')
+        self.templates = kwargs.get('templates', 2)
+        self.rules = kwargs.get('rules', 2)
+        self.users = kwargs.get('users', 4)
+        self.groups = kwargs.get('groups', 2)
+        self.tags = kwargs.get('tags', 5)
+        self.settings = kwargs.get('settings', 4)
+        self.depth = kwargs.get('depth', 1)
+        self.keys = kwargs.get('keys', 4)
+        self.nesting = kwargs.get('nesting', 1)
+        self.files = kwargs.get('files', 0)
+        self.file_format = kwargs.get('file_format', 'json')
+
+    def to_dict(self):
+        """
+        Return parameters as a dictionnary.
+        """
+        return dict(self.__dict__)
+
+class FixtureGenerator(object):
+    """
+    Deterministic generator of SID fixtures.
+    """
+
+    def __init__(self, seed=0):
+        """
+        Construct a fixture generator.
+
+        Arguments:
+        seed -- Random seed.
+        """
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def users(count):
+        """
+        Generate user names.
+        """
+        return ['user-%d' % index for index in range(count)]
+
+    def groups(self, count, users):
+        """
+        Generate groups of users.
+
+        Returns:
+        Dictionnary of group name (with '@') -> members.
+        """
+        return dict(
+            ('@group-%d' % index, sorted(self.random.sample(users, self.random.randint(1, len(users)))))
+            for index in range(count)
+        ) if users else {}
+
+    def rules(self, count, principals):
+        """
+        Generate access rules.
+
+        Arguments:
+        count -- Number of rules.
+        principals -- Users and groups which can be granted.
+        """
+        return [{
+            'perm': self.random.choice(__permissions__),
+            'users': sorted(self.random.sample(principals, min(len(principals), self.random.randint(1, 3))))
+        } for _ in range(count)]
+
+    def access_rules(self, names, count, principals):
+        """
+        Generate rules of given repositories. Everybody must be able to use
+        generated repositories, so first rule is always granting '@all'.
+
+        Returns:
+        Dictionnary of repository name -> rules.
+        """
+        return dict(
+            (name, [{'perm': 'RW+', 'users': ['@all']}] + self.rules(count - 1, principals))
+            for name in names
+        )
+
+    def settings_paths(self, count, depth):
+        """
+        Generate settings paths of a catalog such as 'level-1/level-0/settings-3'.
+
+        Arguments:
+        count -- Number of settings.
+        depth -- Number of directories in each path.
+        """
+        paths = []
+        for index in range(count):
+            directories = ['level-%d-%d' % (level, self.random.randint(0, 3)) for level in range(depth)]
+            paths.append('/'.join(directories + ['settings-%d' % index]))
+        return paths
+
+    def settings_data(self, keys, nesting):
+        """
+        Generate settings data.
+
+        Arguments:
+        keys -- Number of keys per level.
+        nesting -- Number of nested levels.
+        """
+        data = {}
+        for index in range(keys):
+            if nesting > 1 and index % 2 == 0:
+                data['section_%d' % index] = self.settings_data(keys, nesting - 1)
+            else:
+                data['key_%d' % index] = self.value()
+        return data
+
+    def value(self):
+        """
+        Generate a scalar value.
+        """
+        kind = self.random.randint(0, 3)
+        if kind == 0:
+            return self.random.randint(0, 100000)
+        elif kind == 1:
+            return self.random.random() < 0.5
+        elif kind == 2:
+            return ['item-%d' % self.random.randint(0, 1000) for _ in range(self.random.randint(0, 5))]
+        return 'value-%08x' % self.random.getrandbits(32)
+
+    def files(self, count):
+        """
+        Generate project files spread in directories of 100 files.
+
+        Returns:
+        Dictionnary of path -> content.
+        """
+        return dict(
+            ('files/%03d/file-%d.txt' % (index // 100, index), 'content-%08x\n' % self.random.getrandbits(32))
+            for index in range(count)
+        )
+
+    @staticmethod
+    def versions(count):
+        """
+        Generate version tags in release order.
+        """
+        return ['releases/%d.%d.%d' % (index // 100, (index // 10) % 10, index % 10) for index in range(count)]
+
+    def build(self, remote, parameters):
+        """
+        Build fixtures in a fake Gitolite remote.
+
+        Arguments:
+        remote -- Fake Gitolite remote (see benchmarks.remote.FakeGitolite)
+        parameters -- Fixture sizes (see FixtureParameters)
+
+        Returns:
+        A dictionnary describing generated data (users, groups, projects,
+        templates, versions, settings paths)
+        """
+        users = self.users(parameters.users)
+        groups = self.groups(parameters.groups, users)
+
+        projects = ['project-%d' % index for index in range(parameters.repositories)]
+        templates = ['template-%d' % index for index in range(parameters.templates)]
+        versions = self.versions(parameters.tags)
+        settings = self.settings_paths(parameters.settings, parameters.depth)
+
+        logging.info('Generating gitolite-admin with %d repositories', len(projects) + len(templates))
+        remote.create_warehouse(self.access_rules(
+            ['projects/' + name for name in projects] + ['templates/' + name for name in templates],
+            parameters.rules,
+            users + sorted(groups) + ['@all']
+        ), groups)
+
+        populated = projects if parameters.projects is None else projects[:parameters.projects]
+        for project in populated:
+            logging.info('Generating project %s', project)
+            remote.create_project(
+                project,
+                dict((path, self.settings_data(parameters.keys, parameters.nesting)) for path in settings),
+                self.files(parameters.files),
+                parameters.file_format
+            )
+
+        for template in templates:
+            logging.info('Generating template %s with %d tags', template, len(versions))
+            remote.create_template(template, {'name': 'example', 'customer': 'example.com'}, versions)
+
+        return {
+            'seed': self.seed,
+            'parameters': parameters.to_dict(),
+            'url': remote.url,
+            'users': users,
+            'groups': groups,
+            'projects': populated,
+            'templates': templates,
+            'versions': versions,
+            'settings': settings
+        }
+
+def generate(directory, seed=0, **kwargs):
+    """
+    Generate fixtures in a new fake Gitolite remote.
+
+    Arguments:
+    directory -- Directory of the fake remote.
+    seed -- Random seed.
+
+    Keyword arguments: (see FixtureParameters)
+
+    Returns:
+    A tuple (remote, description of generated data)
+    """
+    remote = FakeGitolite(directory, timestamp=__timestamp__)
+    return remote, FixtureGenerator(seed).build(remote, FixtureParameters(**kwargs))
+
+def parse_arguments(argv):
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Generate SID fixtures in a fake Gitolite remote.')
+    parser.add_argument('directory', help='Directory of the fake remote.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    for name, help_text in (('repositories', 'Repositories listed in gitolite.conf.'),
+                            ('projects', 'Project repositories actually created.'),
+                            ('templates', 'Number of templates.'),
+                            ('rules', 'Rules per repository.'),
+                            ('users', 'Number of users.'),
+                            ('groups', 'Number of groups.'),
+                            ('tags', 'Tags per template.'),
+                            ('settings', 'Settings per project.'),
+                            ('depth', 'Depth of settings paths.'),
+                            ('keys', 'Keys per settings level.'),
+                            ('nesting', 'Nesting levels of settings.'),
+                            ('files', 'Additional files per project.')):
+        parser.add_argument('--' + name, type=int, help=help_text)
+    parser.add_argument('--format', dest='file_format', choices=('json', 'yaml'), help='Settings format.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Generate fixtures from command line and print their description.
+    """
+    options = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    parameters = dict(
+        (name, value) for name, value in vars(options).items()
+        if value is not None and name not in ('directory', 'seed')
+    )
+    _, description = generate(options.directory, options.seed, **parameters)
+    json.dump(description, sys.stdout, indent=2, sort_keys=True)
+
+if __name__ == "__main__": # pragma: no cover
+    main()
@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks of SID library hot paths.
+
+Each benchmark is parameterized by a data size (repositories in
+gitolite.conf, rules per repository, tags per template, files per project,
+...) and is run for several sizes. Results are scaling curves: timings per
+size along with the estimated scaling exponent (1.0 is linear).
+
+Usage:
+python -m benchmarks.micro --only encoder --sizes 10,100,1000 --output micro.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import collections
+import pygit2
+import pyolite2
+from sid.api.http import Encoder, parse_json_body
+from sid.api.handlers.settings import SettingsHandler
+from sid.api.schemas import PROJECT_SCHEMA
+from sid.lib.git import Repository, __tag_prefix__
+from sid.lib.template import Template
+from sid.lib.warehouse import Warehouse
+from benchmarks.stats import percentile, fit_exponent
+
+__min_batch_time__ = 0.05
+__default_repeat__ = 5
+
+BENCHMARKS = collections.OrderedDict()
+
+def benchmark(name, parameter, sizes):
+    """
+    Register a micro-benchmark.
+
+    Arguments:
+    name -- Benchmark name.
+    parameter -- Name of the size parameter.
+    sizes -- Default sizes.
+
+    The decorated function takes a size and a scratch directory and returns
+    the function to time (without arguments).
+    """
+    def _benchmark(setup): # pylint: disable=C0111
+        BENCHMARKS[name] = (parameter, tuple(sizes), setup)
+        return setup
+    return _benchmark
+
+def build_rules(count):
+    """
+    Build JSON patches adding given number of rules.
+    """
+    return [
+        {'op': 'add', 'path': '/rules/%d' % index, 'value': {'perm': 'RW', 'users': ['user-%d' % index]}}
+        for index in range(count)
+    ]
+
+def build_repository(directory, commits=1, files=1):
+    """
+    Build a Git repository with given number of commits and files.
+    """
+    repository = Repository(directory)
+    repository.initialize()
+    repository.set_default_signature('benchmark', 'benchmark@localhost')
+
+    for index in range(files):
+        with open(os.path.join(directory, 'file-%d.txt' % index), 'w') as output:
+            output.write('%d\n' % index)
+    repository.commit_all('Initial commit.')
+
+    for index in range(1, commits):
+        with open(os.path.join(directory, 'file-0.txt'), 'w') as output:
+            output.write('%d\n' % index)
+        repository.commit_all('Commit %d.' % index)
+
+    return repository
+
+class Request(object): # pylint: disable=R0903
+    """
+    Minimal request handler holding a body, as seen by parse_json_body.
+    """
+
+    def __init__(self, body):
+        """
+        Construct a request.
+
+        Arguments:
+        body -- Request body.
+        """
+        self.request = self
+        self.body = body
+
+@benchmark('warehouse_load', 'repositories', (10, 100, 1000, 10000))
+def bench_warehouse_load(size, directory):
+    """
+    Warehouse.load: parse gitolite.conf.
+    """
+    warehouse = Warehouse(directory)
+    os.makedirs(os.path.dirname(warehouse.conf_path))
+    with open(warehouse.conf_path, 'w') as conf:
+        for index in range(size):
+            conf.write('repo projects/project-%d\n    RW = user-%d\n    R = @all\n\n' % (index, index))
+
+    return lambda: Warehouse(directory).load()
+
+@benchmark('patch_pyolite_repo', 'rules', (1, 10, 100, 1000))
+def bench_patch_pyolite_repo(size, directory): # pylint: disable=W0613
+    """
+    Warehouse.patch_pyolite_repo: apply rule patches on a repository.
+    """
+    patches = build_rules(size)
+    return lambda: Warehouse.patch_pyolite_repo(pyolite2.Repository('projects/example'), patches)
+
+@benchmark('encoder', 'repositories', (10, 100, 1000, 10000))
+def bench_encoder(size, directory): # pylint: disable=W0613
+    """
+    Encoder.default: serialize repositories as listed by GET /projects.
+    """
+    repositories = []
+    for index in range(size):
+        repository = pyolite2.Repository('projects/project-%d' % index)
+        Warehouse.patch_pyolite_repo(repository, build_rules(2))
+        repositories.append(repository)
+
+    return lambda: json.dumps(repositories, cls=Encoder, sort_keys=True)
+
+@benchmark('parse_json_body', 'rules', (1, 10, 100, 1000))
+def bench_parse_json_body(size, directory): # pylint: disable=W0613
+    """
+    parse_json_body: parse and validate a project body.
+    """
+    request = Request(json.dumps({
+        'name': 'example',
+        'rules': [patch['value'] for patch in build_rules(size)]
+    }))
+    handler = parse_json_body(PROJECT_SCHEMA)(lambda *args, **kwargs: kwargs['json'])
+
+    return lambda: handler(request)
+
+@benchmark('template_validate', 'variables', (1, 10, 100, 1000))
+def bench_template_validate(size, directory):
+    """
+    Template.get_schema and Template.validate: validate template data.
+    """
+    with open(os.path.join(directory, 'cookiecutter.json'), 'w') as output:
+        json.dump(dict(('variable_%d' % index, 'default') for index in range(size)), output)
+
+    template = Template(directory)
+    template.initialize()
+    data = dict(('variable_%d' % index, 'value') for index in range(size))
+
+    return lambda: template.validate(data)
+
+@benchmark('template_versions', 'tags', (10, 100, 1000, 5000))
+def bench_template_versions(size, directory):
+    """
+    Template.get_versions: list tags of a template.
+    """
+    build_repository(directory)
+    template = Template(directory)
+    template.open()
+
+    target = template.repo.head.target
+    for index in range(size):
+        template.repo.create_reference('%sreleases/1.0.%d' % (__tag_prefix__, index), target)
+
+    return template.get_versions
+
+@benchmark('commit_all', 'files', (10, 100, 1000, 10000))
+def bench_commit_all(size, directory):
+    """
+    Repository.commit_all: commit a single change in a project.
+    """
+    repository = build_repository(directory, files=size)
+    counter = [0]
+
+    def commit():
+        """ Change a file and commit all. """
+        counter[0] += 1
+        with open(os.path.join(directory, 'file-0.txt'), 'w') as output:
+            output.write('%d\n' % counter[0])
+        repository.commit_all('Commit %d.' % counter[0])
+
+    return commit
+
+@benchmark('ahead_behind', 'commits', (10, 100, 1000, 10000))
+def bench_ahead_behind(size, directory):
+    """
+    Repository.ahead_behind: count local commits not pushed yet.
+    """
+    repository = build_repository(directory, commits=size)
+
+    # Remote branch points to the first commit
+    walker = repository.repo.walk(repository.repo.head.target, pygit2.GIT_SORT_REVERSE) # pylint: disable=E1101
+    repository.repo.create_reference('refs/remotes/origin/master', next(iter(walker)).id)
+
+    return lambda: repository.ahead_behind(fetch=False)
+
+@benchmark('format_message', 'patches', (10, 100, 1000, 10000))
+def bench_format_message(size, directory): # pylint: disable=W0613
+    """
+    SettingsHandler.format_message: format settings commit message.
+    """
+    operations = ('add', 'replace', 'remove')
+    patches = [
+        {'op': operations[index % 3], 'path': '/variable_%d' % index, 'value': index}
+        for index in range(size)
+    ]
+
+    return lambda: SettingsHandler.format_message('production', patches)
+
+def measure(func, repeat=__default_repeat__):
+    """
+    Time a function. Calls are batched so that each batch lasts at least
+    __min_batch_time__ seconds.
+
+    Arguments:
+    func -- Function to time.
+    repeat -- Number of measured batches.
+
+    Returns:
+    A dictionnary with number of calls per batch, best, median and worst
+    duration of a call.
+    """
+    number = 1
+    while True:
+        started = time.time()
+        for _ in range(number):
+            func()
+        if time.time() - started >= __min_batch_time__:
+            break
+        number *= 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.time()
+        for _ in range(number):
+            func()
+        timings.append((time.time() - started) / number)
+    timings.sort()
+
+    return {
+        'number': number,
+        'best': timings[0],
+        'median': percentile(timings, 50),
+        'worst': timings[-1]
+    }
+
+def run(names, sizes=None, repeat=__default_repeat__):
+    """
+    Run micro-benchmarks.
+
+    Arguments:
+    names -- Names of benchmarks to run.
+    sizes -- Sizes overriding default ones (optional)
+    repeat -- Number of measured batches per size.
+
+    Returns:
+    Dictionnary of benchmark name -> scaling curve.
+    """
+    results = collections.OrderedDict()
+
+    for name in names:
+        parameter, default_sizes, setup = BENCHMARKS[name]
+        points = []
+
+        for size in sizes or default_sizes:
+            directory = tempfile.mkdtemp(prefix='sid-micro-')
+            try:
+                logging.info('Running %s with %d %s', name, size, parameter)
+                point = measure(setup(size, directory), repeat)
+                point['size'] = size
+                points.append(point)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        results[name] = {
+            'parameter': parameter,
+            'points': points,
+            'exponent': fit_exponent([(item['size'], item['median']) for item in points])
+        }
+
+    return results
+
+def parse_arguments(argv):
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of SID library.')
+    parser.add_argument('--only', action='append', choices=list(BENCHMARKS),
+                        help='Only run given benchmark (can be repeated).')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                        help='Comma separated sizes overriding default ones.')
+    parser.add_argument('--repeat', type=int, default=__default_repeat__, help='Number of measured batches.')
+    parser.add_argument('--output', help='Output file (default: standard output).')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Run micro-benchmarks from command line.
+    """
+    options = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    report = {
+        'benchmark': 'micro',
+        'timestamp': int(time.time()),
+        'environment': {
+            'python': platform.python_version(),
+            'pygit2': pygit2.__version__,
+            'libgit2': pygit2.LIBGIT2_VERSION,
+            'platform': platform.platform()
+        },
+        'results': run(options.only or list(BENCHMARKS), options.sizes, options.repeat)
+    }
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+if __name__ == "__main__": # pragma: no cover
+    main()
@@ -0,0 +1,216 @@
+"""
+This module contains a fake Gitolite remote.
+
+Bare repositories are created in a local directory with the same layout as
+Gitolite ('gitolite-admin', 'projects/<name>', 'templates/<name>') and are
+served to the API over 'file://' URLs. Access rules written in
+'gitolite.conf' are listed by the API but not enforced.
+"""
+
+import os
+import json
+import pygit2
+from sid.lib.git import Repository, __tag_prefix__
+from sid.lib.warehouse import Warehouse
+
+try:
+    import yaml
+except ImportError: # pragma: no cover
+    yaml = None
+
+__admin_repository__ = u'gitolite-admin'
+__projects_prefix__ = u'projects/'
+__templates_prefix__ = u'templates/'
+__whiriho_catalog__ = u'whiriho.json'
+__cookiecutter_file__ = u'cookiecutter.json'
+__scratch_dir__ = u'.scratch'
+__admin_user__ = u'admin'
+
+class FakeGitolite(object):
+    """
+    Local directory of bare repositories acting as Gitolite server.
+    """
+
+    def __init__(self, directory, timestamp=None):
+        """
+        Construct a fake Gitolite remote.
+
+        Arguments:
+        directory -- Directory where bare repositories are created.
+        timestamp -- Time of every commit (default: current time). A fixed
+                     time makes commit identifiers reproducible.
+        """
+        self.directory = os.path.abspath(directory)
+        self.timestamp = timestamp
+
+    @property
+    def url(self):
+        """
+        Base remote URL (see 'remote_url' setting of the API)
+        """
+        return u'file://' + self.directory
+
+    def get_url(self, name):
+        """
+        Return URL of a repository.
+
+        Arguments:
+        name -- Repository name (such as 'projects/example')
+        """
+        return u'%s/%s' % (self.url, name)
+
+    def create_repository(self, name, local_class=Repository):
+        """
+        Create a bare repository and a local copy to populate it.
+
+        Arguments:
+        name -- Repository name.
+        local_class -- Class of the returned local copy.
+
+        Returns:
+        Local copy (not any commit yet) with 'origin' remote.
+        """
+        pygit2.init_repository(os.path.join(self.directory, name), bare=True)
+
+        local = local_class(os.path.join(self.directory, __scratch_dir__, name))
+        local.initialize()
+        local.set_default_signature(__admin_user__, u'%s@localhost' % __admin_user__)
+        if self.timestamp is not None:
+            local.sign = pygit2.Signature(__admin_user__, u'%s@localhost' % __admin_user__, self.timestamp, 0) # pylint: disable=E1101
+        local.set_remote(self.get_url(name), 'origin')
+        return local
+
+    @staticmethod
+    def commit_files(local, files, message):
+        """
+        Write files in a local copy and commit them.
+
+        Arguments:
+        local -- Local copy (see create_repository)
+        files -- Dictionnary of relative path -> content.
+        message -- Commit message.
+        """
+        for path, content in files.items():
+            full_path = os.path.join(local.path, path)
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            with open(full_path, 'w') as output:
+                output.write(content)
+
+        local.commit_all(message)
+
+    @staticmethod
+    def publish(local, tags=()):
+        """
+        Push 'master' branch and given tags of a local copy.
+
+        Arguments:
+        local -- Local copy (see create_repository)
+        tags -- Names of tags to push.
+        """
+        local.push('origin', 'master')
+
+        # Push tags by batches, a single refspec list may be huge
+        refspecs = ['%s%s:%s%s' % (__tag_prefix__, tag, __tag_prefix__, tag) for tag in tags]
+        for index in range(0, len(refspecs), 500):
+            local.get_remote('origin').push(refspecs[index:index + 500])
+
+    def create_warehouse(self, repositories, groups=None):
+        """
+        Create 'gitolite-admin' repository.
+
+        Arguments:
+        repositories -- Dictionnary of repository name -> list of rules,
+                        where a rule is {"perm": ..., "users": [...]}.
+        groups -- Dictionnary of group name (with '@') -> members (optional)
+        """
+        warehouse = self.create_repository(__admin_repository__, Warehouse)
+
+        os.makedirs(os.path.dirname(warehouse.conf_path))
+        with open(warehouse.conf_path, 'w') as conf:
+            for group in sorted(groups or {}):
+                conf.write('%s = %s\n' % (group, ' '.join(groups[group])))
+            conf.write('\nrepo %s\n    RW+ = %s\n' % (__admin_repository__, __admin_user__))
+        warehouse.load()
+
+        for name in sorted(repositories):
+            warehouse.create_repo(name, [
+                {'op': 'add', 'path': '/rules/%d' % index, 'value': rule}
+                for index, rule in enumerate(repositories[name])
+            ])
+
+        warehouse.save('Initialized fake Gitolite configuration.')
+        return warehouse
+
+    def create_project(self, name, settings, files=None, file_format='json'):
+        """
+        Create a project repository with a Whiriho catalog.
+
+        Arguments:
+        name -- Project name (without 'projects/' prefix)
+        settings -- Dictionnary of settings path -> JSON serializable data.
+        files -- Additional files, dictionnary of path -> content (optional)
+        file_format -- Format of settings files: 'json' or 'yaml'.
+        """
+        project = self.create_repository(__projects_prefix__ + name)
+
+        files = dict(files or {})
+        files[__whiriho_catalog__] = json.dumps(whiriho_catalog(settings, file_format), indent=2, sort_keys=True)
+        for path, data in settings.items():
+            files[settings_file(path, file_format)] = dump_settings(data, file_format)
+
+        FakeGitolite.commit_files(project, files, 'Initialized project \'%s\'.' % name)
+        FakeGitolite.publish(project)
+        return project
+
+    def create_template(self, name, variables, versions):
+        """
+        Create a Cookiecutter template repository with one commit and one
+        tag per version.
+
+        Arguments:
+        name -- Template name (without 'templates/' prefix)
+        variables -- Cookiecutter variables (name -> default value)
+        versions -- Ordered list of version tags.
+        """
+        template = self.create_repository(__templates_prefix__ + name)
+
+        for version in versions:
+            FakeGitolite.commit_files(template, {
+                __cookiecutter_file__: json.dumps(variables, indent=2, sort_keys=True),
+                u'{{cookiecutter.name}}/VERSION': version + '\n'
+            }, 'Release %s' % version)
+            template.repo.create_reference(__tag_prefix__ + version, template.repo.head.target)
+
+        FakeGitolite.publish(template, versions)
+        return template
+
+def settings_file(path, file_format='json'):
+    """
+    Return file where settings of given path are stored in a project.
+    """
+    return u'settings/%s.%s' % (path, file_format)
+
+def dump_settings(data, file_format='json'):
+    """
+    Serialize settings in given format ('json' or 'yaml').
+    """
+    if file_format == 'yaml':
+        assert yaml is not None, 'PyYAML is required to write YAML settings'
+        return yaml.safe_dump(data, default_flow_style=False)
+    return json.dumps(data, indent=2, sort_keys=True)
+
+def whiriho_catalog(settings, file_format='json'):
+    """
+    Build a Whiriho catalog listing given settings.
+
+    Arguments:
+    settings -- Iterable of settings paths.
+    file_format -- Format of settings files.
+    """
+    return {
+        'version': '1.0',
+        'catalog': dict(
+            (path, {'uri': settings_file(path, file_format), 'format': file_format}) for path in settings
+        )
+    }
@@ -0,0 +1,293 @@
+"""
+Replay of recorded traffic.
+
+Requests recorded by the API (see 'traffic_log_file' setting and
+sid.api.monitoring.log_traffic) are replayed against the API started
+in-process with a fake remote (see benchmarks.e2e.start_api), keeping the
+original inter-arrival times (optionally accelerated).
+
+Recorded names are anonymized: each distinct anonymized project, settings
+path, template or user is mapped to a generated one, so access patterns
+(such as many users hitting one project) are reproduced. Request bodies
+are not recorded and are synthesized with the recorded size.
+
+Usage:
+python -m benchmarks.replay --speed 2 --output replay.json traffic.log
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.web import URLSpec, RequestHandler
+from benchmarks.e2e import start_api
+from benchmarks.fixtures import generate
+from benchmarks.stats import summarize
+
+# Kind of the arguments of each replayed route
+ROUTES = {
+    r'/projects/(\S+)/settings/(\S+)$': ('project', 'settings'),
+    r'/projects/(\S+)/settings$': ('project',),
+    r'/projects/(\S+)/template$': ('project',),
+    r'/projects/(\S+)/deploy$': ('project',),
+    r'/projects/(\S+)/deployments/(\S+)$': ('project', 'deployment'),
+    r'/projects/(\S+)$': ('project',),
+    r'/projects$': (),
+    r'/deployments$': (),
+    r'/templates/(\S+)$': ('template',),
+    r'/templates$': (),
+    r'/version$': (),
+    r'/metrics$': ()
+}
+
+__max_projects__ = 50
+
+def load_traffic(path):
+    """
+    Load recorded requests of replayable routes, sorted by time.
+
+    Arguments:
+    path -- Traffic log file.
+    """
+    entries = []
+    with open(path, 'r') as traffic:
+        for line in traffic:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('route') in ROUTES and entry.get('user'):
+                entries.append(entry)
+
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+def count_tokens(entries, kind):
+    """
+    Count distinct anonymized values of a kind of argument.
+    """
+    tokens = set()
+    for entry in entries:
+        for arg_kind, arg in zip(ROUTES[entry['route']], entry['args']):
+            if arg_kind == kind:
+                tokens.add(arg)
+    return len(tokens)
+
+class Mapper(object):
+    """
+    Map anonymized values to generated ones, by order of appearance.
+    """
+
+    def __init__(self, data):
+        """
+        Construct a mapper.
+
+        Arguments:
+        data -- Generated fixtures (see benchmarks.fixtures.generate)
+        """
+        self.pools = {
+            'project': data['projects'],
+            'settings': data['settings'],
+            'template': data['templates']
+        }
+        self.mappings = {}
+
+    def get(self, kind, token):
+        """
+        Return generated value of an anonymized one.
+
+        Arguments:
+        kind -- Kind of value ('user', 'project', 'settings', 'template')
+        token -- Anonymized value.
+        """
+        mapping = self.mappings.setdefault(kind, {})
+        if token not in mapping:
+            if kind in self.pools:
+                mapping[token] = self.pools[kind][len(mapping) % len(self.pools[kind])]
+            else:
+                mapping[token] = '%s-%d' % (kind, len(mapping))
+        return mapping[token]
+
+def build_body(entry, values, data):
+    """
+    Synthesize body of a recorded request.
+
+    Arguments:
+    entry -- Recorded request.
+    values -- Mapped route arguments.
+    data -- Generated fixtures.
+    """
+    route, method = entry['route'], entry['method']
+    rules = [{'perm': 'RW+', 'users': ['@all']}]
+
+    if method == 'POST' and route == r'/projects$':
+        return {'name': 'replay-%d-%d' % (os.getpid(), int(entry['time'] * 1000)), 'rules': rules}
+    elif method == 'PUT' and route == r'/projects/(\S+)$':
+        return {'name': values[0], 'rules': rules}
+    elif method == 'PATCH' and route == r'/projects/(\S+)$':
+        return [{'op': 'replace', 'path': '/rules/0', 'value': rules[0]}]
+    elif method == 'PUT' and route == r'/projects/(\S+)/template$':
+        return {
+            'name': data['templates'][0],
+            'version': data['versions'][-1],
+            'data': {'name': values[0], 'customer': 'example.com'}
+        }
+    elif method == 'POST' and route == r'/deployments$':
+        # Approximate number of deployed projects from body size
+        count = max(1, (entry['body_size'] - 16) // 16)
+        return {'projects': data['projects'][:count]}
+    elif method in ('PUT', 'POST', 'PATCH'):
+        # Settings: pad data to recorded size
+        return {'padding': 'x' * max(0, entry['body_size'] - 16)}
+    return None
+
+@gen.coroutine
+def replay(client, entries, data, speed=1.0):
+    """
+    Replay recorded requests with their original inter-arrival times.
+
+    Arguments:
+    client -- API client (see benchmarks.e2e.Client)
+    entries -- Recorded requests (see load_traffic)
+    data -- Generated fixtures.
+    speed -- Speed factor (2.0 replays twice faster)
+
+    Returns:
+    Per route results with replayed and original latencies, and scheduling lag.
+    """
+    io_loop = IOLoop.current()
+    mapper = Mapper(data)
+    deployments = {}
+    samples = {}
+    lags = []
+
+    @gen.coroutine
+    def send(entry):
+        """ Send a recorded request and record its latency. """
+        user = mapper.get('user', entry['user'])
+        values = []
+        for kind, arg in zip(ROUTES[entry['route']], entry['args']):
+            if kind == 'deployment':
+                # Deployment identifiers can't be mapped, poll a replayed one
+                values.append(deployments.get(user, '0' * 32))
+            else:
+                values.append(mapper.get(kind, arg))
+
+        path = URLSpec(entry['route'], RequestHandler).reverse(*values)
+        started = time.time()
+        response = yield client.fetch(user, entry['method'], path, build_body(entry, values, data))
+        latency = time.time() - started
+
+        if response.code == 202 and 'Location' in response.headers and entry['route'].endswith('/deploy$'):
+            deployments[user] = response.headers['Location'].rsplit('/', 1)[-1]
+
+        key = '%s %s' % (entry['method'], entry['route'])
+        sample = samples.setdefault(key, {'latencies': [], 'original': [], 'codes': {}, 'errors': 0})
+        sample['latencies'].append(latency)
+        sample['original'].append(entry['duration'])
+        sample['codes'][str(response.code)] = sample['codes'].get(str(response.code), 0) + 1
+        if response.code != entry['status']:
+            sample['errors'] += 1
+
+    first = entries[0]['time']
+    started = io_loop.time()
+    requests = []
+    for entry in entries:
+        deadline = started + (entry['time'] - first) / speed
+        if deadline > io_loop.time():
+            yield gen.sleep(deadline - io_loop.time())
+        lags.append(io_loop.time() - deadline)
+        requests.append(send(entry))
+    yield requests
+    elapsed = io_loop.time() - started
+
+    results = {}
+    for key, sample in samples.items():
+        results[key] = summarize(sample['latencies'], elapsed, sample['errors'])
+        results[key]['codes'] = sample['codes']
+        results[key]['original'] = summarize(sample['original'], (entries[-1]['time'] - first) or 1.0)
+
+    raise gen.Return({
+        'routes': results,
+        'lag': summarize(lags, elapsed),
+        'elapsed': elapsed
+    })
+
+@gen.coroutine
+def run(options):
+    """
+    Generate fixtures matching recorded traffic, start the API and replay it.
+
+    Arguments:
+    options -- Command line options.
+
+    Returns:
+    Replay report.
+    """
+    entries = load_traffic(options.traffic)
+    if not entries:
+        raise gen.Return({'benchmark': 'replay', 'requests': 0})
+
+    directory = tempfile.mkdtemp(prefix='sid-replay-')
+    try:
+        remote, data = generate(
+            os.path.join(directory, 'remote'),
+            options.seed,
+            repositories=max(1, min(options.max_projects, count_tokens(entries, 'project'))),
+            templates=max(1, count_tokens(entries, 'template')),
+            settings=max(1, count_tokens(entries, 'settings'))
+        )
+        server, client = start_api(os.path.join(directory, 'workspace'), remote.url)
+
+        logging.info('Replaying %d requests at %.1fx', len(entries), options.speed)
+        results = yield replay(client, entries, data, options.speed)
+
+        server.stop()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    results.update({
+        'benchmark': 'replay',
+        'timestamp': int(time.time()),
+        'requests': len(entries),
+        'speed': options.speed,
+        'seed': options.seed
+    })
+    raise gen.Return(results)
+
+def parse_arguments(argv):
+    """
+    Parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Replay recorded traffic against SID API.')
+    parser.add_argument('traffic', help='Traffic log file (JSON lines).')
+    parser.add_argument('--speed', type=float, default=1.0, help='Speed factor (default: 1.0).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of generated fixtures.')
+    parser.add_argument('--max-projects', type=int, default=__max_projects__,
+                        help='Maximum number of generated projects.')
+    parser.add_argument('--output', help='Output file (default: standard output).')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Replay traffic from command line.
+    """
+    options = parse_arguments(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    report = IOLoop.current().run_sync(lambda: run(options))
+
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+
+if __name__ == "__main__": # pragma: no cover
+    main()
@@ -0,0 +1,76 @@
+"""
+This module contains helpers to summarize benchmark samples.
+"""
+
+import math
+
+__percentiles__ = (50, 95, 99)
+
+def percentile(samples, rank):
+    """
+    Return percentile of sorted samples (linear interpolation between
+    closest ranks).
+
+    Arguments:
+    samples -- Sorted list of values.
+    rank -- Percentile rank (0-100)
+    """
+    if not samples:
+        return None
+
+    position = (len(samples) - 1) * rank / 100.0
+    lower = int(math.floor(position))
+    upper = int(math.ceil(position))
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+def summarize(latencies, elapsed, errors=0):
+    """
+    Summarize latencies of a benchmark run.
+
+    Arguments:
+    latencies -- Latency of each request in seconds.
+    elapsed -- Wall clock duration of the run in seconds.
+    errors -- Number of unexpected responses.
+
+    Returns:
+    A dictionnary with count, errors, throughput (requests per second), mean,
+    min, max and p50/p95/p99 latencies.
+    """
+    samples = sorted(latencies)
+
+    summary = {
+        'count': len(samples),
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': len(samples) / elapsed if elapsed > 0 else None,
+        'mean': sum(samples) / len(samples) if samples else None,
+        'min': samples[0] if samples else None,
+        'max': samples[-1] if samples else None
+    }
+    for rank in __percentiles__:
+        summary['p%d' % rank] = percentile(samples, rank)
+
+    return summary
+
+def fit_exponent(points):
+    """
+    Estimate how durations scale with size: slope of the least squares fit
+    in log-log space (~0 constant, ~1 linear, ~2 quadratic).
+
+    Arguments:
+    points -- List of (size, duration) tuples.
+
+    Returns:
+    Estimated exponent or None if there is not enough points.
+    """
+    points = [(math.log(size), math.log(duration)) for size, duration in points if size > 0 and duration > 0]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
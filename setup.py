@@ -19,5 +19,5 @@ setup(
     author_email='rme@escaux.com',
     url='',
     license=PROJECT_LICENSE,
-    packages=find_packages(exclude=('tests', 'docs'))
+    packages=find_packages(exclude=('tests', 'docs', 'benchmarks', 'benchmarks.*'))
 )
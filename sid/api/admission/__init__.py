@@ -0,0 +1,253 @@
+"""
+This module contains the admission control of API workers.
+
+Every worker bounds the number of requests it processes at the same time,
+with separate budgets for read and write requests. Requests beyond a budget
+wait in a short bounded queue; they are rejected as soon as the queue is
+full or when they waited too long, so a burst of slow requests doesn't make
+every queued request time out together.
+
+Clients are identified by their token: a single client (such as a CI
+token) can only hold a share of a budget, and queued requests are admitted
+in turn per client rather than in arrival order.
+
+A request holds its slot from its admission until it's finished. Handlers
+yielding to executors (warehouse saves, template installations, previews,
+bulk deployments) let the IOLoop start other requests meanwhile: budgets
+bound how many of them a worker processes, and how many a client holds.
+"""
+
+import math
+import hashlib
+import collections
+from datetime import timedelta
+from tornado import gen
+from tornado.concurrent import Future
+
+READ = u'read'
+WRITE = u'write'
+
+__read_methods__ = ('GET', 'HEAD', 'OPTIONS')
+
+class AdmissionRejectedException(Exception):
+    """
+    Exception raised when a request is not admitted.
+    """
+
+    def __init__(self, message, retry_after):
+        """
+        Construct an AdmissionRejectedException.
+
+        Arguments:
+        message -- Error message.
+        retry_after -- Suggested delay before retrying, in seconds.
+        """
+        super(AdmissionRejectedException, self).__init__(message)
+        self.retry_after = retry_after
+
+class Budget(object):
+    """
+    Bounded number of requests processed at the same time, shared fairly
+    between clients.
+    """
+
+    def __init__(self, name, limit, max_queued, client_share):
+        """
+        Construct a budget.
+
+        Arguments:
+        name -- Budget name.
+        limit -- Maximum number of requests processed at the same time.
+        max_queued -- Maximum number of waiting requests.
+        client_share -- Maximum share of the limit used by a single client.
+        """
+        self.name = name
+        self.limit = limit
+        self.max_queued = max_queued
+        self.max_per_client = max(1, int(math.ceil(limit * client_share)))
+        self.in_flight = 0
+        self.clients = collections.Counter()
+        self.waiters = collections.OrderedDict()
+        self.queued = 0
+
+    def can_acquire(self, client):
+        """
+        Return True if a request of given client can be processed now.
+        """
+        return self.in_flight < self.limit and self.clients[client] < self.max_per_client
+
+    def acquire(self, client):
+        """
+        Take a slot for given client.
+        """
+        self.in_flight += 1
+        self.clients[client] += 1
+
+    def release(self, client):
+        """
+        Give back a slot of given client and admit next waiting request.
+        Clients are served in turn (the served client goes back at the end).
+        """
+        self.in_flight -= 1
+        self.clients[client] -= 1
+        if self.clients[client] <= 0:
+            del self.clients[client]
+
+        for waiting_client in list(self.waiters):
+            if not self.can_acquire(waiting_client):
+                continue
+
+            future = self.waiters[waiting_client].popleft()
+            self.queued -= 1
+            if self.waiters[waiting_client]:
+                # Move client at the end of the turn
+                self.waiters[waiting_client] = self.waiters.pop(waiting_client)
+            else:
+                del self.waiters[waiting_client]
+
+            self.acquire(waiting_client)
+            future.set_result(True)
+            break
+
+    def enqueue(self, client):
+        """
+        Queue a request of given client.
+
+        Returns:
+        A future resolved when the request is admitted.
+        """
+        future = Future()
+        self.waiters.setdefault(client, collections.deque()).append(future)
+        self.queued += 1
+        return future
+
+    def dequeue(self, client, future):
+        """
+        Remove a waiting request (such as on timeout).
+        """
+        waiters = self.waiters.get(client)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self.waiters[client]
+
+class AdmissionController(object):
+    """
+    Admission control of a worker.
+    """
+
+    def __init__(self, read_limit=8, write_limit=2, max_queued=16, queue_timeout=5.0, max_queue_wait=10.0,
+                 client_share=0.5, retry_after=5):
+        """
+        Construct an admission controller.
+
+        Arguments:
+        read_limit -- Read requests processed at the same time.
+        write_limit -- Write requests (including deployments) processed at the same time.
+        max_queued -- Maximum waiting requests per budget.
+        queue_timeout -- Maximum time spent waiting in this worker, in seconds.
+        max_queue_wait -- Maximum time spent waiting before reaching this
+                          worker (see 'X-Request-Start' header), in seconds.
+        client_share -- Maximum share of a budget used by a single client.
+        retry_after -- Delay suggested to rejected clients, in seconds.
+        """
+        self.budgets = {
+            READ: Budget(READ, read_limit, max_queued, client_share),
+            WRITE: Budget(WRITE, write_limit, max_queued, client_share)
+        }
+        self.queue_timeout = queue_timeout
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+
+    def get_budget(self, method):
+        """
+        Return budget of requests of given HTTP method.
+        """
+        return self.budgets[READ if method in __read_methods__ else WRITE]
+
+    @gen.coroutine
+    def admit(self, method, client, waited=0.0):
+        """
+        Admit a request; wait in queue if its budget is exhausted.
+
+        Arguments:
+        method -- HTTP method.
+        client -- Client identifier (see get_client)
+        waited -- Time already spent by the request before reaching this worker.
+
+        Returns:
+        A ticket to be released (see release)
+
+        Raises:
+        AdmissionRejectedException
+        """
+        if waited > self.max_queue_wait:
+            raise AdmissionRejectedException('Server is overloaded, please retry later.', self.retry_after)
+
+        budget = self.get_budget(method)
+        if budget.can_acquire(client):
+            budget.acquire(client)
+            raise gen.Return((budget, client))
+
+        if budget.queued >= budget.max_queued:
+            raise AdmissionRejectedException(
+                'Too many %s requests in progress, please retry later.' % budget.name,
+                self.retry_after
+            )
+
+        future = budget.enqueue(client)
+        try:
+            yield gen.with_timeout(timedelta(seconds=self.queue_timeout), future)
+        except gen.TimeoutError:
+            budget.dequeue(client, future)
+            if not future.done():
+                raise AdmissionRejectedException(
+                    'Too many %s requests in progress, please retry later.' % budget.name,
+                    self.retry_after
+                )
+
+        raise gen.Return((budget, client))
+
+    @staticmethod
+    def release(ticket):
+        """
+        Release a ticket returned by admit.
+        """
+        budget, client = ticket
+        budget.release(client)
+
+def get_client(request):
+    """
+    Return identifier of the client of a request: a hash of its token or
+    its remote IP if it's not authenticated.
+
+    Arguments:
+    request -- HTTP request.
+    """
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        return hashlib.sha1(authorization).hexdigest()
+    return request.remote_ip
+
+def get_queue_wait(request, now):
+    """
+    Return time spent by a request before reaching this worker, from
+    'X-Request-Start' header set by a front proxy ('t=<timestamp>' in
+    seconds, milliseconds or microseconds). Return 0 if unknown.
+
+    Arguments:
+    request -- HTTP request.
+    now -- Current timestamp.
+    """
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        start = float(header[2:] if header.startswith('t=') else header)
+    except ValueError:
+        return 0.0
+
+    # Normalize milliseconds and microseconds timestamps
+    while start > now * 100:
+        start /= 1000.0
+
+    return max(0.0, now - start)
@@ -17,6 +17,7 @@ from jwt.exceptions import (
 )
 from jwt.contrib.algorithms.pycrypto import RSAAlgorithm
 from tornado.web import HTTPError, RequestHandler
+from sid.lib.metrics import timed, annotate
 
 __jwt_algorithms__ = {
     'RS256': RSAAlgorithm(RSAAlgorithm.SHA256),
@@ -37,7 +38,81 @@ for algorithm in __jwt_algorithms__:
             continue
         raise err
 
-def require_authentication():
+@timed('auth')
+def _authenticate(handler):
+    """
+    Validate JWT token from 'Authorization' header of given handler's request.
+
+    Arguments:
+    handler -- Request handler.
+
+    Returns:
+    A dictionnary which contains bearer, decoded payload and user.
+    """
+    # Get authentication settings from application handler
+    settings = handler.application.settings.get('auth', {})
+
+    auth_header = handler.request.headers.get('Authorization')
+    if auth_header is None:
+        # TODO We should answer with WWW-Authenticate header "bearer"
+        raise HTTPError(
+            status_code=401,
+            log_message='Please provide an \'Authorization\' header'
+        )
+
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        # TODO We should answer with WWW-Authenticate header "bearer"
+        raise HTTPError(
+            status_code=401,
+            log_message='Malformed \'Authorization\' header'
+        )
+
+    try:
+        decoded = jwt.decode(
+            parts[1],
+            settings.get('public_key'),
+            audience=settings.get('audience', 'sid'),
+            algorithms=[settings.get('algorithm', 'RS256')]
+        )
+    except (DecodeError,
+            ExpiredSignatureError,
+            InvalidAudienceError,
+            InvalidIssuerError,
+            InvalidIssuedAtError,
+            ImmatureSignatureError,
+            InvalidKeyError,
+            InvalidAlgorithmError,
+            InvalidTokenError):
+        # TODO We should answer with WWW-Authenticate header "bearer"
+        raise HTTPError(
+            status_code=401,
+            log_message='Token validation failed'
+        )
+
+    # Get userfield from decoded payload
+    user_field = settings.get('username_field', 'user')
+    user = decoded.get(user_field)
+    if not user:
+        raise HTTPError(
+            status_code=403,
+            log_message='Missing JWT tuple: %s' % user_field
+        )
+
+    return {
+        'bearer': parts[1],
+        'payload': decoded,
+        'user': user
+    }
+
+def require_authentication(admin=False):
+    """
+    Decorate a RequestHandler method to require a valid JWT token.
+
+    Arguments:
+    admin -- Also require the administrator claim (default: False). Claim name
+             is given by 'admin_field' authentication setting (default: 'admin').
+    """
     # pylint: disable=C0111
     def _require_authentication(func): # pylint: disable=C0111
         # Func argument MUST be callable
@@ -53,61 +128,21 @@ def require_authentication():
             # Decorated function must be a method of RequestHandler
             assert isinstance(handler, RequestHandler)
 
-            # Get authentication settings from application handler
-            settings = handler.application.settings.get('auth', {})
-
-            auth_header = handler.request.headers.get('Authorization')
-            if auth_header is None:
-                # TODO We should answer with WWW-Authenticate header "bearer"
-                raise HTTPError(
-                    status_code=401,
-                    log_message='Please provide an \'Authorization\' header'
-                )
-
-            parts = auth_header.split()
-            if len(parts) != 2 or parts[0].lower() != 'bearer':
-                # TODO We should answer with WWW-Authenticate header "bearer"
-                raise HTTPError(
-                    status_code=401,
-                    log_message='Malformed \'Authorization\' header'
-                )
-
-            try:
-                decoded = jwt.decode(
-                    parts[1],
-                    settings.get('public_key'),
-                    audience=settings.get('audience', 'sid'),
-                    algorithms=[settings.get('algorithm', 'RS256')]
-                )
-            except (DecodeError,
-                    ExpiredSignatureError,
-                    InvalidAudienceError,
-                    InvalidIssuerError,
-                    InvalidIssuedAtError,
-                    ImmatureSignatureError,
-                    InvalidKeyError,
-                    InvalidAlgorithmError,
-                    InvalidTokenError):
-                # TODO We should answer with WWW-Authenticate header "bearer"
-                raise HTTPError(
-                    status_code=401,
-                    log_message='Token validation failed'
-                )
-
-            # Get userfield from decoded payload
-            user_field = settings.get('username_field', 'user')
-            user = decoded.get(user_field)
-            if not user:
-                raise HTTPError(
-                    status_code=403,
-                    log_message='Missing JWT tuple: %s' % user_field
-                )
-
-            kwargs['auth'] = {
-                'bearer': parts[1],
-                'payload': decoded,
-                'user': user
-            }
+            # Authentication is checked once per request, nested decorated
+            # methods (prepare, handler method, ...) reuse its result
+            if getattr(handler, 'authentication', None) is None:
+                handler.authentication = _authenticate(handler)
+                annotate(user=handler.authentication['user'])
+
+            kwargs['auth'] = handler.authentication
+
+            if admin:
+                admin_field = handler.application.settings.get('auth', {}).get('admin_field', 'admin')
+                if handler.authentication['payload'].get(admin_field) is not True:
+                    raise HTTPError(
+                        status_code=403,
+                        log_message='This resource is restricted to administrators.'
+                    )
 
             return func(*args, **kwargs)
         return wrapper
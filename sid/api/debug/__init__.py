@@ -0,0 +1,277 @@
+"""
+This module contains debug commands which can be executed inside a given API
+worker, such as profiling or allocation tracking.
+
+Since API workers are forked, a request may be received by any of them. A
+file based mailbox (see WorkerChannel) is used to forward a command to the
+targeted worker and to get its result back.
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import base64
+import marshal
+import cProfile
+import logging
+from tornado import gen
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.process import task_id
+from sid.lib.profiler import SamplingProfiler, ProfilerBusyException
+from sid.lib.allocations import AllocationTracker, SnapshotNotFoundException
+
+__poll_interval__ = 0.2
+
+class WorkerNotFoundException(Exception):
+    """
+    Exception raised when targeted worker doesn't listen to commands.
+    """
+    pass
+
+class WorkerTimeoutException(Exception):
+    """
+    Exception raised when targeted worker didn't answer in time.
+    """
+    pass
+
+class CommandException(Exception):
+    """
+    Exception raised when a command failed. It's also used to forward
+    errors of a command executed by another worker.
+    """
+
+    def __init__(self, status_code, message):
+        """
+        Construct a CommandException.
+
+        Arguments:
+        status_code -- HTTP status code describing the failure.
+        message -- Error message.
+        """
+        super(CommandException, self).__init__(message)
+        self.status_code = status_code
+
+def current_worker():
+    """
+    Return identifier of current worker (0 if workers are not forked).
+    """
+    worker = task_id()
+    return worker if worker is not None else 0
+
+@gen.coroutine
+def profile(seconds, output_format='collapsed'):
+    """
+    Profile current worker during given time.
+
+    Arguments:
+    seconds -- Profiling duration.
+    output_format -- 'collapsed' for collapsed stacks of a sampling profiler,
+                     'pstats' for a marshalled cProfile dump.
+
+    Returns:
+    A tuple (content type, body)
+    """
+    if output_format == 'pstats':
+        if not SamplingProfiler.running.acquire(False):
+            raise CommandException(409, 'A profiler is already running in this worker.')
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            yield gen.sleep(seconds)
+        finally:
+            profiler.disable()
+            SamplingProfiler.running.release()
+        profiler.create_stats()
+        raise gen.Return(('application/octet-stream', marshal.dumps(profiler.stats)))
+
+    # Sample IOLoop thread (which is the current one)
+    sampler = SamplingProfiler()
+    try:
+        sampler.start()
+    except ProfilerBusyException:
+        raise CommandException(409, 'A profiler is already running in this worker.')
+    try:
+        yield gen.sleep(seconds)
+    finally:
+        sampler.stop()
+    raise gen.Return(('text/plain; charset=utf-8', sampler.get_collapsed()))
+
+# Snapshots are kept in memory of the traced worker
+ALLOCATIONS = AllocationTracker()
+
+@gen.coroutine
+def allocations(action, snapshot=None, compare=None, group='type', limit=20):
+    """
+    Track live objects of current worker.
+
+    Arguments:
+    action -- 'clear' (drop snapshots), 'snapshot' (take a new snapshot) or
+              'statistics' (top groups of a snapshot or difference between
+              'snapshot' and 'compare' snapshots)
+
+    Returns:
+    A tuple (content type, body)
+    """
+    try:
+        if action == 'clear':
+            ALLOCATIONS.clear()
+            result = {'snapshots': 0}
+        elif action == 'snapshot':
+            result = ALLOCATIONS.statistics(ALLOCATIONS.snapshot(), group, limit)
+        elif compare is not None:
+            result = ALLOCATIONS.compare(snapshot, compare, group, limit)
+        else:
+            result = ALLOCATIONS.statistics(snapshot, group, limit)
+    except SnapshotNotFoundException as error:
+        raise CommandException(404, error.message)
+
+    result['worker'] = current_worker()
+    raise gen.Return(('application/json; charset=UTF-8', json.dumps(result, sort_keys=True)))
+
+COMMANDS = {
+    'profile': profile,
+    'allocations': allocations
+}
+
+class WorkerChannel(object):
+    """
+    File based mailbox shared by forked workers. Each worker polls its own
+    directory for command requests and writes results in a common directory.
+    """
+
+    def __init__(self, directory):
+        """
+        Construct a worker channel.
+
+        Arguments:
+        directory -- Directory shared by workers.
+        """
+        self.directory = directory
+
+    def get_worker_dir(self, worker):
+        """
+        Return mailbox directory of a worker.
+        """
+        return os.path.join(self.directory, 'worker-%d' % worker)
+
+    def get_result_path(self, identifier):
+        """
+        Return path of the result of a command.
+        """
+        return os.path.join(self.directory, 'results', '%s.json' % identifier)
+
+    def listen(self, worker):
+        """
+        Listen to commands sent to given worker. MUST be called from the
+        worker itself, after forking.
+
+        Arguments:
+        worker -- Worker identifier.
+        """
+        for path in (self.get_worker_dir(worker), os.path.dirname(self.get_result_path(''))):
+            if not os.path.exists(path):
+                try:
+                    os.makedirs(path)
+                except OSError: # pragma: no cover
+                    # Directory created concurrently by another worker
+                    pass
+
+        # Forget requests sent to a previous process of this worker
+        for path in glob.glob(os.path.join(self.get_worker_dir(worker), '*.json')):
+            os.remove(path)
+
+        PeriodicCallback(lambda: self._poll(worker), 1000).start()
+
+    def _poll(self, worker):
+        """
+        Execute pending commands of given worker.
+        """
+        for path in glob.glob(os.path.join(self.get_worker_dir(worker), '*.json')):
+            try:
+                with open(path, 'r') as request_file:
+                    request = json.load(request_file)
+                os.remove(path)
+            except (IOError, OSError, ValueError):
+                continue
+
+            IOLoop.current().spawn_callback(self._execute, request)
+
+    @gen.coroutine
+    def _execute(self, request):
+        """
+        Execute a command and write its result.
+        """
+        try:
+            content_type, body = yield COMMANDS[request['command']](**request['arguments'])
+            result = {
+                'code': 200,
+                'content_type': content_type,
+                'body': base64.b64encode(body)
+            }
+        except CommandException as error:
+            result = {'code': error.status_code, 'message': error.message}
+        except Exception: # pylint: disable=W0703
+            logging.exception('Debug command \'%s\' failed', request['command'])
+            result = {'code': 500, 'message': 'Command failed.'}
+
+        tmp_path = '%s.tmp' % self.get_result_path(request['id'])
+        with open(tmp_path, 'w') as result_file:
+            json.dump(result, result_file)
+        os.rename(tmp_path, self.get_result_path(request['id']))
+
+    @gen.coroutine
+    def call(self, worker, command, arguments, timeout):
+        """
+        Execute a command in given worker and wait for its result.
+
+        Arguments:
+        worker -- Worker identifier.
+        command -- Command name (see COMMANDS).
+        arguments -- Command arguments.
+        timeout -- Maximum time to wait for the result.
+
+        Returns:
+        A tuple (content type, body)
+
+        Raises:
+        WorkerNotFoundException, WorkerTimeoutException, CommandException
+        """
+        # Executed locally if current worker is targeted
+        if worker == current_worker():
+            result = yield COMMANDS[command](**arguments)
+            raise gen.Return(result)
+
+        if not os.path.isdir(self.get_worker_dir(worker)):
+            raise WorkerNotFoundException('Worker %d not found' % worker)
+
+        request = {
+            'id': uuid.uuid4().hex,
+            'command': command,
+            'arguments': arguments
+        }
+        request_path = os.path.join(self.get_worker_dir(worker), '%s.json' % request['id'])
+        with open('%s.tmp' % request_path, 'w') as request_file:
+            json.dump(request, request_file)
+        os.rename('%s.tmp' % request_path, request_path)
+
+        # Wait for the result
+        result_path = self.get_result_path(request['id'])
+        deadline = time.time() + timeout
+        while not os.path.exists(result_path):
+            if time.time() > deadline:
+                # Don't let the request be executed later
+                if os.path.exists(request_path):
+                    os.remove(request_path)
+                raise WorkerTimeoutException('Worker %d did not answer in time' % worker)
+            yield gen.sleep(__poll_interval__)
+
+        with open(result_path, 'r') as result_file:
+            result = json.load(result_file)
+        os.remove(result_path)
+
+        if result['code'] != 200:
+            raise CommandException(result['code'], result['message'])
+
+        raise gen.Return((result['content_type'], base64.b64decode(result['body'])))
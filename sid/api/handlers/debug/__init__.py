@@ -0,0 +1,8 @@
+"""
+This package contains debug handlers restricted to administrators.
+"""
+
+from .abstract_debug import AbstractDebugHandler
+from .profile import ProfileHandler
+from .allocations import AllocationsHandler
+from .workspace import WorkspaceHandler
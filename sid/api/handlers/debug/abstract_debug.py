@@ -0,0 +1,95 @@
+"""
+AbstractDebugHandler module (see handler documentation)
+"""
+
+from tornado import gen
+from tornado.web import RequestHandler, HTTPError
+from sid.api import http
+from sid.api.debug import (
+    current_worker,
+    CommandException,
+    WorkerNotFoundException,
+    WorkerTimeoutException
+)
+
+@http.json_error_handling
+class AbstractDebugHandler(RequestHandler):
+    """
+    Abstract handler which is forwarding debug commands to the worker given
+    by 'worker' argument (default: the worker processing the request).
+    """
+
+    def get_worker(self):
+        """
+        Return identifier of targeted worker.
+        """
+        try:
+            return int(self.get_argument('worker', str(current_worker())))
+        except ValueError:
+            raise HTTPError(
+                status_code=400,
+                log_message='Argument \'worker\' must be an integer.'
+            )
+
+    def get_int_argument(self, name, default=None):
+        """
+        Return an integer argument of the request.
+
+        Arguments:
+        name -- Argument name.
+        default -- Default value.
+        """
+        value = self.get_argument(name, None)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise HTTPError(
+                status_code=400,
+                log_message='Argument \'%s\' must be an integer.' % name
+            )
+
+    @gen.coroutine
+    def call(self, worker, command, arguments, timeout):
+        """
+        Execute a command in given worker and write its result.
+
+        Arguments:
+        worker -- Worker identifier.
+        command -- Command name (see sid.api.debug.COMMANDS)
+        arguments -- Command arguments.
+        timeout -- Maximum time to wait for the result.
+        """
+        try:
+            content_type, body = yield self.application.settings['debug_channel'].call(
+                worker,
+                command,
+                arguments,
+                timeout=timeout
+            )
+        except WorkerNotFoundException as error:
+            raise HTTPError(
+                status_code=404,
+                log_message=error.message
+            )
+        except WorkerTimeoutException as error:
+            raise HTTPError(
+                status_code=504,
+                log_message=error.message
+            )
+        except CommandException as error:
+            raise HTTPError(
+                status_code=error.status_code,
+                log_message=error.message
+            )
+
+        self.set_header('Content-Type', content_type)
+        self.set_header('X-Worker', str(worker))
+        self.write(body)
+
+    def data_received(self, *args, **kwargs):
+        """
+        Implementation of astract data_received.
+        """
+        pass
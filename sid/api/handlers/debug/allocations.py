@@ -0,0 +1,113 @@
+"""
+AllocationsHandler module (see handler documentation)
+"""
+
+from tornado import gen
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.debug.abstract_debug import AbstractDebugHandler
+
+__command_timeout__ = 60
+
+@http.json_error_handling
+@http.server_timing
+class AllocationsHandler(AbstractDebugHandler):
+    """
+    This handler process following routes:
+
+        - DELETE /_debug/allocations -- Drop snapshots of a worker
+        - POST /_debug/allocations/snapshots -- Take a snapshot of live objects
+        - GET /_debug/allocations/snapshots/<id> -- Get top groups of a
+          snapshot (or difference with snapshot given by 'compare')
+
+    Live objects are grouped by type ('group=type', default) or by module
+    defining their type ('group=module'), see sid.lib.allocations.
+    """
+
+    @auth.require_authentication(admin=True)
+    @gen.coroutine
+    def get(self, snapshot=None, *args, **kwargs):
+        """
+        Get top groups of a snapshot or the difference between two
+        snapshots.
+
+        Example:
+        > GET /_debug/allocations/snapshots/2?compare=1&worker=3 HTTP/1.1
+        > Accept: */*
+        >
+        """
+        if snapshot is None:
+            raise HTTPError(
+                status_code=405,
+                log_message='Method not allowed.'
+            )
+
+        yield self.call_allocations(
+            'statistics',
+            snapshot=int(snapshot),
+            compare=self.get_int_argument('compare')
+        )
+
+    @auth.require_authentication(admin=True)
+    @gen.coroutine
+    def post(self, snapshot=None, *args, **kwargs):
+        """
+        Take a snapshot of live objects.
+
+        Example:
+        > POST /_debug/allocations/snapshots?worker=3 HTTP/1.1
+        > Accept: */*
+        >
+        """
+        if snapshot is not None or not self.request.path.rstrip('/').endswith('/snapshots'):
+            raise HTTPError(
+                status_code=405,
+                log_message='Method not allowed.'
+            )
+
+        yield self.call_allocations('snapshot')
+
+    @auth.require_authentication(admin=True)
+    @gen.coroutine
+    def delete(self, snapshot=None, *args, **kwargs):
+        """
+        Drop snapshots.
+
+        Example:
+        > DELETE /_debug/allocations?worker=3 HTTP/1.1
+        > Accept: */*
+        >
+        """
+        if snapshot is not None or self.request.path.rstrip('/').endswith('/snapshots'):
+            raise HTTPError(
+                status_code=405,
+                log_message='Method not allowed.'
+            )
+
+        yield self.call_allocations('clear')
+
+    @gen.coroutine
+    def call_allocations(self, action, **arguments):
+        """
+        Forward an allocation tracking action to targeted worker.
+
+        Arguments:
+        action -- Action name (see sid.api.debug.allocations)
+
+        Keyword arguments:
+        Action arguments.
+        """
+        group = self.get_argument('group', 'type')
+        if group not in ('type', 'module'):
+            raise HTTPError(
+                status_code=400,
+                log_message='Group must be \'type\' or \'module\'.'
+            )
+
+        arguments.update({
+            'action': action,
+            'group': group,
+            'limit': self.get_int_argument('limit', 20)
+        })
+
+        yield self.call(self.get_worker(), 'allocations', arguments, timeout=__command_timeout__)
@@ -0,0 +1,54 @@
+"""
+ProfileHandler module (see handler documentation)
+"""
+
+from tornado import gen
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.debug.abstract_debug import AbstractDebugHandler
+
+__max_profile_seconds__ = 300
+
+@http.json_error_handling
+@http.server_timing
+class ProfileHandler(AbstractDebugHandler):
+    """
+    This handler process following routes:
+
+        - GET /_debug/profile -- Profile an API worker
+    """
+
+    @auth.require_authentication(admin=True)
+    @gen.coroutine
+    def get(self, *args, **kwargs):
+        """
+        Profile a worker during given time and return collapsed stacks
+        (default) or a marshalled pstats dump ('format=pstats').
+
+        Example:
+        > GET /_debug/profile?seconds=30&worker=2 HTTP/1.1
+        > Accept: */*
+        >
+        """
+        worker = self.get_worker()
+        seconds = self.get_int_argument('seconds', 10)
+
+        output_format = self.get_argument('format', 'collapsed')
+        if output_format not in ('collapsed', 'pstats'):
+            raise HTTPError(
+                status_code=400,
+                log_message='Format must be \'collapsed\' or \'pstats\'.'
+            )
+
+        if not 0 < seconds <= __max_profile_seconds__:
+            raise HTTPError(
+                status_code=400,
+                log_message='Profiling duration must be between 1 and %d seconds.' % __max_profile_seconds__
+            )
+
+        yield self.call(
+            worker,
+            'profile',
+            {'seconds': seconds, 'output_format': output_format},
+            timeout=seconds + 10
+        )
@@ -0,0 +1,61 @@
+"""
+WorkspaceHandler module (see handler documentation)
+"""
+
+from tornado import gen
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.debug.abstract_debug import AbstractDebugHandler
+
+@http.json_error_handling
+@http.server_timing
+@http.json_serializer
+class WorkspaceHandler(AbstractDebugHandler):
+    """
+    This handler process following routes:
+
+        - GET  /_debug/workspace -- Get disk usage of every user's workspace
+        - POST /_debug/workspace -- Collect workspace now (measure usage and
+          evict idle clones beyond disk budget)
+    """
+
+    @auth.require_authentication(admin=True)
+    def get(self, *args, **kwargs):
+        """
+        Get last workspace usage report.
+
+        Example:
+        > GET /_debug/workspace HTTP/1.1
+        > Accept: */*
+        >
+        """
+        report = self.application.settings['workspace'].read_usage()
+        if report is None:
+            raise HTTPError(
+                status_code=404,
+                log_message='Workspace usage has not been measured yet.'
+            )
+
+        self.set_header('Content-Type', 'application/json')
+        self.write(report)
+
+    @auth.require_authentication(admin=True)
+    @gen.coroutine
+    def post(self, *args, **kwargs):
+        """
+        Collect workspace and return its usage report.
+
+        Example:
+        > POST /_debug/workspace HTTP/1.1
+        > Accept: */*
+        >
+        """
+        report = yield self.application.settings['workspace'].submit()
+        if report is None:
+            raise HTTPError(
+                status_code=409,
+                log_message='Workspace is being collected by another worker, please retry later.'
+            )
+
+        self.set_header('Content-Type', 'application/json')
+        self.write(report)
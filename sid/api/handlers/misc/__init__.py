@@ -5,3 +5,4 @@ This package contains miscellaneous handlers.
 from .not_found import NotFoundHandler
 from .not_implemented import NotImplementedHandler
 from .version import VersionHandler
+from .metrics import MetricsHandler
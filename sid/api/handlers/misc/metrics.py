@@ -0,0 +1,38 @@
+"""
+This module contains a handler which exposes metrics of every API worker.
+"""
+
+from tornado.web import RequestHandler
+from sid.api import monitoring
+from sid.api.http import json_error_handling, server_timing
+from sid.lib.metrics import Registry
+
+@json_error_handling
+@server_timing
+class MetricsHandler(RequestHandler):
+    """
+    Metrics handler. See module documentation.
+    """
+
+    def get(self, *args, **kwargs):
+        """
+        Returns metrics aggregated across workers in Prometheus text format.
+
+        Example:
+        > GET /metrics HTTP/1.1
+        > Accept: */*
+        >
+        """
+        metrics_dir = self.application.settings.get('metrics_dir')
+
+        # Make sure metrics of current worker are up to date
+        monitoring.write_metrics(metrics_dir)
+
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(Registry.format(Registry.collect(metrics_dir)))
+
+    def data_received(self, *args, **kwargs):
+        """
+        Implementation of astract data_received.
+        """
+        pass
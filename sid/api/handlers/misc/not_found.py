@@ -4,9 +4,10 @@ This module contians the fallback handler. It will almost raise with a
 """
 
 from tornado.web import RequestHandler, HTTPError
-from sid.api.http import json_error_handling
+from sid.api.http import json_error_handling, server_timing
 
 @json_error_handling
+@server_timing
 class NotFoundHandler(RequestHandler):
     """
     Default handler. See module documentation.
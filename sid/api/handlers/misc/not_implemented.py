@@ -4,9 +4,10 @@ This handler returns always a "501 - Not implemented" error.
 """
 
 from tornado.web import RequestHandler, HTTPError
-from sid.api.http import json_error_handling
+from sid.api.http import json_error_handling, server_timing
 
 @json_error_handling
+@server_timing
 class NotImplementedHandler(RequestHandler):
     """
     Not implemented handler. See module documentation.
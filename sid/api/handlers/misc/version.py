@@ -4,9 +4,10 @@ This module contains a handler which returns the current version of the API.
 
 from tornado.web import RequestHandler
 from sid.api import __version__
-from sid.api.http import json_error_handling, available_content_type
+from sid.api.http import json_error_handling, available_content_type, server_timing
 
 @json_error_handling
+@server_timing
 class VersionHandler(RequestHandler):
     """
     Version handler. See module documentation.
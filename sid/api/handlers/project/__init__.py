@@ -3,9 +3,14 @@ This package contains every handlers linked to "project" resource management
 such as:
   - ProjectCollectionHandler which manage a collection of projects
   - ProjectHandler which manage project itself
+  - ProjectDeploymentHandler which deploy a project
+  - ProjectDeploymentStatusHandler which report state of a deployment
+  - BulkDeploymentHandler which deploy many projects at once
 """
 
 from .abstract_project import AbstractProjectHandler
 from .collection import ProjectCollectionHandler
 from .project import ProjectHandler
 from .deploy import ProjectDeploymentHandler
+from .deployment import ProjectDeploymentStatusHandler
+from .bulk_deploy import BulkDeploymentHandler
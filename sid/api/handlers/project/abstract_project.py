@@ -4,14 +4,17 @@ AbstractProjectHandler module (see handler documentation)
 
 import os
 from tornado.web import HTTPError
-from sid.api import http, auth
+from sid.api import http, auth, workspace
 from sid.api.handlers.workspace import AbstractWorkspaceHandler
 from sid.lib.project import Project
+from sid.lib.metrics import trace_repository
 from sid.lib.git import (
     OAuthCallback,
     RepositoryNotFoundException,
     BranchNotFoundException,
-    ForbiddenException
+    ForbiddenException,
+    GitMergeConflictException,
+    RemoteUnavailableException
 )
 
 __projects_prefix__ = 'projects/'
@@ -23,42 +26,58 @@ class AbstractProjectHandler(AbstractWorkspaceHandler):
     """
 
     @auth.require_authentication()
-    def prepare_project(self, project_name, **kwargs):
+    def prepare_project(self, project_name, pull=True, **kwargs):
         """
         Prepare a project in user workspace from its name.
 
         Arguments:
         project_name -- Project name.
+        pull -- Update local copy from remote (default: True)
         """
-        local_path = os.path.join(self.workspace_dir, kwargs['auth']['user'], __projects_prefix__, project_name)
-        remote_url = http.join_url_path(self.remote_base_url, __projects_prefix__, project_name)
+        self.lock_clone(self.get_project_path(project_name, kwargs['auth']))
+        project, stale_error = self.load_project(project_name, kwargs['auth'], pull)
+        return self.use_project(project, stale_error)
 
-        # Initialize Git repository
-        self.project = Project(local_path)
+    def use_project(self, project, stale_error=None):
+        """
+        Use a loaded project (see load_project) as project of the request.
+        It must be called from IOLoop thread.
 
-        # Set Git credentials
-        self.project.set_callbacks(
-            OAuthCallback(
-                kwargs['auth']['user'], # User
-                kwargs['auth']['bearer'] # Password (here the token)
-            )
-        )
+        Arguments:
+        project -- Loaded project.
+        stale_error -- Error of an unavailable remote (see serve_stale)
+        """
+        if stale_error is not None:
+            self.serve_stale(project, stale_error)
 
-        # Try to open Git repository or initialize it
-        try:
-            self.project.open()
-        except RepositoryNotFoundException:
-            self.project.initialize()
+        self.project = project
+        return project
 
-        # Set user signature
-        self.project.set_default_signature(kwargs['auth']['user'], 'TODO') # TODO set mail
+    def load_project(self, project_name, auth_info, pull=True):
+        """
+        Open and update a project without modifying the request: it can be
+        called from another thread than IOLoop one. Clone of the project
+        must be locked by the caller.
 
-        # Make sure 'origin' remote exists
-        self.project.set_remote(remote_url, 'origin')
+        Arguments:
+        project_name -- Project name.
+        auth_info -- Authentication of logged in user.
+        pull -- Update local copy from remote (default: True)
+
+        Returns:
+        A tuple (project, stale_error) where stale_error is the
+        RemoteUnavailableException raised while updating the local copy,
+        if any.
+        """
+        project = self.open_project(project_name, auth_info)
+
+        # Some operations (such as deployment) are fetching by themselves
+        if not pull:
+            return project, None
 
         # Update our local copy
         try:
-            self.project.pull('origin')
+            project.pull('origin')
         except BranchNotFoundException:
             raise HTTPError(
                 status_code=503,
@@ -70,8 +89,70 @@ class AbstractProjectHandler(AbstractWorkspaceHandler):
                 status_code=401,
                 log_message='You\'re not authorized to access this resource.'
             )
+        except GitMergeConflictException as error:
+            raise http.DetailedHTTPError(
+                status_code=409,
+                log_message='Your local copy conflicts with remote repository. '
+                            'Please contact your system administrator.',
+                details={'conflicts': error.conflicts}
+            )
+        except RemoteUnavailableException as error:
+            return project, error
+
+        return project, None
+
+    def get_project_path(self, project_name, auth_info):
+        """
+        Return clone directory of a project in user workspace.
+
+        Arguments:
+        project_name -- Project name.
+        auth_info -- Authentication of logged in user.
+        """
+        return os.path.join(self.workspace_dir, auth_info['user'], __projects_prefix__, project_name)
+
+    def open_project(self, project_name, auth_info, callbacks=None):
+        """
+        Open (or initialize) a project in user workspace without updating it.
+        Clone of the project must be locked by the caller (see lock_clone
+        and sid.api.workspace.CloneLock)
+
+        Arguments:
+        project_name -- Project name.
+        auth_info -- Authentication of logged in user.
+        callbacks -- Git callbacks (default: OAuthCallback of logged in user)
+        """
+        local_path = self.get_project_path(project_name, auth_info)
+        remote_url = http.join_url_path(self.remote_base_url, __projects_prefix__, project_name)
+
+        # Initialize Git repository
+        project = Project(local_path)
+
+        # Set Git credentials
+        project.set_callbacks(
+            callbacks if callbacks else OAuthCallback(
+                auth_info['user'], # User
+                auth_info['bearer'] # Password (here the token)
+            )
+        )
+
+        # Try to open Git repository or initialize it
+        try:
+            project.open()
+            trace_repository(__projects_prefix__ + project_name, True)
+        except RepositoryNotFoundException:
+            project.initialize()
+            trace_repository(__projects_prefix__ + project_name, False)
+
+        # Set user signature
+        project.set_default_signature(auth_info['user'], 'TODO') # TODO set mail
+
+        # Make sure 'origin' remote exists
+        project.set_remote(remote_url, 'origin')
+        self.setup_remote(project)
+        workspace.touch(project.path)
 
-        return self.project
+        return project
 
     def data_received(self, *args, **kwargs):
         """
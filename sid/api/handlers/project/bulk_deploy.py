@@ -0,0 +1,116 @@
+"""
+BulkDeploymentHandler module (see handler documentation)
+"""
+
+import json
+import functools
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.queues import Queue
+from sid.api import http, auth
+from sid.api.handlers.project import AbstractProjectHandler
+from sid.api.handlers.project.deploy import deploy_project, __deployment_job__
+from sid.api.jobs import Job, JobCallback, JOB_SUCCEEDED
+from sid.api.schemas import DEPLOYMENTS_SCHEMA
+
+@http.json_error_handling
+@http.admission_control
+@http.server_timing
+class BulkDeploymentHandler(AbstractProjectHandler):
+    """
+    This handler process following routes:
+
+        - POST /deployments -- Deploy a list of projects
+    """
+
+    @auth.require_authentication()
+    @http.accepted_content_type(['application/json'])
+    @http.available_content_type(['application/x-ndjson'])
+    @http.parse_json_body(DEPLOYMENTS_SCHEMA)
+    @gen.coroutine
+    def post(self, *args, **kwargs):
+        """
+        Deploy given projects in parallel. Result of each deployment is
+        streamed as a JSON line as soon as it's done.
+
+        Example:
+        > POST /deployments HTTP/1.1
+        > Accept: */*
+        > Content-Type: application/json
+        > Content-Length: 42
+        >
+        {"projects":["example","another-example"]}
+        """
+        project_names = kwargs['json']['projects']
+        runner = self.application.settings['jobs']
+
+        # Whole batch is rejected rather than partially queued. Jobs are only
+        # queued from IOLoop thread: capacity cannot shrink meanwhile.
+        if len(project_names) > runner.get_available():
+            raise http.DetailedHTTPError(
+                status_code=503,
+                log_message='Too many deployments in progress, please retry later.',
+                headers={'Retry-After': '5'}
+            )
+
+        # Deployments are sharing the bounded pool of deployment jobs.
+        # Jobs are queued back in IOLoop thread as soon as they are done.
+        io_loop = IOLoop.current()
+        results = Queue()
+        for project_name in project_names:
+            job = Job(
+                self.get_jobs_dir(kwargs['auth']['user']),
+                __deployment_job__,
+                project=project_name
+            )
+            future = runner.submit(job, self.deploy, project_name, kwargs['auth'])
+            future.add_done_callback(functools.partial(
+                lambda job, done: io_loop.add_callback(results.put_nowait, job), job
+            ))
+
+        self.set_header('Content-Type', kwargs['output_content_type'])
+
+        for _ in project_names:
+            job = yield results.get()
+            self.write(json.dumps(BulkDeploymentHandler.format_result(job), cls=http.Encoder, sort_keys=True) + '\n')
+            yield self.flush()
+
+    def deploy(self, job, project_name, auth_info):
+        """
+        Open and deploy a project. Executed by the deployment job runner.
+
+        Arguments:
+        job -- Deployment job.
+        project_name -- Project name.
+        auth_info -- Authentication of logged in user.
+        """
+        # Transfers of each project are reported in its own job
+        callbacks = JobCallback(
+            job,
+            auth_info['user'], # User
+            auth_info['bearer'] # Password (here the token)
+        )
+
+        lock = self.wait_clone(self.get_project_path(project_name, auth_info))
+        try:
+            project = self.open_project(project_name, auth_info, callbacks)
+        finally:
+            lock.release()
+
+        return deploy_project(job, project)
+
+    @staticmethod
+    def format_result(job):
+        """
+        Format result of a deployment job.
+
+        Arguments:
+        job -- Finished deployment job.
+        """
+        if job.state == JOB_SUCCEEDED:
+            result = dict(job.result, code=202 if job.result['pushed'] else 200)
+        else:
+            result = dict(job.error)
+
+        result.update({'name': job.attributes['project'], 'id': job.id})
+        return result
@@ -4,16 +4,20 @@ ProjectCollectionHandler module (see handler documentation).
 
 import pyolite2
 import jsonpatch
+from tornado import gen
 from tornado.web import HTTPError
 from sid.api import http, auth
 from sid.api.handlers.warehouse import AbstractWarehouseHandler
 from sid.api.schemas.project import PROJECT_SCHEMA
-from sid.lib.warehouse import Warehouse, RepositoryPatchException
-from sid.lib.git import ForbiddenException
+from sid.lib.warehouse import RepositoryPatchException, WarehouseConflictException
+from sid.lib.git import ForbiddenException, RemoteUnavailableException
 
 __projects_prefix__ = 'projects/'
 
 @http.json_error_handling
+@http.idempotent
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class ProjectCollectionHandler(AbstractWarehouseHandler):
     """
@@ -51,6 +55,7 @@ class ProjectCollectionHandler(AbstractWarehouseHandler):
     @http.accepted_content_type(['application/json'])
     @http.available_content_type(['application/json'])
     @http.parse_json_body(PROJECT_SCHEMA)
+    @gen.coroutine
     def post(self, *args, **kwargs):
         """
         Create and add a new project.
@@ -64,16 +69,14 @@ class ProjectCollectionHandler(AbstractWarehouseHandler):
         {"name":"test-project","rules":[{"users":["@all"],"perm":"RW"}]}
         """
 
-        try:
-            # Create and add repository
-            repo = pyolite2.Repository(__projects_prefix__ + kwargs['json']['name'])
-            self.warehouse.repos.append(repo)
+        name = __projects_prefix__ + kwargs['json']['name']
 
-            # Add user permissions by patching repo
-            Warehouse.patch_pyolite_repo(
-                repo,
+        try:
+            # Create and add repository, add user permissions by patching repo
+            self.warehouse.create_repo(
+                name,
                 jsonpatch.make_patch(
-                    http.Encoder().default(repo),
+                    http.Encoder().default(pyolite2.Repository(name)),
                     kwargs['json']
                 )
             )
@@ -90,20 +93,27 @@ class ProjectCollectionHandler(AbstractWarehouseHandler):
 
         try:
             # Save Gitolite configuration and commit changes
-            self.warehouse.save('Created project \'%s\'' % kwargs['json']['name'])
+            yield self.save_warehouse('Created project \'%s\'' % kwargs['json']['name'])
         except ForbiddenException:
             raise HTTPError(
                 status_code=403,
                 log_message='You are not authorized to create projects'
             )
+        except WarehouseConflictException as error:
+            raise HTTPError(
+                status_code=409,
+                log_message=error.message
+            )
+        except RemoteUnavailableException as error:
+            raise self.remote_unavailable(error)
         except IOError:
             raise HTTPError(
                 status_code=500,
                 log_message='Failed to save changes'
             )
 
-        # Return created repository
-        self.write(repo)
+        # Return created repository (changes may have been replayed on a new one)
+        self.write(self.warehouse.repos[name])
 
     def data_received(self, *args, **kwargs):
         """
@@ -5,9 +5,68 @@ ProjectDeploymentHandler module (see handler documentation)
 from tornado.web import HTTPError
 from sid.api import http, auth
 from sid.api.handlers.project import AbstractProjectHandler
-from sid.lib.git import GitAutomaticMergeNotAvailable, ForbiddenException
+from sid.api.jobs import Job, JobCallback, JobQueueFullException
+from sid.lib.git import (
+    GitMergeConflictException,
+    BranchNotFoundException,
+    ForbiddenException,
+    PushRejectedException,
+    RemoteUnavailableException
+)
+
+__deployment_job__ = u'deployment'
+
+def deploy_project(job, project): # pylint: disable=W0613
+    """
+    Deploy local changes of given project. This function is executed by the
+    job runner, errors are reported as HTTP errors in job state. Clone of the
+    project is locked during the deployment.
+
+    Arguments:
+    job -- Deployment job.
+    project -- Prepared project.
+    """
+    lock = AbstractProjectHandler.wait_clone(project.path)
+
+    # Fetch once, apply remote changes and push ours
+    try:
+        ahead, behind = project.sync('origin')
+    except GitMergeConflictException as error:
+        raise http.DetailedHTTPError(
+            status_code=412,
+            log_message='Your local copy is %d commits behind remote repository '
+                        'and changes are conflicting. '
+                        'If you cannot resolve the issue your self, '
+                        'please contact your system administrator.' % error.behind,
+            details={'conflicts': error.conflicts}
+        )
+    except BranchNotFoundException:
+        raise HTTPError(
+            status_code=503,
+            log_message='Remote or local branch not found. '
+                        'Please contact your system administrator.'
+        )
+    except ForbiddenException:
+        raise HTTPError(
+            status_code=403,
+            log_message='You are not authorized to deploy this project'
+        )
+    except PushRejectedException:
+        raise HTTPError(
+            status_code=409,
+            log_message='Remote repository changed during deployment, please retry.'
+        )
+    except RemoteUnavailableException as error:
+        raise AbstractProjectHandler.remote_unavailable(error)
+    finally:
+        lock.release()
+
+    return {'ahead': ahead, 'behind': behind, 'pushed': ahead > 0}
 
 @http.json_error_handling
+@http.idempotent
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class ProjectDeploymentHandler(AbstractProjectHandler):
     """
@@ -17,47 +76,46 @@ class ProjectDeploymentHandler(AbstractProjectHandler):
     """
 
     @auth.require_authentication()
+    @http.available_content_type(['application/json'])
     def put(self, project_name, *args, **kwargs):
         """
-        Deploy local changes.
+        Queue deployment of local changes. Deployment state can be followed
+        from the returned 'Location'.
 
         Example:
         > PUT /projects/example/deploy HTTP/1.1
         > Accept: */*
         >
         """
-        # Fetch and load the targeted project
-        self.prepare_project(project_name)
-
-        # Calculate diff between local copy and remote
-        ahead, behind = self.project.ahead_behind('origin')
-
-        # If there is remote changes, try to apply them locally before pushing
-        if behind:
-            try:
-                self.project.pull('origin')
-            except GitAutomaticMergeNotAvailable:
-                raise HTTPError(
-                    status_code=412,
-                    log_message='Your local copy is %d commits behind remote repository. '
-                                'If you cannot resolve the issue your self, '
-                                'please contact your system administrator.' % behind
-                )
-
-        # If we don't have anything to push return OK
-        if not ahead:
-            self.set_status(200)
-            return
-
-        # Push our changes
+        # Load the targeted project, it will be fetched by the deployment
+        self.prepare_project(project_name, pull=False)
+
+        job = Job(
+            self.get_jobs_dir(kwargs['auth']['user']),
+            __deployment_job__,
+            project=project_name
+        )
+
+        # Report transfer progress into the job
+        self.project.set_callbacks(
+            JobCallback(
+                job,
+                kwargs['auth']['user'], # User
+                kwargs['auth']['bearer'] # Password (here the token)
+            )
+        )
+
         try:
-            self.project.push('origin')
-        except ForbiddenException:
-            raise HTTPError(
-                status_code=403,
-                log_message='You are not authorized to deploy this project'
+            self.application.settings['jobs'].submit(job, deploy_project, self.project)
+        except JobQueueFullException:
+            raise http.DetailedHTTPError(
+                status_code=503,
+                log_message='Too many deployments in progress, please retry later.',
+                headers={'Retry-After': '5'}
             )
 
         # Obviously we cannot return a confirmation that changes has been applied.
-        # So we are returning a '202 - Accepted' code.
+        # So we are returning a '202 - Accepted' code with the deployment job.
         self.set_status(202)
+        self.set_header('Location', http.join_url_path('/projects', project_name, 'deployments', job.id))
+        self.write(job.to_dict())
@@ -0,0 +1,47 @@
+"""
+ProjectDeploymentStatusHandler module (see handler documentation)
+"""
+
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.workspace import AbstractWorkspaceHandler
+from sid.api.jobs import Job, JobNotFoundException
+
+@http.json_error_handling
+@http.admission_control
+@http.server_timing
+@http.json_serializer
+class ProjectDeploymentStatusHandler(AbstractWorkspaceHandler):
+    """
+    This handler process following routes:
+
+        - GET /projects/<project_name>/deployments/<id> -- Get state of a deployment
+    """
+
+    @auth.require_authentication()
+    @http.available_content_type(['application/json'])
+    def get(self, project_name, deployment_id, *args, **kwargs):
+        """
+        Get state and transfer progress of a deployment.
+
+        Example:
+        > GET /projects/example/deployments/0123456789abcdef0123456789abcdef HTTP/1.1
+        > Accept: */*
+        >
+        """
+        try:
+            job = Job.load(self.get_jobs_dir(kwargs['auth']['user']), deployment_id)
+        except JobNotFoundException:
+            raise HTTPError(
+                status_code=404,
+                log_message='Deployment not found.'
+            )
+
+        # Deployment must belong to the given project
+        if job.get('project') != project_name:
+            raise HTTPError(
+                status_code=404,
+                log_message='Deployment not found.'
+            )
+
+        self.write(job)
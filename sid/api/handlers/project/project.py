@@ -4,17 +4,20 @@ ProjectHandler module (see handler documentation)
 
 import pyolite2
 import jsonpatch
+from tornado import gen
 from tornado.web import HTTPError
 from sid.api import http
 from sid.api import auth
 from sid.api.handlers.warehouse import AbstractWarehouseHandler
 from sid.api.schemas.project import PROJECT_SCHEMA, PROJECT_PATCH_SCHEMA
-from sid.lib.warehouse import Warehouse, RepositoryPatchException
-from sid.lib.git import ForbiddenException
+from sid.lib.warehouse import RepositoryPatchException, WarehouseConflictException
+from sid.lib.git import ForbiddenException, RemoteUnavailableException
 
 __projects_prefix__ = 'projects/'
 
 @http.json_error_handling
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class ProjectHandler(AbstractWarehouseHandler):
     """
@@ -49,6 +52,7 @@ class ProjectHandler(AbstractWarehouseHandler):
     @http.available_content_type(['application/json'])
     @http.accepted_content_type(['application/json'])
     @http.parse_json_body(PROJECT_SCHEMA)
+    @gen.coroutine
     def put(self, name, *args, **kwargs):
         """
         Modify a given project.
@@ -79,10 +83,7 @@ class ProjectHandler(AbstractWarehouseHandler):
 
         # Patch the diff
         try:
-            Warehouse.patch_pyolite_repo(
-                repo,
-                patches
-            )
+            self.warehouse.patch_repo(repo.name, patches)
         except RepositoryPatchException as error:
             raise HTTPError(
                 status_code=400,
@@ -92,20 +93,28 @@ class ProjectHandler(AbstractWarehouseHandler):
 
         # Save Gitolite configuration and commit changes
         try:
-            self.warehouse.save('Updated project \'%s\'' % name)
+            yield self.save_warehouse('Updated project \'%s\'' % name)
         except ForbiddenException:
             raise HTTPError(
                 status_code=403,
                 log_message='You are not authorized to update this project\'s configuration'
             )
+        except WarehouseConflictException as error:
+            raise HTTPError(
+                status_code=409,
+                log_message=error.message
+            )
+        except RemoteUnavailableException as error:
+            raise self.remote_unavailable(error)
 
-        # Return updated repository
-        self.write(repo)
+        # Return updated repository (changes may have been replayed on a new one)
+        self.write(self.warehouse.repos[__projects_prefix__ + name])
 
     @auth.require_authentication()
     @http.available_content_type(['application/json'])
     @http.accepted_content_type(['application/json'])
     @http.parse_json_body(PROJECT_PATCH_SCHEMA)
+    @gen.coroutine
     def patch(self, name, *args, **kwargs):
         """
         Modify a given project from a JSON diff/patch.
@@ -134,7 +143,7 @@ class ProjectHandler(AbstractWarehouseHandler):
             return
 
         try:
-            Warehouse.patch_pyolite_repo(repo, patches)
+            self.warehouse.patch_repo(repo.name, patches)
         except RepositoryPatchException as error:
             raise HTTPError(
                 status_code=400,
@@ -143,17 +152,25 @@ class ProjectHandler(AbstractWarehouseHandler):
 
         try:
             # Save Gitolite configuration and commit changes
-            self.warehouse.save('Updated project \'%s\'' % name)
+            yield self.save_warehouse('Updated project \'%s\'' % name)
         except ForbiddenException:
             raise HTTPError(
                 status_code=403,
                 log_message='You are not authorized to patch project\'s configuration'
             )
+        except WarehouseConflictException as error:
+            raise HTTPError(
+                status_code=409,
+                log_message=error.message
+            )
+        except RemoteUnavailableException as error:
+            raise self.remote_unavailable(error)
 
-        # Return updated repository
-        self.write(repo)
+        # Return updated repository (changes may have been replayed on a new one)
+        self.write(self.warehouse.repos[__projects_prefix__ + name])
 
     @auth.require_authentication()
+    @gen.coroutine
     def delete(self, name, *args, **kwargs):
         """
         Delete a project.
@@ -166,7 +183,7 @@ class ProjectHandler(AbstractWarehouseHandler):
         NOTE: My editor syntax is bugging when I write "delete" in caps... :-(
         """
         try:
-            self.warehouse.repos.remove(__projects_prefix__ + name)
+            self.warehouse.remove_repo(__projects_prefix__ + name)
         except pyolite2.errors.RepositoryNotFoundException:
             raise HTTPError(
                 status_code=404,
@@ -175,12 +192,19 @@ class ProjectHandler(AbstractWarehouseHandler):
 
         try:
             # Save Gitolite configuration and commit changes
-            self.warehouse.save('Removed project \'%s\'' % name)
+            yield self.save_warehouse('Removed project \'%s\'' % name)
         except ForbiddenException:
             raise HTTPError(
                 status_code=403,
                 log_message='You are not authorized to remove this project'
             )
+        except WarehouseConflictException as error:
+            raise HTTPError(
+                status_code=409,
+                log_message=error.message
+            )
+        except RemoteUnavailableException as error:
+            raise self.remote_unavailable(error)
 
         self.set_status(204)
 
@@ -9,10 +9,13 @@ from whiriho.errors import CatalogNotFoundException, WhirihoException
 from tornado.web import HTTPError
 from sid.api import http, auth
 from sid.api.handlers.project import AbstractProjectHandler
+from sid.lib.metrics import timed
 
 __whiriho_catalog__ = 'whiriho.json'
 
 @http.json_error_handling
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class SettingsCollectionHandler(AbstractProjectHandler):
     """
@@ -37,7 +40,8 @@ class SettingsCollectionHandler(AbstractProjectHandler):
 
         try:
             whiriho = Whiriho(os.path.join(self.project.path, __whiriho_catalog__))
-            whiriho.load()
+            with timed('load'):
+                whiriho.load()
             self.write(json.dumps(whiriho.get_paths()))
         except CatalogNotFoundException:
             self.write(json.dumps([]))
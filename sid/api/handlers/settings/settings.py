@@ -16,10 +16,13 @@ from whiriho.errors import (
 )
 from sid.api import auth, http
 from sid.api.handlers.project import AbstractProjectHandler
+from sid.lib.metrics import timed
 
 __whiriho_catalog__ = 'whiriho.json'
 
 @http.json_error_handling
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class SettingsHandler(AbstractProjectHandler):
     """
@@ -166,7 +169,8 @@ class SettingsHandler(AbstractProjectHandler):
 
         try:
             self.whiriho = Whiriho(os.path.join(self.project.path, __whiriho_catalog__))
-            self.whiriho.load()
+            with timed('load'):
+                self.whiriho.load()
         except (CatalogNotFoundException, CatalogPathException):
             # If catalog itself or catalog path given is not found,
             # consider the config doesn't exist
@@ -3,6 +3,9 @@ This package contains every handlers linked to "template" resource management.
 """
 
 from .abstract_template import AbstractTemplateHandler
+from .abstract_project_template import AbstractProjectTemplateHandler
 from .collection import TemplateCollectionHandler
 from .template import TemplateHandler
 from .project import ProjectTemplateHandler
+from .job import ProjectTemplateJobHandler
+from .preview import ProjectTemplatePreviewHandler
@@ -0,0 +1,188 @@
+"""
+AbstractProjectTemplateHandler module (see handler documentation)
+"""
+
+import logging
+from jsonschema import ValidationError, SchemaError
+from tornado import gen
+from tornado.web import HTTPError
+from sid.api import auth
+from sid.api.handlers.project import AbstractProjectHandler
+from sid.api.handlers.template import AbstractTemplateHandler
+from sid.lib.template import TemplateException
+from sid.lib.metrics import run_traced
+from sid.lib import render
+
+class AbstractProjectTemplateHandler(AbstractTemplateHandler, AbstractProjectHandler):
+    """
+    Abstract handler which is preparing a project and a template to be
+    installed (or upgraded) on it.
+    """
+
+    def _check_template_request(self, template_name, version, data):
+        """
+        Check a template installation request on prepared project and
+        template.
+
+        Arguments:
+        template_name -- Template name.
+        version -- Template version, 'latest' or version range.
+        data -- Template data.
+
+        Returns:
+        A tuple (version, upgrade) with resolved version and True if
+        installed template has to be upgraded.
+        """
+        # Upgrade only if current template name equals given one
+        upgrade = self.project.has_template()
+        if upgrade and self.template.get_name() != template_name:
+            raise HTTPError(
+                status_code=409,
+                log_message='A template is already installed on this project'
+            )
+
+        # Check if version is available
+        version = self._check_template_version(version)
+
+        # Validate template schema
+        self._check_template_data(data)
+
+        return version, upgrade
+
+    @staticmethod
+    def get_render_key(cache, project, template, version, data, upgrade):
+        """
+        Return key of a render in cache (see sid.lib.render.RenderCache),
+        None if render cannot be cached. Upgrades depend on previous
+        installation, only installations are cached.
+        """
+        if cache is None or upgrade:
+            return None
+        return cache.get_key(template.get_version_oid(version), project.get_base_tree(), data)
+
+    @staticmethod
+    def render_template(renderer, cache, key, scratch, project, template, version, data, upgrade):
+        """
+        Render a template installation (or upgrade) in a scratch clone of
+        the project (see sid.lib.render.render_template). Render errors are
+        raised as HTTP errors.
+
+        Arguments:
+        renderer -- Render pool (see sid.lib.render.RenderPool)
+        cache -- Render cache (optional)
+        key -- Key of the render in cache, None to not cache it.
+        scratch -- Scratch directory (see sid.lib.render.create_scratch)
+
+        Other arguments: (see sid.lib.render.render_template)
+
+        Returns:
+        Render result.
+        """
+        try:
+            result = renderer.run(
+                'upgrade' if upgrade else 'install',
+                render.render_template,
+                scratch,
+                project.path,
+                template.path,
+                version,
+                data,
+                upgrade,
+                (project.sign.name, project.sign.email)
+            )
+        except render.RenderTimeoutException as error:
+            raise HTTPError(
+                status_code=504,
+                log_message='Template could not be rendered in time: %s' % error.message
+            )
+        except render.RenderException as error:
+            raise HTTPError(
+                status_code=500,
+                log_message='Template could not be rendered: %s' % error.message
+            )
+
+        if cache is not None and key is not None:
+            try:
+                cache.store(key, scratch, result['branch'])
+            except Exception: # pylint: disable=W0703
+                # Cache is only an optimization
+                logging.exception('Failed to cache render of \'%s\'', project.path)
+
+        return result
+
+    @auth.require_authentication()
+    @gen.coroutine
+    def _prepare_repositories(self, project_name, template_name, **kwargs):
+        """
+        Prepare project and template concurrently: they are independent and
+        fetched from different remotes.
+
+        Clones are locked and the request is updated from IOLoop thread;
+        threads only load repositories (RequestHandler is not thread-safe).
+        Errors are the same as preparing them sequentially: when both
+        preparations failed, error of the project is raised.
+
+        Arguments:
+        project_name -- Project name.
+        template_name -- Template name.
+        """
+        self.lock_clone(self.get_project_path(project_name, kwargs['auth']))
+        self.lock_clone(self.get_template_path(template_name, kwargs['auth']))
+
+        executor = self.application.settings['preparations']
+        (project, project_error), (template, template_error) = yield gen.multi([
+            executor.submit(run_traced, self.trace, self.load_project, project_name, kwargs['auth']),
+            executor.submit(run_traced, self.trace, self.load_template, template_name, kwargs['auth'])
+        ], quiet_exceptions=(HTTPError,))
+
+        self.use_project(project, project_error)
+        self.use_template(template, template_error)
+
+    def _check_template_version(self, version):
+        """
+        Check if version is available for loaded template or raise a 400 error.
+
+        It will also checkout given version on local template copy.
+
+        Arguments:
+        version -- Template version, 'latest' or version range.
+
+        Returns:
+        Resolved version.
+        """
+        try:
+            resolved = self.template.resolve_version(version)
+        except TemplateException as error:
+            raise HTTPError(
+                status_code=400,
+                log_message=error.message
+            )
+
+        if resolved is None:
+            raise HTTPError(
+                status_code=400,
+                log_message='Version \'%s\' could not be found for this template' % version
+            )
+
+        self.template.checkout_version(resolved)
+        return resolved
+
+    def _check_template_data(self, data):
+        """
+        Check if user data are valid for loaded template.
+
+        Arguments:
+        data -- Data to validate.
+        """
+        try:
+            self.template.validate(data)
+        except ValidationError as vlde:
+            raise HTTPError(
+                status_code=400,
+                log_message='JSON error: %s' % vlde.message
+            )
+        except SchemaError:
+            raise HTTPError(
+                status_code=500,
+                log_message='Invalid template JSON schema.'
+            )
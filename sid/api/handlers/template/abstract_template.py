@@ -4,14 +4,16 @@ AbstractTemplateHandler module (see handler documentation)
 
 import os
 from tornado.web import HTTPError
-from sid.api import http, auth
+from sid.api import http, auth, workspace
 from sid.api.handlers.workspace import AbstractWorkspaceHandler
 from sid.lib.template import Template
+from sid.lib.metrics import trace_repository
 from sid.lib.git import (
     OAuthCallback,
     RepositoryNotFoundException,
     BranchNotFoundException,
-    ForbiddenException
+    ForbiddenException,
+    RemoteUnavailableException
 )
 
 __templates_prefix__ = 'templates/'
@@ -32,35 +34,81 @@ class AbstractTemplateHandler(AbstractWorkspaceHandler):
 
         Keyword arguments: (see prepare_repository)
         """
-        local_path = os.path.join(self.workspace_dir, kwargs['auth']['user'], __templates_prefix__, template_name)
+        self.lock_clone(self.get_template_path(template_name, kwargs['auth']))
+        template, stale_error = self.load_template(template_name, kwargs['auth'])
+        return self.use_template(template, stale_error)
+
+    def use_template(self, template, stale_error=None):
+        """
+        Use a loaded template (see load_template) as template of the
+        request. It must be called from IOLoop thread.
+
+        Arguments:
+        template -- Loaded template.
+        stale_error -- Error of an unavailable remote (see serve_stale)
+        """
+        if stale_error is not None:
+            self.serve_stale(template, stale_error)
+
+        self.template = template
+        return template
+
+    def get_template_path(self, template_name, auth_info):
+        """
+        Return clone directory of a template in user workspace.
+
+        Arguments:
+        template_name -- Template name.
+        auth_info -- Authentication of logged in user.
+        """
+        return os.path.join(self.workspace_dir, auth_info['user'], __templates_prefix__, template_name)
+
+    def load_template(self, template_name, auth_info):
+        """
+        Open and update a template without modifying the request: it can be
+        called from another thread than IOLoop one. Clone of the template
+        must be locked by the caller.
+
+        Arguments:
+        template_name -- Template name.
+        auth_info -- Authentication of logged in user.
+
+        Returns:
+        A tuple (template, stale_error) (see AbstractProjectHandler.load_project)
+        """
+        local_path = self.get_template_path(template_name, auth_info)
         remote_url = http.join_url_path(self.remote_base_url, __templates_prefix__, template_name)
 
         # Initialize Git repository
-        self.template = Template(local_path)
+        template = Template(local_path)
 
         # Set Git credentials
-        self.template.set_callbacks(
+        template.set_callbacks(
             OAuthCallback(
-                kwargs['auth']['user'], # User
-                kwargs['auth']['bearer'] # Password (here the token)
+                auth_info['user'], # User
+                auth_info['bearer'] # Password (here the token)
             )
         )
 
         # Try to open Git repository or initialize it
         try:
-            self.template.open()
+            template.open()
+            trace_repository(__templates_prefix__ + template_name, True)
         except RepositoryNotFoundException:
-            self.template.initialize()
+            template.initialize()
+            trace_repository(__templates_prefix__ + template_name, False)
 
         # Set user signature
-        self.template.set_default_signature(kwargs['auth']['user'], 'TODO') # TODO set mail
+        template.set_default_signature(auth_info['user'], 'TODO') # TODO set mail
 
         # Make sure 'origin' remote exists
-        self.template.set_remote(remote_url, 'origin')
+        template.set_remote(remote_url, 'origin')
+        self.setup_remote(template)
+        workspace.touch(template.path)
 
         # Update our local copy
         try:
-            self.template.pull('origin')
+            template.pull('origin')
         except BranchNotFoundException:
             raise HTTPError(
                 status_code=503,
@@ -72,8 +120,10 @@ class AbstractTemplateHandler(AbstractWorkspaceHandler):
                 status_code=401,
                 log_message='You\'re not authorized to access this template.'
             )
+        except RemoteUnavailableException as error:
+            return template, error
 
-        return self.template
+        return template, None
 
     def data_received(self, *args, **kwargs):
         """
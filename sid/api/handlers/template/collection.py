@@ -8,6 +8,8 @@ from sid.api.handlers.warehouse import AbstractWarehouseHandler
 __templates_prefix__ = 'templates/'
 
 @http.json_error_handling
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class TemplateCollectionHandler(AbstractWarehouseHandler):
     """
@@ -0,0 +1,47 @@
+"""
+ProjectTemplateJobHandler module (see handler documentation)
+"""
+
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.workspace import AbstractWorkspaceHandler
+from sid.api.jobs import Job, JobNotFoundException
+
+@http.json_error_handling
+@http.admission_control
+@http.server_timing
+@http.json_serializer
+class ProjectTemplateJobHandler(AbstractWorkspaceHandler):
+    """
+    This handler process following routes:
+
+        - GET /projects/<project_name>/template/jobs/<id> -- Get state of a template installation
+    """
+
+    @auth.require_authentication()
+    @http.available_content_type(['application/json'])
+    def get(self, project_name, job_id, *args, **kwargs):
+        """
+        Get state of a template installation or upgrade.
+
+        Example:
+        > GET /projects/example/template/jobs/0123456789abcdef0123456789abcdef HTTP/1.1
+        > Accept: */*
+        >
+        """
+        try:
+            job = Job.load(self.get_jobs_dir(kwargs['auth']['user']), job_id)
+        except JobNotFoundException:
+            raise HTTPError(
+                status_code=404,
+                log_message='Template job not found.'
+            )
+
+        # Job must be a template job of the given project
+        if job.get('kind') != u'template' or job.get('project') != project_name:
+            raise HTTPError(
+                status_code=404,
+                log_message='Template job not found.'
+            )
+
+        self.write(job)
@@ -0,0 +1,119 @@
+"""
+ProjectTemplatePreviewHandler module (see handler documentation)
+"""
+
+from tornado import gen
+from sid.api import http, auth
+from sid.api.handlers.template import AbstractProjectTemplateHandler
+from sid.api.schemas import TEMPLATE_PREVIEW_SCHEMA
+from sid.lib.git import Repository
+from sid.lib.project import __empty_tree__
+from sid.lib.metrics import run_traced, cache_status
+from sid.lib import render
+
+def preview_project_template(project, template, version, data, upgrade, renderer, cache=None, patch=False):
+    """
+    Compute changes an installation or upgrade of a template would make on
+    given project. Template is rendered in a scratch clone (or taken from
+    the render cache) and compared to project HEAD in memory: neither the
+    working directory nor the branches of the project are modified.
+
+    Arguments:
+    patch -- Include patch text (default: False)
+
+    Other arguments: (see sid.api.handlers.template.project.render_project_template)
+
+    Returns:
+    A dictionnary with paths 'added', 'changed' and 'removed', 'patch' if
+    requested and 'cached' (True if render was found in cache)
+    """
+    base_tree = project.get_base_tree()
+    old_revision = None if base_tree == __empty_tree__ else base_tree
+
+    key = AbstractProjectTemplateHandler.get_render_key(cache, project, template, version, data, upgrade)
+    if key is not None:
+        if cache.lookup(key):
+            repository = cache.open()
+
+            # Cached render contains the tree it was rendered on
+            if old_revision is None or old_revision in repository.repo:
+                cache_status('renders', True)
+                return dict(repository.diff_trees(old_revision, cache.get_ref_name(key), patch), cached=True)
+        cache_status('renders', False)
+
+    scratch = render.create_scratch(project)
+    try:
+        result = AbstractProjectTemplateHandler.render_template(
+            renderer, cache, key, scratch, project, template, version, data, upgrade
+        )
+
+        repository = Repository(scratch)
+        repository.open()
+        return dict(repository.diff_trees(old_revision, result['commit'], patch), cached=False)
+    finally:
+        render.remove_scratch(scratch)
+
+@http.json_error_handling
+@http.admission_control
+@http.server_timing
+@http.json_serializer
+class ProjectTemplatePreviewHandler(AbstractProjectTemplateHandler):
+    """
+    This handler process following routes:
+
+        - POST /projects/<project_name>/template:preview -- Preview changes of a template installation
+    """
+
+    @auth.require_authentication()
+    @http.accepted_content_type(['application/json'])
+    @http.available_content_type(['application/json'])
+    @http.parse_json_body(TEMPLATE_PREVIEW_SCHEMA)
+    @gen.coroutine
+    def post(self, project_name, *args, **kwargs):
+        """
+        Preview changes an installation or upgrade of specified template
+        would make on targeted project (see ProjectTemplateHandler.put),
+        without modifying it. Patch text is returned if 'patch' is true.
+
+        Example:
+        > POST /projects/example/template:preview HTTP/1.1
+        > Accept: */*
+        > Content-Type: application/json
+        > Content-Length: 90
+        >
+        {"name":"my-template", "version":"^1.2", "data":{"customer":"example.com"}, "patch":true}
+        """
+        template_name = kwargs['json']['name']
+        template_data = kwargs['json']['data']
+
+        # Fetch and load the project and template
+        yield self._prepare_repositories(project_name, template_name)
+
+        # Check requested template, version and data
+        template_version, upgrade = self._check_template_request(
+            template_name,
+            kwargs['json']['version'],
+            template_data
+        )
+
+        # Rendering is waiting for a render process, don't block the loop
+        changes = yield self.application.settings['preparations'].submit(
+            run_traced,
+            self.trace,
+            preview_project_template,
+            self.project,
+            self.template,
+            template_version,
+            template_data,
+            upgrade,
+            self.application.settings['renderer'],
+            self.application.settings.get('render_cache'),
+            kwargs['json'].get('patch', False)
+        )
+
+        self.write(dict(
+            changes,
+            name=template_name,
+            version=template_version,
+            operation='upgrade' if upgrade else 'install'
+        ))
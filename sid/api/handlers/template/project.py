@@ -2,21 +2,128 @@
 ProjectTemplateHandler module (see handler documentation)
 """
 
-from jsonschema import ValidationError, SchemaError
+import time
+from tornado import gen
 from tornado.web import HTTPError
 from sid.api import http, auth
-from sid.api.handlers.project import AbstractProjectHandler
-from sid.api.handlers.template import AbstractTemplateHandler
+from sid.api.handlers.template import AbstractProjectTemplateHandler
+from sid.api.jobs import Job, JobQueueFullException
 from sid.api.schemas import TEMPLATE_SCHEMA
+from sid.lib.git import GitMergeConflictException
+from sid.lib.template import TemplateException
+from sid.lib import render
+
+__template_job__ = u'template'
+
+def render_project_template(job, project, template, version, data, upgrade, renderer, cache=None):
+    """
+    Install or upgrade a template on given project. This function is
+    executed by the job runner: template is rendered by a render process in
+    a scratch clone, then rendered commit is applied to the project. Errors
+    are reported as HTTP errors in job state.
+
+    Installations already rendered (same template version, data and
+    project tree) are committed from the render cache instead.
+
+    Arguments:
+    job -- Template job.
+    project -- Prepared project.
+    template -- Prepared template (given version is checked out again)
+    version -- Template version.
+    data -- Validated template data.
+    upgrade -- Upgrade installed template instead of installing it.
+    renderer -- Render pool (see sid.lib.render.RenderPool)
+    cache -- Render cache (see sid.lib.render.RenderCache, optional)
+    """
+    operation = 'upgrade' if upgrade else 'install'
+
+    # Request released its locks: project and template may have been used by
+    # another request since, hold both until the render is applied.
+    project_lock = AbstractProjectTemplateHandler.wait_clone(project.path)
+    try:
+        template_lock = AbstractProjectTemplateHandler.wait_clone(template.path)
+        try:
+            try:
+                template.checkout_version(version)
+            except TemplateException as error:
+                raise HTTPError(
+                    status_code=409,
+                    log_message='Template changed before its %s: %s' % (operation, error.message)
+                )
+
+            return _render_project_template(job, project, template, version, data, upgrade, renderer, cache)
+        finally:
+            template_lock.release()
+    finally:
+        project_lock.release()
+
+def _render_project_template(job, project, template, version, data, upgrade, renderer, cache):
+    """
+    Render and apply a template on a project which clone is locked, with
+    template checked out in given version (see render_project_template)
+    """
+    operation = 'upgrade' if upgrade else 'install'
+
+    key = AbstractProjectTemplateHandler.get_render_key(cache, project, template, version, data, upgrade)
+    if key is not None and cache.lookup(key):
+        job.update_progress(step='committing', cached=True)
+        started = time.time()
+        try:
+            project.apply_cached_render(cache.path, cache.get_ref_name(key), job.id)
+        except GitMergeConflictException as error:
+            raise http.DetailedHTTPError(
+                status_code=409,
+                log_message='Project changed during template %s and changes are conflicting.' % operation,
+                details={'conflicts': error.conflicts}
+            )
+        render.RENDER_DURATION.observe(time.time() - started, operation=operation, status='cached')
+        return {
+            'name': template.get_name(),
+            'version': version,
+            'operation': operation,
+            'commit': project.repo.head.target.hex,
+            'cached': True
+        }
+
+    job.update_progress(step='rendering', cached=False)
+
+    scratch = render.create_scratch(project)
+    try:
+        result = AbstractProjectTemplateHandler.render_template(
+            renderer, cache, key, scratch, project, template, version, data, upgrade
+        )
+
+        job.update_progress(step='committing')
+        try:
+            project.apply_render(scratch, result, job.id)
+        except GitMergeConflictException as error:
+            raise http.DetailedHTTPError(
+                status_code=409,
+                log_message='Project changed during template %s and changes are conflicting.' % operation,
+                details={'conflicts': error.conflicts}
+            )
+    finally:
+        render.remove_scratch(scratch)
+
+    return {
+        'name': template.get_name(),
+        'version': version,
+        'operation': operation,
+        'commit': result['commit'],
+        'cached': False
+    }
 
 @http.json_error_handling
+@http.idempotent
+@http.admission_control
+@http.server_timing
 @http.json_serializer
-class ProjectTemplateHandler(AbstractTemplateHandler, AbstractProjectHandler):
+class ProjectTemplateHandler(AbstractProjectTemplateHandler):
     """
     This handler process following routes:
 
         - GET /projects/<project_name>/template -- Get information about template installed on given project
-        - PUT /projects/<project_name>/template -- Install a template on targeted project
+        - PUT /projects/<project_name>/template -- Queue installation of a template on targeted project
     """
 
     def get(self, project_name, *args, **kwargs):
@@ -43,9 +150,11 @@ class ProjectTemplateHandler(AbstractTemplateHandler, AbstractProjectHandler):
     @http.accepted_content_type(['application/json'])
     @http.available_content_type(['application/json'])
     @http.parse_json_body(TEMPLATE_SCHEMA)
+    @gen.coroutine
     def put(self, project_name, *args, **kwargs):
         """
-        Install or upgrade specified template on targeted project.
+        Queue installation or upgrade of specified template on targeted
+        project. Its state can be followed from the returned 'Location'.
 
         Example:
         > PUT /projects/example/template HTTP/1.1
@@ -54,85 +163,50 @@ class ProjectTemplateHandler(AbstractTemplateHandler, AbstractProjectHandler):
         > Content-Length: 76
         >
         {"name":"my-template", "version":"1.0.0", "data":{"customer":"example.com"}}
+
+        Version can also be 'latest' or a range such as '^1.2' or '>=1.2,<2'
+        (see sid.lib.versions): highest matching version is installed.
         """
         template_name = kwargs['json']['name']
         template_version = kwargs['json']['version']
         template_data = kwargs['json']['data']
 
         # Fetch and load the project and template
-        self.prepare_project(project_name)
-        self.prepare_template(template_name)
+        yield self._prepare_repositories(project_name, template_name)
 
-        # Install procedure (if not any template installed previously)
-        if not self.project.has_template():
-            # Check if version is available
-            self._check_template_version(template_version)
+        # Check requested template, version and data
+        template_version, upgrade = self._check_template_request(template_name, template_version, template_data)
 
-            # Validate template schema
-            self._check_template_data(template_data)
+        # NOTE Should we check if new version is younger ????
+        # If yes, where do we check ? Here or in model (Project class)
+        job = Job(
+            self.get_jobs_dir(kwargs['auth']['user']),
+            __template_job__,
+            project=project_name,
+            template=template_name,
+            version=template_version
+        )
 
-            # Install template to the project
-            self.project.install_template(
+        try:
+            self.application.settings['template_jobs'].submit(
+                job,
+                render_project_template,
+                self.project,
                 self.template,
                 template_version,
-                template_data
+                template_data,
+                upgrade,
+                self.application.settings['renderer'],
+                self.application.settings.get('render_cache')
             )
-
-        # Upgrade procedure if current template name equals given one
-        else:
-            if self.template.get_name() != template_name:
-                raise HTTPError(
-                    status_code=409,
-                    log_message='A template is already installed on this project'
-                )
-
-            # Check if version is available
-            self._check_template_version(template_version)
-
-            # Validate template schema
-            self._check_template_data(template_data)
-
-            # Upgrade template
-            # NOTE Should we check if new version is younger ????
-            # If yes, where do we check ? Here or in model (Project class)
-            self.project.upgrade_template(
-                template_version,
-                template_data
+        except JobQueueFullException:
+            raise http.DetailedHTTPError(
+                status_code=503,
+                log_message='Too many template installations in progress, please retry later.',
+                headers={'Retry-After': '5'}
             )
 
-    def _check_template_version(self, version):
-        """
-        Check if version is available for loaded template or raise a 400 error.
-
-        It will also checkout given version on local template copy.
-
-        Arguments:
-        version -- Template version.
-        """
-        if version not in self.template.get_versions():
-            raise HTTPError(
-                status_code=400,
-                log_message='Version \'%s\' could not be found for this template' % version
-            )
-
-        self.template.checkout_version(version)
-
-    def _check_template_data(self, data):
-        """
-        Check if user data are valid for loaded template.
-
-        Arguments:
-        data -- Data to validate.
-        """
-        try:
-            self.template.validate(data)
-        except ValidationError as vlde:
-            raise HTTPError(
-                status_code=400,
-                log_message='JSON error: %s' % vlde.message
-            )
-        except SchemaError:
-            raise HTTPError(
-                status_code=500,
-                log_message='Invalid template JSON schema.'
-            )
+        # Rendering may take a while, return a '202 - Accepted' code with the job
+        self.set_status(202)
+        self.set_header('Location', http.join_url_path('/projects', project_name, 'template', 'jobs', job.id))
+        self.write(job.to_dict())
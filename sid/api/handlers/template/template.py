@@ -8,10 +8,13 @@ from sid.api import http, auth
 from sid.api.handlers.template import AbstractTemplateHandler
 from sid.api.handlers.warehouse import AbstractWarehouseHandler
 from sid.lib.template import TemplateException
+from sid.lib.versions import VersionSpecException
 
 __templates_prefix__ = 'templates/'
 
 @http.json_error_handling
+@http.admission_control
+@http.server_timing
 @http.json_serializer
 class TemplateHandler(AbstractWarehouseHandler, AbstractTemplateHandler):
     """
@@ -30,7 +33,7 @@ class TemplateHandler(AbstractWarehouseHandler, AbstractTemplateHandler):
         Fetch template and get its details.
 
         Example:
-        > GET /templates/example HTTP/1.1
+        > GET /templates/example?versions=^1.2 HTTP/1.1
         > Accept: */*
         >
         """
@@ -51,9 +54,22 @@ class TemplateHandler(AbstractWarehouseHandler, AbstractTemplateHandler):
         # TODO We should checkout in given version (or master if not specified)
 
         if output_content_type == 'application/json':
+            versions = self.template.get_version_index()
+
+            # Versions can be filtered by a range (such as '^1.2')
+            spec = self.get_argument('versions', None)
+            try:
+                selected = versions.select(spec) if spec else versions.versions
+            except VersionSpecException as error:
+                raise HTTPError(
+                    status_code=400,
+                    log_message=error.message
+                )
+
             self.write({
                 'name': self.template.get_name(),
-                'versions': self.template.get_versions()
+                'versions': selected,
+                'latest': versions.latest()
             })
 
         elif output_content_type == 'application/schema+json':
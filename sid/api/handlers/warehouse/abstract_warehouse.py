@@ -4,10 +4,18 @@ AbstractWarehouseHandler module (see handler documentation)
 
 import os
 from tornado.web import HTTPError
-from sid.api import http, auth
+from sid.api import http, auth, workspace
 from sid.api.handlers.workspace import AbstractWorkspaceHandler
 from sid.lib.warehouse import Warehouse
-from sid.lib.git import OAuthCallback, RepositoryNotFoundException, BranchNotFoundException, ForbiddenException
+from sid.lib.metrics import trace_repository, run_traced
+from sid.lib.git import (
+    OAuthCallback,
+    RepositoryNotFoundException,
+    BranchNotFoundException,
+    ForbiddenException,
+    GitAutomaticMergeNotAvailable,
+    RemoteUnavailableException
+)
 
 __repository_name__ = u'warehouse'
 __repository_remote_name__ = u'origin'
@@ -32,6 +40,8 @@ class AbstractWarehouseHandler(AbstractWorkspaceHandler):
         local_path = os.path.join(self.workspace_dir, kwargs['auth']['user'], __repository_name__)
         remote_url = http.join_url_path(self.remote_base_url, __repository_remote_path__)
 
+        self.lock_clone(local_path)
+
         # Initialize Warehouse repository
         self.warehouse = Warehouse(local_path)
 
@@ -46,18 +56,24 @@ class AbstractWarehouseHandler(AbstractWorkspaceHandler):
         # Try to open Git repository or initialize it
         try:
             self.warehouse.open()
+            trace_repository(__repository_remote_path__, True)
         except RepositoryNotFoundException:
             self.warehouse.initialize()
+            trace_repository(__repository_remote_path__, False)
 
         # Set user signature
         self.warehouse.set_default_signature(kwargs['auth']['user'], 'TODO') # TODO set mail
 
         # Make sure 'origin' remote exists
         self.warehouse.set_remote(remote_url, __repository_remote_name__)
+        self.setup_remote(self.warehouse)
+        workspace.touch(self.warehouse.path)
 
         # Update our local copy
         try:
-            self.warehouse.pull(__repository_remote_name__)
+            # Local warehouse is never ahead of its remote; diverged history
+            # comes from changes which failed to be pushed and must be discarded.
+            self.warehouse.pull(__repository_remote_name__, merge=False)
         except BranchNotFoundException:
             raise HTTPError(
                 status_code=500,
@@ -69,10 +85,36 @@ class AbstractWarehouseHandler(AbstractWorkspaceHandler):
                 status_code=401,
                 log_message='You\'re not authorized to manage projects.'
             )
+        except GitAutomaticMergeNotAvailable:
+            # Local copy contains changes which could not be pushed previously,
+            # remote configuration is the reference: discard them.
+            self.warehouse.reset_hard('refs/remotes/%s/master' % __repository_remote_name__)
+        except RemoteUnavailableException as error:
+            self.serve_stale(self.warehouse, error)
 
         # Load Pyolite content
         self.warehouse.load()
 
+    def save_warehouse(self, message):
+        """
+        Save warehouse changes (see sid.lib.warehouse.Warehouse.save) from
+        another thread: pushes are retried with a backoff which must not
+        block the IOLoop. Warehouse clone stays locked by the request.
+
+        Arguments:
+        message -- Commit message.
+
+        Returns:
+        A future resolved once changes are pushed (save errors are raised
+        when yielded)
+        """
+        return self.application.settings['preparations'].submit(
+            run_traced,
+            getattr(self, 'trace', None),
+            self.warehouse.save,
+            message
+        )
+
     def data_received(self, *args, **kwargs):
         """
         Implementation of astract data_received.
@@ -3,3 +3,4 @@ This package contains every handlers linked to workspace resource.
 """
 
 from .abstract_workspace import AbstractWorkspaceHandler
+from .usage import WorkspaceUsageHandler
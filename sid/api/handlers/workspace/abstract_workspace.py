@@ -3,8 +3,12 @@ AbstractWorkspaceHandler module (see handler documentation)
 """
 
 import os
+import math
 from tornado.web import RequestHandler, HTTPError
-from sid.api import http, auth
+from sid.api import http, auth, workspace
+
+__jobs_prefix__ = 'jobs/'
+__stale_methods__ = ('GET', 'HEAD')
 
 @http.json_error_handling
 class AbstractWorkspaceHandler(RequestHandler):
@@ -21,9 +25,16 @@ class AbstractWorkspaceHandler(RequestHandler):
         Arguments:
         workspace_dir -- Base workspace directory.
         remote_url -- Base remote URL.
+        fetch_timeout -- Maximum duration of a fetch in seconds (0 for no limit)
+        push_timeout -- Maximum duration of a push in seconds (0 for no limit)
         """
-        self.workspace_dir = self.application.settings.get('app').get('workspace_dir')
-        self.remote_base_url = self.application.settings.get('app').get('remote_url')
+        app_settings = self.application.settings.get('app')
+        self.workspace_dir = app_settings.get('workspace_dir')
+        self.remote_base_url = app_settings.get('remote_url')
+        self.transfer_timeouts = {
+            'fetch': float(app_settings.get('fetch_timeout', 60)) or None,
+            'push': float(app_settings.get('push_timeout', 120)) or None
+        }
 
     @auth.require_authentication()
     def prepare(self, **kwargs):
@@ -54,6 +65,121 @@ class AbstractWorkspaceHandler(RequestHandler):
         # Change working directory
         os.chdir(user_workspace_dir)
 
+    def lock_clone(self, path):
+        """
+        Lock a clone of user workspace until the request is finished.
+        Requests never wait for a clone used by another request or job.
+
+        Arguments:
+        path -- Clone directory.
+
+        Raises:
+        HTTPError 503 if clone is busy.
+        """
+        if not hasattr(self, 'clone_locks'):
+            self.clone_locks = []
+
+        lock = workspace.CloneLock.get(path)
+        if lock in self.clone_locks:
+            return
+
+        if not lock.try_acquire():
+            raise http.DetailedHTTPError(
+                status_code=503,
+                log_message='This repository is being modified by another operation, please retry later.',
+                headers={'Retry-After': '1'}
+            )
+        self.clone_locks.append(lock)
+
+    @staticmethod
+    def wait_clone(path):
+        """
+        Wait for the lock of a clone from a job thread (see
+        sid.api.workspace.CloneLock). Caller must release it.
+
+        Arguments:
+        path -- Clone directory.
+
+        Returns:
+        Acquired lock.
+
+        Raises:
+        HTTPError 503 if clone stayed busy.
+        """
+        lock = workspace.CloneLock.get(path)
+        try:
+            lock.acquire()
+        except workspace.CloneBusyException:
+            raise HTTPError(
+                status_code=503,
+                log_message='This repository is being modified by another operation, please retry later.'
+            )
+        return lock
+
+    def on_finish(self):
+        """
+        Release clones locked by the request.
+        """
+        for lock in getattr(self, 'clone_locks', []):
+            lock.release()
+        self.clone_locks = []
+
+    def setup_remote(self, repository):
+        """
+        Apply transfer deadlines and circuit breaker of the remote to a
+        repository.
+
+        Arguments:
+        repository -- Repository of user workspace.
+        """
+        repository.set_timeouts(self.transfer_timeouts)
+
+        circuit_breakers = self.application.settings.get('circuit_breakers')
+        if circuit_breakers is not None:
+            repository.set_circuit_breaker(circuit_breakers.get(self.remote_base_url))
+
+    def serve_stale(self, repository, error):
+        """
+        Handle an unavailable remote while updating a local copy. Read
+        requests are served from the local copy, flagged with a 'Warning'
+        header; other requests fail.
+
+        Arguments:
+        repository -- Local copy which could not be updated.
+        error -- RemoteUnavailableException.
+
+        Raises:
+        HTTPError 503 if request cannot be served from local copy.
+        """
+        if self.request.method in __stale_methods__ and not repository.is_empty():
+            self.set_header('Warning', '110 - "Response is Stale"')
+            return
+
+        raise AbstractWorkspaceHandler.remote_unavailable(error)
+
+    @staticmethod
+    def remote_unavailable(error):
+        """
+        Return HTTP error (to be raised) of an unavailable remote.
+
+        Arguments:
+        error -- RemoteUnavailableException.
+        """
+        return http.DetailedHTTPError(
+            status_code=503,
+            log_message='Remote repositories are unavailable, please retry later.',
+            headers={'Retry-After': str(max(1, int(math.ceil(error.retry_after))))}
+        )
+
+    def get_jobs_dir(self, user):
+        """
+        Return directory where jobs of given user are stored.
+
+        Arguments:
+        user -- User name.
+        """
+        return os.path.join(self.workspace_dir, user, __jobs_prefix__)
+
     def data_received(self, *args, **kwargs):
         """
         Implementation of astract data_received.
@@ -0,0 +1,45 @@
+"""
+WorkspaceUsageHandler module (see handler documentation)
+"""
+
+from tornado.web import HTTPError
+from sid.api import http, auth
+from sid.api.handlers.workspace.abstract_workspace import AbstractWorkspaceHandler
+
+@http.json_error_handling
+@http.admission_control
+@http.server_timing
+@http.json_serializer
+class WorkspaceUsageHandler(AbstractWorkspaceHandler):
+    """
+    This handler process following routes:
+
+        - GET /workspace -- Get disk usage of logged in user's workspace
+    """
+
+    @auth.require_authentication()
+    @http.available_content_type(['application/json'])
+    def get(self, *args, **kwargs):
+        """
+        Get disk usage of every clone of logged in user, as measured by last
+        workspace collection (see sid.api.workspace).
+
+        Example:
+        > GET /workspace HTTP/1.1
+        > Accept: */*
+        >
+        """
+        report = self.application.settings['workspace'].read_usage()
+        if report is None:
+            raise HTTPError(
+                status_code=503,
+                log_message='Workspace usage has not been measured yet, please retry later.'
+            )
+
+        usage = report['users'].get(kwargs['auth']['user'], {'size': 0, 'clones': []})
+        self.write({
+            'user': kwargs['auth']['user'],
+            'timestamp': report['timestamp'],
+            'size': usage['size'],
+            'clones': usage['clones']
+        })
@@ -6,10 +6,34 @@ import os
 import posixpath
 import json
 import urlparse
+import functools
+from tornado import stack_context
+from tornado.web import HTTPError
+from sid.lib.metrics import Trace, timed, traced, stop_trace
 
 from sid.api.http.rfc7231 import accepted_content_type, available_content_type
 from sid.api.http.rfc7159 import parse_json_body
 from sid.api.http.encoder import Encoder
+from sid.api.http.admission import admission_control
+from sid.api.http.idempotency import idempotent
+
+class DetailedHTTPError(HTTPError):
+    """
+    HTTPError with additional details to be returned in error body and
+    additional headers to be returned with the error.
+    """
+
+    def __init__(self, status_code=500, log_message=None, details=None, headers=None, *args, **kwargs):
+        """
+        Construct a DetailedHTTPError.
+
+        Arguments: (see tornado.web.HTTPError)
+        details -- JSON serializable details of the error.
+        headers -- Dictionnary of headers of the error response (such as 'Retry-After')
+        """
+        super(DetailedHTTPError, self).__init__(status_code, log_message, *args, **kwargs)
+        self.details = details
+        self.headers = headers
 
 def join_url_path(url, *paths):
     """
@@ -44,7 +68,9 @@ def json_serializer(handler_class):
             # TODO What happening on encoding failure ? Do we have to handle that
             # with a HTTPError 500 ?
             if self._headers['Content-Type'] == 'application/json': # pylint: disable=W0212
-                return handler_write(self, json.dumps(chunk, cls=Encoder, sort_keys=True), *args, **kwargs)
+                with timed('encode'):
+                    chunk = json.dumps(chunk, cls=Encoder, sort_keys=True)
+                return handler_write(self, chunk, *args, **kwargs)
             else:
                 return handler_write(self, chunk, *args, **kwargs)
 
@@ -83,12 +109,23 @@ def json_error_handling(handler_class):
             if status_code == 500 and not log_message:
                 log_message = 'An internal error occured, please contact your system administrator'
 
-            # Send error object
-            self.set_header('Content-Type', 'application/json')
-            self.write({
+            error = {
                 'code': status_code,
                 'message': log_message
-            })
+            }
+
+            # Add details of error if any
+            details = getattr(err, 'details', None)
+            if details is not None:
+                error['details'] = details
+
+            # Add headers of error if any
+            for name, value in (getattr(err, 'headers', None) or {}).items():
+                self.set_header(name, value)
+
+            # Send error object
+            self.set_header('Content-Type', 'application/json')
+            self.write(error)
 
         return write_error
 
@@ -96,6 +133,77 @@ def json_error_handling(handler_class):
     handler_class.write_error = wrap_write_error()
     return handler_class
 
+def server_timing(handler_class):
+    """
+    Monkey patch '_execute', 'flush' and 'on_finish' functions of
+    RequestHandler to trace the phases of each request and report their
+    durations in a 'Server-Timing' header.
+
+    Requests processed by the IOLoop are interleaved when handlers are
+    coroutines: the trace of the request is restored by a StackContext
+    whenever one of its callbacks runs. Functions executed by other threads
+    must be given the trace explicitly (see sid.lib.metrics.run_traced)
+
+    This function MUST be used as a class decorator for RequestHandler.
+    """
+
+    def wrap_execute(handler_execute):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        def _execute(self, *args, **kwargs):
+            """
+            Execute the request in the context of its trace.
+            """
+            if getattr(self, 'trace', None) is None:
+                self.trace = Trace()
+            with stack_context.StackContext(functools.partial(traced, self.trace)):
+                return handler_execute(self, *args, **kwargs)
+
+        return _execute
+
+    def wrap_flush(handler_flush):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        def flush(self, *args, **kwargs):
+            """
+            Add 'Server-Timing' header before headers are sent.
+            """
+            trace = getattr(self, 'trace', None)
+            if trace is not None and not self._headers_written: # pylint: disable=W0212
+                self.set_header('Server-Timing', ', '.join(
+                    '%s;dur=%.1f' % (phase, 1000.0 * duration)
+                    for phase, duration in trace.get_durations()
+                ))
+            return handler_flush(self, *args, **kwargs)
+
+        return flush
+
+    def wrap_on_finish(handler_on_finish):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        def on_finish(self, *args, **kwargs):
+            """
+            Stop tracing the request once finished.
+            """
+            try:
+                return handler_on_finish(self, *args, **kwargs)
+            finally:
+                stop_trace(getattr(self, 'trace', None))
+
+        return on_finish
+
+    # Monkey patch '_execute', 'flush' and 'on_finish' functions with our decorator
+    handler_class._execute = wrap_execute(handler_class._execute) # pylint: disable=W0212
+    handler_class.flush = wrap_flush(handler_class.flush)
+    handler_class.on_finish = wrap_on_finish(handler_class.on_finish)
+    return handler_class
+
 def is_safe_path(base, path, follow_symlinks=True):
     """
     This function check the given path and make sure it's safe.
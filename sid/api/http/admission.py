@@ -0,0 +1,75 @@
+"""
+This module contains decorator which applies worker admission control
+(see sid.api.admission) to request handlers.
+"""
+
+import time
+from tornado import gen
+from sid.api.admission import AdmissionRejectedException, get_client, get_queue_wait
+
+def admission_control(handler_class):
+    """
+    Monkey patch 'prepare' and 'on_finish' functions of RequestHandler to
+    admit requests before preparing them and to release their slot once
+    finished. Rejected requests get a '503 Service Unavailable' error with a
+    'Retry-After' header.
+
+    Admission controller is taken from 'admission' application setting.
+
+    This function MUST be used as a class decorator for RequestHandler.
+    """
+    # Avoid circular import (sid.api.http is importing this module)
+    from sid.api.http import DetailedHTTPError
+
+    def wrap_prepare(handler_prepare):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        @gen.coroutine
+        def prepare(self, *args, **kwargs):
+            """
+            Wait for admission then prepare the request.
+            """
+            controller = self.application.settings.get('admission')
+            if controller is not None and getattr(self, 'admission', None) is None:
+                try:
+                    self.admission = yield controller.admit(
+                        self.request.method,
+                        get_client(self.request),
+                        get_queue_wait(self.request, time.time())
+                    )
+                except AdmissionRejectedException as error:
+                    raise DetailedHTTPError(
+                        status_code=503,
+                        log_message=error.message,
+                        headers={'Retry-After': str(error.retry_after)}
+                    )
+
+            result = handler_prepare(self, *args, **kwargs)
+            if result is not None:
+                yield result
+
+        return prepare
+
+    def wrap_on_finish(handler_on_finish):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        def on_finish(self, *args, **kwargs):
+            """
+            Release admission slot of the request.
+            """
+            ticket = getattr(self, 'admission', None)
+            if ticket is not None:
+                self.admission = False
+                self.application.settings['admission'].release(ticket)
+            return handler_on_finish(self, *args, **kwargs)
+
+        return on_finish
+
+    # Monkey patch 'prepare' and 'on_finish' functions with our decorator
+    handler_class.prepare = wrap_prepare(handler_class.prepare)
+    handler_class.on_finish = wrap_on_finish(handler_class.on_finish)
+    return handler_class
@@ -0,0 +1,125 @@
+"""
+This module contains decorator which replays stored responses of requests
+retried with the same 'Idempotency-Key' header (see sid.api.idempotency).
+"""
+
+from tornado import gen
+from tornado.web import RequestHandler, HTTPError
+from sid.api.admission import get_client
+from sid.api.idempotency import (
+    IdempotencyConflictException,
+    IdempotencyMismatchException,
+    get_scope,
+    get_fingerprint
+)
+
+__idempotent_methods__ = ('POST', 'PUT', 'PATCH', 'DELETE')
+__replayed_headers__ = ('Content-Type', 'Location', 'ETag')
+
+def idempotent(handler_class):
+    """
+    Monkey patch 'prepare' and 'finish' functions of RequestHandler to
+    support 'Idempotency-Key' header on mutating requests.
+
+    The first request with a key is processed as usual and its response is
+    stored (unless it's a server error). A retry with the same key gets the
+    stored response with an 'Idempotent-Replayed' header, before anything
+    else is prepared (such as pulling repositories). A retry received while
+    the first request is in progress gets a '409 Conflict' error, a key
+    reused with another body gets a '422 Unprocessable Entity' error.
+
+    Store is taken from 'idempotency' application setting. Streamed
+    responses (already flushed before finishing) are not stored.
+
+    This function MUST be used as a class decorator for RequestHandler.
+    """
+    # Avoid circular import (sid.api.http is importing this module)
+    from sid.api.http import DetailedHTTPError
+
+    def wrap_prepare(handler_prepare):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        @gen.coroutine
+        def prepare(self, *args, **kwargs):
+            """
+            Replay stored response of a retried request or prepare the request.
+            """
+            store = self.application.settings.get('idempotency')
+            key = self.request.headers.get('Idempotency-Key')
+
+            if store is not None and key and self.request.method in __idempotent_methods__:
+                scope = get_scope(get_client(self.request), self.request.method, self.request.uri, key)
+                try:
+                    response = store.begin(scope, get_fingerprint(self.request.body))
+                except IdempotencyConflictException as error:
+                    raise DetailedHTTPError(
+                        status_code=409,
+                        log_message=error.message,
+                        headers={'Retry-After': '1'}
+                    )
+                except IdempotencyMismatchException as error:
+                    raise HTTPError(
+                        status_code=422,
+                        log_message=error.message
+                    )
+
+                if response is not None:
+                    for name, value in response['headers'].items():
+                        self.set_header(name, value)
+                    self.set_header('Idempotent-Replayed', 'true')
+                    self.set_status(response['status'])
+
+                    # Body is already encoded, don't use any serializer
+                    RequestHandler.write(self, response['body'])
+                    self.finish()
+                    return
+
+                self.idempotency_scope = scope
+
+            result = handler_prepare(self, *args, **kwargs)
+            if result is not None:
+                yield result
+
+        return prepare
+
+    def wrap_finish(handler_finish):
+        """
+        This function generate the monkey patch based on original function.
+        """
+
+        def finish(self, chunk=None):
+            """
+            Store response of a request with an idempotency key. Server
+            errors are not stored, the request can then be retried.
+            """
+            scope = getattr(self, 'idempotency_scope', None)
+            if scope is not None:
+                self.idempotency_scope = None
+                store = self.application.settings['idempotency']
+
+                if chunk is not None:
+                    self.write(chunk)
+                    chunk = None
+
+                if self.get_status() < 500 and not self._headers_written: # pylint: disable=W0212
+                    store.complete(scope, {
+                        'status': self.get_status(),
+                        'headers': dict(
+                            (name, self._headers[name]) # pylint: disable=W0212
+                            for name in __replayed_headers__ if name in self._headers # pylint: disable=W0212
+                        ),
+                        'body': b''.join(self._write_buffer) # pylint: disable=W0212
+                    })
+                else:
+                    store.abort(scope)
+
+            return handler_finish(self, chunk)
+
+        return finish
+
+    # Monkey patch 'prepare' and 'finish' functions with our decorator
+    handler_class.prepare = wrap_prepare(handler_class.prepare)
+    handler_class.finish = wrap_finish(handler_class.finish)
+    return handler_class
@@ -8,6 +8,7 @@ JSON schema is used by 'jsonschema' library as described by Wright RFC draft
 from json import loads
 from jsonschema import validate, ValidationError, SchemaError
 from tornado.web import HTTPError
+from sid.lib.metrics import timed
 
 def parse_json_body(schema=None):
     """ Decorate to parse HTTP body in JSON """
@@ -28,7 +29,8 @@ def parse_json_body(schema=None):
             # Validate JSON body if schema given
             if schema is not None:
                 try:
-                    validate(data, schema)
+                    with timed('validate'):
+                        validate(data, schema)
                 except ValidationError as vlde:
                     raise HTTPError(
                         status_code=400,
@@ -5,50 +5,185 @@ This file contains the HTTP server initialization script.
 It's building all the project routes and connect them to their handlers.
 """
 
+import os
+import functools
 import anyconfig
 import tornado
 import tornado.process
 from tornado.httpserver import HTTPServer
-from tornado.web import Application
-from tornado.ioloop import IOLoop
+from tornado.web import Application, URLSpec
+from tornado.ioloop import IOLoop, PeriodicCallback
 from jsonschema import validate, ValidationError
+from concurrent.futures import ThreadPoolExecutor
 
 from sid.api.handlers.misc import (
     NotFoundHandler,
-    VersionHandler
+    VersionHandler,
+    MetricsHandler
 )
 from sid.api.handlers.project import (
     ProjectCollectionHandler,
     ProjectHandler,
-    ProjectDeploymentHandler
+    ProjectDeploymentHandler,
+    ProjectDeploymentStatusHandler,
+    BulkDeploymentHandler
 )
 from sid.api.handlers.template import (
     TemplateCollectionHandler,
     TemplateHandler,
-    ProjectTemplateHandler
+    ProjectTemplateHandler,
+    ProjectTemplateJobHandler,
+    ProjectTemplatePreviewHandler
 )
 from sid.api.handlers.settings import (
     SettingsHandler,
     SettingsCollectionHandler
 )
+from sid.api.handlers.debug import ProfileHandler, AllocationsHandler, WorkspaceHandler
+from sid.api.handlers.workspace import WorkspaceUsageHandler
 
+from sid.api import monitoring
+from sid.api.admission import AdmissionController
+from sid.api.idempotency import IdempotencyStore, FileIdempotencyStore
+from sid.api.debug import WorkerChannel, current_worker
+from sid.api.jobs import JobRunner
+from sid.api.workspace import WorkspaceManager
+from sid.lib.circuit_breaker import CircuitBreakers
+from sid.lib.render import RenderPool, RenderCache
 from sid.api.schemas import CONFIGURATION_SCHEMA
 
 def create_app(settings):
     """ Create a Tornado application. """
 
-    return Application([
+    app_settings = settings.get('app', {})
+
+    # Directory where every worker shares its metrics
+    metrics_dir = app_settings.get(
+        'metrics_dir',
+        os.path.join(app_settings.get('workspace_dir', ''), '.metrics')
+    )
+
+    # Directory used to send debug commands to a given worker
+    debug_channel = WorkerChannel(app_settings.get(
+        'control_dir',
+        os.path.join(app_settings.get('workspace_dir', ''), '.control')
+    ))
+
+    # Deployments are running in background, bound them per worker
+    jobs = JobRunner(
+        max_workers=int(app_settings.get('max_deployments', 2)),
+        max_pending=int(app_settings.get('max_pending_deployments', 16)),
+        ttl=int(app_settings.get('job_ttl', 86400))
+    )
+
+    # Template installations are running in background and rendered by
+    # dedicated processes
+    template_jobs = JobRunner(
+        max_workers=int(app_settings.get('max_renders', 2)),
+        max_pending=int(app_settings.get('max_pending_renders', 16)),
+        ttl=int(app_settings.get('job_ttl', 86400))
+    )
+    renderer = RenderPool(
+        max_workers=int(app_settings.get('max_renders', 2)),
+        timeout=int(app_settings.get('render_timeout', 300))
+    )
+
+    # Rendered installations are shared by workers
+    render_cache = None
+    if int(app_settings.get('render_cache_size', 1024)):
+        render_cache = RenderCache(
+            app_settings.get(
+                'render_cache_dir',
+                os.path.join(app_settings.get('workspace_dir', ''), '.renders')
+            ),
+            max_entries=int(app_settings.get('render_cache_size', 1024))
+        )
+
+    # Blocking Git operations run on behalf of a request (concurrent
+    # preparations, warehouse saves)
+    preparations = ThreadPoolExecutor(max_workers=int(app_settings.get('max_preparations', 4)))
+
+    # Requests processed at the same time by a worker are bounded: handlers
+    # yielding to executors (warehouse saves, template installations and
+    # previews, bulk deployments) let a worker process many of them
+    admission = AdmissionController(
+        read_limit=int(app_settings.get('max_read_requests', 8)),
+        write_limit=int(app_settings.get('max_write_requests', 2)),
+        max_queued=int(app_settings.get('max_queued_requests', 16)),
+        queue_timeout=float(app_settings.get('queue_timeout', 5)),
+        max_queue_wait=float(app_settings.get('max_queue_wait', 10)),
+        client_share=float(app_settings.get('client_share', 0.5)),
+        retry_after=int(app_settings.get('retry_after', 5))
+    )
+
+    # Remote outages are detected per worker
+    circuit_breakers = CircuitBreakers(
+        max_failures=int(app_settings.get('circuit_breaker_failures', 5)),
+        reset_timeout=float(app_settings.get('circuit_breaker_reset', 30))
+    )
+
+    # Responses of retried requests (see 'Idempotency-Key' header), shared
+    # by workers when a directory is configured
+    idempotency_settings = {
+        'max_keys': int(app_settings.get('idempotency_max_keys', 1024)),
+        'ttl': int(app_settings.get('idempotency_ttl', 86400))
+    }
+    if app_settings.get('idempotency_dir'):
+        idempotency = FileIdempotencyStore(app_settings.get('idempotency_dir'), **idempotency_settings)
+    else:
+        idempotency = IdempotencyStore(**idempotency_settings)
+
+    # Clones are evicted when workspace exceeds its disk budget, idle ones
+    # are compacted
+    workspace = WorkspaceManager(
+        app_settings.get('workspace_dir', ''),
+        max_size=int(app_settings.get('workspace_max_size', 0)) * 1024 * 1024,
+        min_idle=int(app_settings.get('workspace_min_idle', 600)),
+        max_maintenance=int(app_settings.get('workspace_max_maintenance', 4)),
+        throttle=app_settings.get('maintenance_throttle', 'true') == 'true'
+    )
+
+    # Routes are kept in settings to know which one dispatched a request
+    # (see sid.api.monitoring.log_traffic)
+    routes = [URLSpec(pattern, handler) for pattern, handler in [
         (r"/projects/(\S+)/settings/(\S+)", SettingsHandler),
         (r"/projects/(\S+)/settings", SettingsCollectionHandler),
+        (r"/projects/(\S+)/template/jobs/(\S+)", ProjectTemplateJobHandler),
+        (r"/projects/(\S+)/template:preview", ProjectTemplatePreviewHandler),
         (r"/projects/(\S+)/template", ProjectTemplateHandler),
         (r"/projects/(\S+)/deploy", ProjectDeploymentHandler),
+        (r"/projects/(\S+)/deployments/(\S+)", ProjectDeploymentStatusHandler),
         (r"/projects/(\S+)", ProjectHandler),
         (r"/projects", ProjectCollectionHandler),
+        (r"/deployments", BulkDeploymentHandler),
         (r"/templates/(\S+)", TemplateHandler),
         (r"/templates", TemplateCollectionHandler),
         (r"/version", VersionHandler),
+        (r"/metrics", MetricsHandler),
+        (r"/workspace", WorkspaceUsageHandler),
+        (r"/_debug/profile", ProfileHandler),
+        (r"/_debug/allocations", AllocationsHandler),
+        (r"/_debug/allocations/snapshots", AllocationsHandler),
+        (r"/_debug/allocations/snapshots/(\d+)", AllocationsHandler),
+        (r"/_debug/workspace", WorkspaceHandler),
         (r".*", NotFoundHandler)
-    ], **settings)
+    ]]
+
+    return Application(routes,
+                       routes=routes,
+                       jobs=jobs,
+                       template_jobs=template_jobs,
+                       renderer=renderer,
+                       render_cache=render_cache,
+                       admission=admission,
+                       preparations=preparations,
+                       circuit_breakers=circuit_breakers,
+                       idempotency=idempotency,
+                       workspace=workspace,
+                       metrics_dir=metrics_dir,
+                       debug_channel=debug_channel,
+                       log_function=monitoring.log_request,
+                       **settings)
 
 def main(config_file='/etc/sid/api.conf'):
     """
@@ -75,11 +210,36 @@ def main(config_file='/etc/sid/api.conf'):
     # Create our tornado application
     app = create_app(config)
 
+    # Write slow requests in a dedicated file
+    if config.get('app').get('slow_log_file'):
+        monitoring.setup_slow_log(config.get('app').get('slow_log_file'))
+
+    # Record anonymized traffic to be replayed
+    if config.get('app').get('traffic_log_file'):
+        monitoring.setup_traffic_log(
+            config.get('app').get('traffic_log_file'),
+            config.get('app').get('traffic_log_salt')
+        )
+
     # Instance the web server
     sockets = tornado.netutil.bind_sockets(config.get('http', {}).get('port', 80))
+    monitoring.reset_metrics(app.settings['metrics_dir'])
     tornado.process.fork_processes(0)
     server = HTTPServer(app)
     server.add_sockets(sockets)
+
+    # Listen to debug commands sent to this worker
+    app.settings['debug_channel'].listen(current_worker())
+
+    # Periodically share metrics of this worker
+    PeriodicCallback(
+        functools.partial(monitoring.write_metrics, app.settings['metrics_dir']),
+        int(config.get('app').get('metrics_interval', 5)) * 1000
+    ).start()
+
+    # Periodically measure workspace and evict idle clones
+    app.settings['workspace'].start(int(config.get('app').get('workspace_collect_interval', 300)))
+
     IOLoop.current().start()
 
 if __name__ == "__main__": # pragma: no cover
@@ -0,0 +1,288 @@
+"""
+This module contains stores of responses to idempotent requests.
+
+A client retrying a mutating request with the same 'Idempotency-Key'
+header gets the stored response of the first attempt instead of having
+the request processed again (see sid.api.http.idempotent).
+
+Keys go through two states: 'pending' while the first attempt is being
+processed, then 'done' with its response. Keys are forgotten once their
+time to live expired or when the store is full.
+"""
+
+import os
+import time
+import json
+import base64
+import hashlib
+import collections
+
+__pending__ = u'pending'
+__done__ = u'done'
+
+class IdempotencyConflictException(Exception):
+    """
+    Exception raised when a request with the same key is still in progress.
+    """
+    pass
+
+class IdempotencyMismatchException(Exception):
+    """
+    Exception raised when a key is reused for a different request.
+    """
+    pass
+
+def get_scope(client, method, path, key):
+    """
+    Return identifier of an idempotency key: keys of different clients or
+    different resources never collide.
+
+    Arguments:
+    client -- Client identifier (see sid.api.admission.get_client)
+    method -- HTTP method.
+    path -- Request path.
+    key -- Value of 'Idempotency-Key' header.
+
+    Header values are byte strings which may not be ASCII: parts are hashed
+    as UTF-8 bytes rather than decoded.
+    """
+    return hashlib.sha256(b'\n'.join(
+        part.encode('utf-8') if isinstance(part, unicode) else part
+        for part in (client, method, path, key)
+    )).hexdigest()
+
+def get_fingerprint(body):
+    """
+    Return fingerprint of a request body.
+    """
+    return hashlib.sha1(body or b'').hexdigest()
+
+class IdempotencyStore(object):
+    """
+    Bounded in-memory store of responses, local to a worker. When the store
+    is full, least recently used keys are forgotten first.
+    """
+
+    def __init__(self, max_keys=1024, ttl=86400, pending_ttl=300):
+        """
+        Construct an in-memory store.
+
+        Arguments:
+        max_keys -- Maximum number of stored keys.
+        ttl -- Time to live of stored responses, in seconds.
+        pending_ttl -- Time after which a pending key is considered
+                       abandoned (such as a crashed worker), in seconds.
+        """
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.entries = collections.OrderedDict()
+
+    def is_expired(self, entry, now):
+        """
+        Return True if given entry has to be forgotten.
+        """
+        ttl = self.pending_ttl if entry['state'] == __pending__ else self.ttl
+        return now - entry['created'] > ttl
+
+    def check(self, entry, fingerprint, now):
+        """
+        Return stored response of an entry, None if entry can be replaced.
+
+        Raises:
+        IdempotencyConflictException if request is still in progress.
+        IdempotencyMismatchException if key was used for another request.
+        """
+        if entry is None or self.is_expired(entry, now):
+            return None
+        if entry['state'] == __pending__:
+            raise IdempotencyConflictException('A request with the same idempotency key is in progress.')
+        if entry['fingerprint'] != fingerprint:
+            raise IdempotencyMismatchException('Idempotency key was already used for another request.')
+        return entry['response']
+
+    def begin(self, scope, fingerprint):
+        """
+        Start processing a request, unless it was already processed.
+
+        Arguments:
+        scope -- Key identifier (see get_scope)
+        fingerprint -- Request fingerprint (see get_fingerprint)
+
+        Returns:
+        Stored response (dictionnary with 'status', 'headers' and 'body')
+        or None if request has to be processed.
+
+        Raises: (see check)
+        """
+        now = time.time()
+        response = self.check(self.entries.get(scope), fingerprint, now)
+        if response is not None:
+            # Mark key as recently used
+            self.entries[scope] = self.entries.pop(scope)
+            return response
+
+        self.entries.pop(scope, None)
+        self.entries[scope] = {'state': __pending__, 'fingerprint': fingerprint, 'created': now}
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+        return None
+
+    def complete(self, scope, response):
+        """
+        Store response of a processed request.
+
+        Arguments:
+        scope -- Key identifier.
+        response -- Dictionnary with 'status', 'headers' and 'body'.
+        """
+        entry = self.entries.get(scope)
+        if entry is not None:
+            entry.update({'state': __done__, 'created': time.time(), 'response': response})
+
+    def abort(self, scope):
+        """
+        Forget a key whose request failed; it can be retried.
+        """
+        self.entries.pop(scope, None)
+
+class FileIdempotencyStore(IdempotencyStore):
+    """
+    Store of responses shared by workers through a directory (one file per
+    key). Pending keys are created exclusively, so only one worker processes
+    a request. When the store is full, oldest keys are forgotten first.
+    """
+
+    def __init__(self, directory, max_keys=1024, ttl=86400, pending_ttl=300):
+        """
+        Construct a file store.
+
+        Arguments:
+        directory -- Directory of stored keys.
+
+        Other arguments: (see IdempotencyStore)
+        """
+        super(FileIdempotencyStore, self).__init__(max_keys, ttl, pending_ttl)
+        self.directory = directory
+        self.completed = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get_path(self, scope):
+        """
+        Return file of a key.
+        """
+        return os.path.join(self.directory, scope + '.json')
+
+    def read(self, scope):
+        """
+        Read entry of a key, None if it doesn't exist. An entry being
+        written is seen as pending.
+        """
+        try:
+            with open(self.get_path(scope), 'r') as entry_file:
+                entry = json.load(entry_file)
+        except IOError:
+            return None
+        except ValueError:
+            return {'state': __pending__, 'fingerprint': None, 'created': time.time()}
+
+        if entry.get('response') is not None:
+            entry['response']['body'] = base64.b64decode(entry['response']['body'])
+        return entry
+
+    def write(self, scope, entry, exclusive=False):
+        """
+        Write entry of a key.
+
+        Arguments:
+        exclusive -- Fail if key already exists (default: False)
+
+        Returns:
+        False if key already exists and exclusive is True.
+        """
+        entry = dict(entry)
+        if entry.get('response') is not None:
+            entry['response'] = dict(entry['response'], body=base64.b64encode(entry['response']['body']))
+        content = json.dumps(entry)
+
+        path = self.get_path(scope)
+        if exclusive:
+            try:
+                descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except OSError:
+                return False
+            with os.fdopen(descriptor, 'w') as entry_file:
+                entry_file.write(content)
+        else:
+            # Replace entry atomically
+            temporary_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporary_path, 'w') as entry_file:
+                entry_file.write(content)
+            os.rename(temporary_path, path)
+        return True
+
+    def begin(self, scope, fingerprint):
+        """
+        Start processing a request, unless it was already processed (see
+        IdempotencyStore.begin)
+        """
+        entry = {'state': __pending__, 'fingerprint': fingerprint, 'created': time.time()}
+        if self.write(scope, entry, exclusive=True):
+            return None
+
+        response = self.check(self.read(scope), fingerprint, time.time())
+        if response is not None:
+            return response
+
+        # Expired entry: take it over, unless another worker was faster
+        self.abort(scope)
+        if not self.write(scope, entry, exclusive=True):
+            raise IdempotencyConflictException('A request with the same idempotency key is in progress.')
+        return None
+
+    def complete(self, scope, response):
+        """
+        Store response of a processed request (see IdempotencyStore.complete)
+        """
+        self.write(scope, {
+            'state': __done__,
+            'fingerprint': (self.read(scope) or {}).get('fingerprint'),
+            'created': time.time(),
+            'response': response
+        })
+
+        self.completed += 1
+        if self.completed % 100 == 0:
+            self.prune()
+
+    def abort(self, scope):
+        """
+        Forget a key whose request failed (see IdempotencyStore.abort)
+        """
+        try:
+            os.remove(self.get_path(scope))
+        except OSError:
+            pass
+
+    def prune(self):
+        """
+        Remove expired keys and oldest keys beyond 'max_keys'.
+        """
+        now = time.time()
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+
+        files.sort(reverse=True)
+        for index, (modified, path) in enumerate(files):
+            if index >= self.max_keys or now - modified > max(self.ttl, self.pending_ttl):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,324 @@
+"""
+This module contains a small job mechanism used to run long operations (such
+as deployments) outside of the HTTP request.
+
+Jobs are executed by a bounded pool of threads owned by each API worker. Their
+state is stored as JSON files in user's workspace, so any forked worker is able
+to report the state of a job started by another one.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tornado.web import HTTPError
+from sid.lib.git import OAuthCallback
+
+JOB_PENDING = u'pending'
+JOB_RUNNING = u'running'
+JOB_SUCCEEDED = u'succeeded'
+JOB_FAILED = u'failed'
+
+__job_id_pattern__ = r'^[0-9a-f]{32}$'
+__progress_save_interval__ = 0.5
+
+class JobNotFoundException(Exception):
+    """
+    Exception raised when a job could not be found.
+    """
+    pass
+
+class JobQueueFullException(Exception):
+    """
+    Exception raised when the job runner cannot accept any other job.
+    """
+    pass
+
+class Job(object):
+    """
+    A job and its state. Every change of state is written in job directory.
+    """
+
+    def __init__(self, directory, kind, **attributes):
+        """
+        Construct a job.
+
+        Arguments:
+        directory -- Directory where the job state is stored.
+        kind -- Kind of job (such as 'deployment').
+
+        Keyword arguments:
+        Any additional attribute describing the job (project name, ...).
+        """
+        self.directory = directory
+        self.id = uuid.uuid4().hex # pylint: disable=C0103
+        self.kind = kind
+        self.attributes = attributes
+        self.state = JOB_PENDING
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+        self.saved = 0
+
+    def get_path(self):
+        """
+        Return path of the file which contains job state.
+        """
+        return os.path.join(self.directory, '%s.json' % self.id)
+
+    def to_dict(self):
+        """
+        Return job state as a dictionnary.
+        """
+        state = dict(self.attributes)
+        state.update({
+            'id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'updated': self.updated
+        })
+        return state
+
+    def save(self):
+        """
+        Write job state. File is replaced atomically to never let a reader
+        see a partial state.
+        """
+        if not os.path.exists(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError: # pragma: no cover
+                # Directory created concurrently by another worker
+                pass
+
+        tmp_path = '%s.%d.tmp' % (self.get_path(), os.getpid())
+        with open(tmp_path, 'w') as job_file:
+            json.dump(self.to_dict(), job_file)
+        os.rename(tmp_path, self.get_path())
+
+        self.saved = time.time()
+
+    def start(self):
+        """
+        Mark job as running.
+        """
+        self.state = JOB_RUNNING
+        self.updated = time.time()
+        self.save()
+
+    def update_progress(self, **progress):
+        """
+        Update job progress. Since progress is reported very often by
+        transfers, writes are throttled.
+        """
+        self.progress.update(progress)
+        self.updated = time.time()
+
+        if self.updated - self.saved >= __progress_save_interval__:
+            self.save()
+
+    def succeed(self, result=None):
+        """
+        Mark job as succeeded.
+
+        Arguments:
+        result -- JSON serializable result of the job.
+        """
+        self.state = JOB_SUCCEEDED
+        self.result = result
+        self.updated = time.time()
+        self.save()
+
+    def fail(self, code, message, details=None):
+        """
+        Mark job as failed. Error is formatted as any error of the API.
+
+        Arguments:
+        code -- HTTP status code describing the failure.
+        message -- Error message.
+        details -- Additional details of the error (optional)
+        """
+        self.state = JOB_FAILED
+        self.error = {
+            'code': code,
+            'message': message
+        }
+        if details is not None:
+            self.error['details'] = details
+        self.updated = time.time()
+        self.save()
+
+    @staticmethod
+    def load(directory, identifier):
+        """
+        Load job state from its identifier.
+
+        Arguments:
+        directory -- Directory where job states are stored.
+        identifier -- Job identifier.
+
+        Raises:
+        JobNotFoundException if job doesn't exist.
+        """
+        # Identifier is given by users, make sure it's not a path
+        if not re.match(__job_id_pattern__, identifier):
+            raise JobNotFoundException('Job \'%s\' not found' % identifier)
+
+        try:
+            with open(os.path.join(directory, '%s.json' % identifier), 'r') as job_file:
+                return json.load(job_file)
+        except (IOError, ValueError):
+            raise JobNotFoundException('Job \'%s\' not found' % identifier)
+
+    @staticmethod
+    def prune(directory, ttl):
+        """
+        Remove states of jobs (and leftover temporary files) which were not
+        updated for a while.
+
+        Arguments:
+        directory -- Directory where job states are stored.
+        ttl -- Time to live of job states, in seconds.
+        """
+        if not os.path.isdir(directory):
+            return
+
+        now = time.time()
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > ttl:
+                    os.remove(path)
+            except OSError:
+                # Removed concurrently by another worker
+                continue
+
+class JobCallback(OAuthCallback):
+    """
+    OAuth callback which reports transfer progress into a job.
+    """
+
+    def __init__(self, job, user, token):
+        """
+        Construct a JobCallback.
+
+        Arguments:
+        job -- Job to be updated.
+        user -- Git user.
+        token -- OAuth token.
+        """
+        super(JobCallback, self).__init__(user, token)
+        self.job = job
+
+    def transfer_progress(self, stats): # pylint: disable=E0202
+        """
+        Report fetch progress.
+        """
+        super(JobCallback, self).transfer_progress(stats)
+
+        self.job.update_progress(
+            total_objects=stats.total_objects,
+            received_objects=stats.received_objects,
+            indexed_objects=stats.indexed_objects,
+            total_deltas=stats.total_deltas,
+            indexed_deltas=stats.indexed_deltas,
+            received_bytes=stats.received_bytes
+        )
+
+    def push_update_reference(self, refname, message): # pylint: disable=E0202
+        """
+        Report remote's acceptance or rejection of pushed references.
+        """
+        references = dict(self.job.progress.get('references', {}))
+        references[refname] = message if message else 'ok'
+        self.job.update_progress(references=references)
+
+        super(JobCallback, self).push_update_reference(refname, message)
+
+class JobRunner(object):
+    """
+    Run jobs on a bounded pool of threads.
+
+    Threads are only started on first submission; a runner can then safely
+    be created before API workers are forked. States of jobs older than
+    'ttl' are removed when a job is submitted in the same directory.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, ttl=86400):
+        """
+        Construct a job runner.
+
+        Arguments:
+        max_workers -- Maximum number of jobs running concurrently.
+        max_pending -- Maximum number of jobs waiting for a free thread.
+        ttl -- Time to live of job states, in seconds.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.capacity = max_workers + max_pending
+        self.ttl = ttl
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def get_available(self):
+        """
+        Return number of jobs which can be queued right now.
+        """
+        with self.lock:
+            return self.capacity - self.active
+
+    def submit(self, job, func, *args, **kwargs):
+        """
+        Queue a job.
+
+        Arguments:
+        job -- Job to run.
+        func -- Function to execute. It receives the job as first argument.
+                Its result is stored as job result.
+
+        Raises:
+        JobQueueFullException if too many jobs are already queued.
+        """
+        with self.lock:
+            if self.active >= self.capacity:
+                raise JobQueueFullException('Too many jobs queued')
+            self.active += 1
+
+        try:
+            Job.prune(job.directory, self.ttl)
+            job.save()
+            return self.executor.submit(self._run, job, func, args, kwargs)
+        except:
+            self._release()
+            raise
+
+    def _release(self):
+        """
+        Release a slot of the runner.
+        """
+        with self.lock:
+            self.active -= 1
+
+    def _run(self, job, func, args, kwargs):
+        """
+        Execute job function and record its outcome.
+        """
+        try:
+            job.start()
+            job.succeed(func(job, *args, **kwargs))
+        except HTTPError as error:
+            job.fail(error.status_code, error.log_message, getattr(error, 'details', None))
+        except Exception: # pylint: disable=W0703
+            logging.exception('Job %s failed', job.id)
+            job.fail(500, 'An internal error occured, please contact your system administrator')
+        finally:
+            self._release()
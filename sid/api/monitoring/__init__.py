@@ -0,0 +1,197 @@
+"""
+This module contains monitoring helpers of the API: the request logging hook
+which records request durations, slow requests and anonymized traffic, and
+the sharing of metrics between forked workers through a common directory.
+"""
+
+import os
+import json
+import glob
+import time
+import hmac
+import hashlib
+import logging
+import binascii
+from tornado.log import access_log
+from tornado.process import task_id
+from sid.lib.metrics import REGISTRY, REQUEST_DURATION, stop_trace
+
+__default_slow_request_threshold__ = 1.0
+
+slow_log = logging.getLogger('sid.api.slow') # pylint: disable=C0103
+traffic_log = logging.getLogger('sid.api.traffic') # pylint: disable=C0103
+
+# Key used to anonymize recorded traffic (see setup_traffic_log)
+_traffic_salt = {'key': None}
+
+def log_request(handler):
+    """
+    Log a finished request as Tornado does by default and record its duration.
+    This function MUST be used as 'log_function' application setting.
+
+    Arguments:
+    handler -- Request handler.
+    """
+    status = handler.get_status()
+    request_time = handler.request.request_time()
+
+    if status < 400:
+        log_method = access_log.info
+    elif status < 500:
+        log_method = access_log.warning
+    else:
+        log_method = access_log.error
+    log_method('%d %s %.2fms', status, handler._request_summary(), 1000.0 * request_time) # pylint: disable=W0212
+
+    REQUEST_DURATION.observe(
+        request_time,
+        handler=type(handler).__name__,
+        method=handler.request.method,
+        code=str(status)
+    )
+
+    # Tornado calls on_finish (releasing clones, ...) after this function:
+    # recording a request must never fail it
+    if traffic_log.handlers:
+        try:
+            log_traffic(handler)
+        except Exception: # pylint: disable=W0703
+            logging.exception('Failed to record traffic of %s', handler._request_summary()) # pylint: disable=W0212
+
+    trace = getattr(handler, 'trace', None)
+    if trace is None:
+        return
+
+    stop_trace(trace)
+
+    threshold = float(handler.application.settings.get('app', {}).get(
+        'slow_request_threshold',
+        __default_slow_request_threshold__
+    ))
+    if request_time >= threshold:
+        log_slow_request(handler, trace)
+
+def log_slow_request(handler, trace):
+    """
+    Write a slow request with its phases and annotations as a JSON line.
+
+    Arguments:
+    handler -- Request handler.
+    trace -- Trace of the request.
+    """
+    entry = {
+        'time': time.time(),
+        'handler': type(handler).__name__,
+        'method': handler.request.method,
+        'uri': handler.request.uri,
+        'status': handler.get_status(),
+        'duration': handler.request.request_time(),
+        'phases': dict(trace.get_durations()),
+        'repositories': trace.repositories,
+        'cache': trace.cache,
+        'transfers': trace.transfers
+    }
+    entry.update(trace.annotations)
+
+    slow_log.warning(json.dumps(entry, sort_keys=True))
+
+def log_traffic(handler):
+    """
+    Write an anonymized request as a JSON line. Recorded requests can be
+    replayed later (see benchmarks.replay).
+
+    Route arguments (project, settings, template names, ...) and user are
+    replaced by keyed hashes: the same value always gives the same hash,
+    so access patterns are kept without revealing names. Request bodies are
+    not recorded, only their size.
+
+    Arguments:
+    handler -- Request handler.
+    """
+    authentication = getattr(handler, 'authentication', None)
+    request_time = handler.request.request_time()
+
+    entry = {
+        'time': time.time() - request_time,
+        'route': _find_route(handler),
+        'args': [anonymize(arg) for arg in handler.path_args],
+        'method': handler.request.method,
+        'user': anonymize(authentication['user']) if authentication else None,
+        'body_size': len(handler.request.body or ''),
+        'status': handler.get_status(),
+        'duration': request_time,
+        'worker': task_id() or 0
+    }
+
+    traffic_log.info(json.dumps(entry, sort_keys=True))
+
+def _find_route(handler):
+    """
+    Return pattern of the route which dispatched a request, from the routes
+    given to the application (see 'routes' application setting)
+    """
+    for spec in handler.application.settings.get('routes', ()):
+        if spec.handler_class is type(handler) and spec.regex.match(handler.request.path):
+            return spec.regex.pattern
+    return None
+
+def anonymize(value):
+    """
+    Return a keyed hash of given value (see setup_traffic_log)
+    """
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return hmac.new(_traffic_salt['key'], value, hashlib.sha256).hexdigest()[:16]
+
+def setup_traffic_log(path, salt=None):
+    """
+    Record anonymized traffic in given file. MUST be called before forking
+    workers so that every worker anonymizes values the same way.
+
+    Arguments:
+    path -- Traffic log file path.
+    salt -- Anonymization key (default: random key)
+    """
+    _traffic_salt['key'] = salt if salt else binascii.hexlify(os.urandom(16))
+
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    traffic_log.addHandler(file_handler)
+    traffic_log.setLevel(logging.INFO)
+    traffic_log.propagate = False
+
+def setup_slow_log(path):
+    """
+    Write slow requests in given file.
+
+    Arguments:
+    path -- Slow log file path.
+    """
+    file_handler = logging.FileHandler(path)
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_log.addHandler(file_handler)
+    slow_log.propagate = False
+
+def reset_metrics(directory):
+    """
+    Prepare metrics directory and remove metrics of previous executions.
+    MUST be called before forking workers.
+
+    Arguments:
+    directory -- Metrics directory.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+def write_metrics(directory):
+    """
+    Write metrics of current worker in metrics directory.
+
+    Arguments:
+    directory -- Metrics directory.
+    """
+    worker = task_id()
+    REGISTRY.write(os.path.join(directory, 'worker-%d.json' % (worker if worker is not None else 0)))
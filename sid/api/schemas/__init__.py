@@ -3,5 +3,6 @@
 """ List schemas used by handlers which implement PUT, POST and PATCH methods. """
 
 from sid.api.schemas.project import PROJECT_SCHEMA, PROJECT_PATCH_SCHEMA
-from sid.api.schemas.template import TEMPLATE_SCHEMA
+from sid.api.schemas.template import TEMPLATE_SCHEMA, TEMPLATE_PREVIEW_SCHEMA
 from sid.api.schemas.configuration import CONFIGURATION_SCHEMA
+from sid.api.schemas.deployment import DEPLOYMENTS_SCHEMA
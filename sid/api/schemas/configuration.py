@@ -13,6 +13,139 @@ CONFIGURATION_SCHEMA = {
                 },
                 "remote_url": {
                     "type": "string"
+                },
+                "max_deployments": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "max_pending_deployments": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "job_ttl": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "metrics_dir": {
+                    "type": "string"
+                },
+                "metrics_interval": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "slow_request_threshold": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "slow_log_file": {
+                    "type": "string"
+                },
+                "traffic_log_file": {
+                    "type": "string"
+                },
+                "traffic_log_salt": {
+                    "type": "string"
+                },
+                "control_dir": {
+                    "type": "string"
+                },
+                "max_renders": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "max_pending_renders": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "render_timeout": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "render_cache_dir": {
+                    "type": "string"
+                },
+                "render_cache_size": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "max_preparations": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "max_read_requests": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "max_write_requests": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "max_queued_requests": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "queue_timeout": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "max_queue_wait": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "client_share": {
+                    "type": "string",
+                    "pattern": "^(0(\\.[0-9]+)?|1(\\.0+)?)$"
+                },
+                "retry_after": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "fetch_timeout": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "push_timeout": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "circuit_breaker_failures": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "circuit_breaker_reset": {
+                    "type": "string",
+                    "pattern": "^[0-9]+(\\.[0-9]+)?$"
+                },
+                "idempotency_dir": {
+                    "type": "string"
+                },
+                "idempotency_max_keys": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "idempotency_ttl": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "workspace_max_size": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "workspace_min_idle": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "workspace_collect_interval": {
+                    "type": "string",
+                    "pattern": "^[1-9][0-9]*$"
+                },
+                "workspace_max_maintenance": {
+                    "type": "string",
+                    "pattern": "^[0-9]+$"
+                },
+                "maintenance_throttle": {
+                    "type": "string",
+                    "pattern": "^(true|false)$"
                 }
             },
             "required": [
@@ -29,6 +162,9 @@ CONFIGURATION_SCHEMA = {
                 "username_field": {
                     "type": "string"
                 },
+                "admin_field": {
+                    "type": "string"
+                },
                 "audience": {
                     "type": "string"
                 },
@@ -0,0 +1,26 @@
+"""
+This module contains body schema for deployment handlers.
+"""
+
+from sid.api.schemas.project import PROJECT_NAME
+
+DEPLOYMENTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "projects": {
+            "type": "array",
+            "minItems": 1,
+            "uniqueItems": True,
+            "items": {
+                "$ref": "#/definitions/project-name"
+            }
+        }
+    },
+    "required": [
+        "projects"
+    ],
+    "additionalProperties": False,
+    "definitions": {
+        "project-name": PROJECT_NAME
+    }
+}
@@ -32,3 +32,31 @@ TEMPLATE_SCHEMA = {
         "template-name": TEMPLATE_NAME
     }
 }
+
+TEMPLATE_PREVIEW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {
+            "$ref": "#/definitions/template-name"
+        },
+        "version": {
+            "type": "string"
+        },
+        "data": {
+            "type": "object",
+            "additionalProperties": True
+        },
+        "patch": {
+            "type": "boolean"
+        }
+    },
+    "required": [
+        "name",
+        "version",
+        "data"
+    ],
+    "additionalProperties": False,
+    "definitions": {
+        "template-name": TEMPLATE_NAME
+    }
+}
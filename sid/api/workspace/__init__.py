@@ -0,0 +1,510 @@
+"""
+This module contains the workspace manager.
+
+Users' workspaces contain a clone of every repository they used
+('<user>/warehouse', '<user>/projects/<name>', '<user>/templates/<name>').
+Handlers touch a clone each time it's opened; the manager periodically
+measures disk usage of every clone and, when usage exceeds the disk budget,
+removes least recently used clones. Clones accessed recently and clones
+with local changes (uncommitted or not pushed yet) are never removed: they
+are cloned again on next access.
+
+Idle clones are also compacted (see sid.lib.maintenance) when loose objects,
+packs or loose references piled up, a few clones per collection.
+
+Workers share the same workspace: scans are serialized by a lock file and
+their report (usage per user) is written in the workspace, so it can be
+served by any worker.
+
+A clone is modified by one request or job at a time (see CloneLock): requests
+don't wait for a busy clone, jobs do.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tornado.ioloop import PeriodicCallback
+from sid.lib.git import Repository
+from sid.lib import maintenance
+
+__usage_file__ = u'.usage.json'
+__lock_file__ = u'.usage.lock'
+__trash_dir__ = u'.trash'
+__clone_dirs__ = (u'projects', u'templates')
+__warehouse_dir__ = u'warehouse'
+__clone_lock_suffix__ = u'.sid-lock'
+__clone_lock_timeout__ = 300
+__clone_lock_interval__ = 0.05
+
+# Clone locks of this worker per clone path (see CloneLock.get)
+_clone_locks = {}
+_clone_locks_lock = threading.Lock()
+
+class CloneBusyException(Exception):
+    """
+    Exception raised when a clone is locked by another request or job.
+    """
+    pass
+
+class CloneLock(object):
+    """
+    Exclusive lock of a clone, shared by threads of a worker and by workers.
+
+    Threads of a worker are serialized by an in-memory lock, workers by an
+    advisory lock on a file next to the clone. The file is outside of the
+    clone so the lock survives eviction of the clone.
+    """
+
+    def __init__(self, path):
+        """
+        Construct a clone lock. Use CloneLock.get to share locks of a clone.
+
+        Arguments:
+        path -- Clone directory.
+        """
+        self.path = path
+        self.mutex = threading.Lock()
+        self.lock_file = None
+
+    @staticmethod
+    def get(path):
+        """
+        Return lock of a clone.
+
+        Arguments:
+        path -- Clone directory.
+        """
+        path = os.path.normpath(os.path.abspath(path))
+        with _clone_locks_lock:
+            if path not in _clone_locks:
+                _clone_locks[path] = CloneLock(path)
+            return _clone_locks[path]
+
+    def get_lock_path(self):
+        """
+        Return file locked by workers.
+        """
+        return self.path + __clone_lock_suffix__
+
+    def try_acquire(self):
+        """
+        Acquire the lock if it's free.
+
+        Returns:
+        True if lock has been acquired.
+        """
+        if not self.mutex.acquire(False):
+            return False
+
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError: # pragma: no cover
+                    # Directory created concurrently by another worker
+                    pass
+
+            lock_file = open(self.get_lock_path(), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                lock_file.close()
+                self.mutex.release()
+                return False
+        except:
+            self.mutex.release()
+            raise
+
+        self.lock_file = lock_file
+        return True
+
+    def acquire(self, timeout=__clone_lock_timeout__):
+        """
+        Wait for the lock. This function is blocking, it must not be called
+        from IOLoop thread.
+
+        Arguments:
+        timeout -- Maximum waiting time in seconds (None for no limit)
+
+        Raises:
+        CloneBusyException if lock could not be acquired in time.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.try_acquire():
+            if deadline is not None and time.time() >= deadline:
+                raise CloneBusyException('Clone \'%s\' is busy' % self.path)
+            time.sleep(__clone_lock_interval__)
+
+    def release(self):
+        """
+        Release the lock. It can be released by another thread than the one
+        which acquired it.
+        """
+        lock_file, self.lock_file = self.lock_file, None
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+        finally:
+            self.mutex.release()
+
+    def __enter__(self):
+        """
+        Wait for the lock (see acquire)
+        """
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Release the lock.
+        """
+        self.release()
+
+def touch(path):
+    """
+    Record an access to a clone.
+
+    Arguments:
+    path -- Clone directory.
+    """
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+def get_size(path):
+    """
+    Return disk usage of a directory in bytes.
+    """
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(directory, name))
+            except OSError:
+                continue
+            size += stat.st_blocks * 512 if hasattr(stat, 'st_blocks') else stat.st_size
+    return size
+
+def has_local_changes(path):
+    """
+    Return True if a clone contains changes which are not on its remote
+    (uncommitted changes or commits not pushed). Unreadable clones are
+    considered as changed.
+
+    Arguments:
+    path -- Clone directory.
+    """
+    repository = Repository(path)
+    try:
+        repository.open()
+        if repository.is_empty():
+            return False
+        if repository.repo.status():
+            return True
+        ahead, _ = repository.ahead_behind(fetch=False)
+        return ahead > 0
+    except Exception: # pylint: disable=W0703
+        logging.exception('Failed to inspect clone \'%s\'', path)
+        return True
+
+class WorkspaceManager(object):
+    """
+    Disk usage accounting and eviction of idle clones.
+    """
+
+    def __init__(self, workspace_dir, max_size=0, min_idle=600, max_maintenance=4, throttle=True):
+        """
+        Construct a workspace manager.
+
+        Arguments:
+        workspace_dir -- Base workspace directory.
+        max_size -- Disk budget of the workspace in bytes (0 for no limit)
+        min_idle -- Clones accessed for less than this delay are never
+                    removed nor maintained, in seconds.
+        max_maintenance -- Clones maintained per collection (0 to disable
+                           maintenance)
+        throttle -- Run maintenance at lowest CPU and I/O priorities.
+        """
+        self.workspace_dir = workspace_dir
+        self.max_size = max_size
+        self.min_idle = min_idle
+        self.max_maintenance = max_maintenance
+        self.throttle = throttle
+        self.executor = None
+        self.running = None
+
+    def submit(self, max_age=0):
+        """
+        Collect the workspace in a background thread of current worker,
+        unless a collection is already running.
+
+        Arguments:
+        max_age -- (see collect)
+
+        Returns:
+        Future of the collection.
+        """
+        if self.executor is None:
+            # Threads are only started on first use (after workers are forked)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+        if self.running is None or self.running.done():
+            self.running = self.executor.submit(self.collect, max_age)
+        return self.running
+
+    def start(self, interval=300):
+        """
+        Periodically collect the workspace. Every worker can be started:
+        collections are skipped when another worker collected recently.
+
+        Arguments:
+        interval -- Delay between two collections, in seconds.
+        """
+        callback = PeriodicCallback(lambda: self.submit(interval / 2.0), interval * 1000)
+        callback.start()
+        return callback
+
+    def get_usage_path(self):
+        """
+        Return file of the last usage report.
+        """
+        return os.path.join(self.workspace_dir, __usage_file__)
+
+    def find_clones(self):
+        """
+        List clones of every user.
+
+        Returns:
+        A list of dictionnaries with 'user', 'name' (such as
+        'projects/example'), 'path' and 'accessed' (last access time).
+        """
+        clones = []
+        for user in sorted(os.listdir(self.workspace_dir)):
+            user_dir = os.path.join(self.workspace_dir, user)
+            if user.startswith('.') or not os.path.isdir(user_dir):
+                continue
+
+            paths = [os.path.join(user_dir, __warehouse_dir__)]
+            for clone_dir in __clone_dirs__:
+                paths.extend(WorkspaceManager.find_repositories(os.path.join(user_dir, clone_dir)))
+
+            for path in paths:
+                if not os.path.isdir(os.path.join(path, '.git')):
+                    continue
+                clones.append({
+                    'user': user,
+                    'name': os.path.relpath(path, user_dir),
+                    'path': path,
+                    'accessed': os.path.getmtime(path)
+                })
+        return clones
+
+    @staticmethod
+    def find_repositories(directory):
+        """
+        List Git repositories in a directory (names may contain '/').
+        """
+        if not os.path.isdir(directory):
+            return []
+        if os.path.isdir(os.path.join(directory, '.git')):
+            return [directory]
+
+        repositories = []
+        for name in sorted(os.listdir(directory)):
+            repositories.extend(WorkspaceManager.find_repositories(os.path.join(directory, name)))
+        return repositories
+
+    def evict(self, clone):
+        """
+        Remove a clone. It's first moved out of the workspace so a request
+        never sees a partially removed clone.
+
+        Arguments:
+        clone -- Clone description (see find_clones)
+        """
+        trash_dir = os.path.join(self.workspace_dir, __trash_dir__)
+        if not os.path.isdir(trash_dir):
+            os.makedirs(trash_dir)
+
+        trash_path = os.path.join(trash_dir, uuid.uuid4().hex)
+        os.rename(clone['path'], trash_path)
+        shutil.rmtree(trash_path, ignore_errors=True)
+        logging.info('Evicted clone \'%s\' of user \'%s\' (%d bytes)', clone['name'], clone['user'], clone['size'])
+
+    def try_evict(self, clone):
+        """
+        Evict a clone unless it's in use, was accessed recently or contains
+        local changes. Clone is locked from the checks to its removal (see
+        CloneLock): requests cannot open it meanwhile.
+
+        Arguments:
+        clone -- Clone description (see find_clones)
+
+        Returns:
+        True if clone has been evicted.
+        """
+        lock = CloneLock.get(clone['path'])
+        if not lock.try_acquire():
+            return False
+
+        try:
+            # Clone may have been accessed since it was listed
+            if time.time() - os.path.getmtime(clone['path']) < self.min_idle:
+                return False
+            if has_local_changes(clone['path']):
+                return False
+            self.evict(clone)
+            return True
+        except OSError:
+            logging.exception('Failed to evict clone \'%s\'', clone['path'])
+            return False
+        finally:
+            lock.release()
+
+    def collect(self, max_age=0):
+        """
+        Measure disk usage of the workspace and evict least recently used
+        clones while usage exceeds the disk budget. Nothing is done if
+        another worker is collecting or if last report is more recent than
+        'max_age'.
+
+        Arguments:
+        max_age -- Maximum age of last report in seconds (default: 0, always collect)
+
+        Returns:
+        Usage report (see read_usage) or None if nothing was done.
+        """
+        with open(os.path.join(self.workspace_dir, __lock_file__), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                return None
+
+            report = self.read_usage()
+            if report is not None and time.time() - report['timestamp'] < max_age:
+                return None
+
+            clones = self.find_clones()
+            for clone in clones:
+                clone['size'] = get_size(clone['path'])
+
+            total = sum(clone['size'] for clone in clones)
+            evicted = []
+            if self.max_size and total > self.max_size:
+                now = time.time()
+                for clone in sorted(clones, key=lambda clone: clone['accessed']):
+                    if total <= self.max_size:
+                        break
+                    if now - clone['accessed'] < self.min_idle:
+                        continue
+                    if not self.try_evict(clone):
+                        continue
+                    total -= clone['size']
+                    evicted.append(clone)
+
+            evicted_paths = set(clone['path'] for clone in evicted)
+            clones = [clone for clone in clones if clone['path'] not in evicted_paths]
+            maintained = self.maintain(clones)
+
+            report = self.build_report(clones, evicted, maintained)
+            self.write_usage(report)
+            return report
+
+    def maintain(self, clones):
+        """
+        Compact least recently used idle clones which need it.
+
+        Arguments:
+        clones -- Clones (see find_clones)
+
+        Returns:
+        A list of maintenance results (see sid.lib.maintenance.maintain)
+        with 'user' and 'name' of maintained clones.
+        """
+        maintained = []
+        now = time.time()
+        for clone in sorted(clones, key=lambda clone: clone['accessed']):
+            if len(maintained) >= self.max_maintenance:
+                break
+            if now - clone['accessed'] < self.min_idle:
+                continue
+            if not maintenance.needs_maintenance(maintenance.get_object_stats(clone['path'])):
+                continue
+
+            # Clones in use are maintained on a later collection
+            lock = CloneLock.get(clone['path'])
+            if not lock.try_acquire():
+                continue
+
+            # Maintenance must not count as an access
+            try:
+                state = maintenance.maintain(clone['path'], self.throttle)
+                os.utime(clone['path'], (clone['accessed'], clone['accessed']))
+            finally:
+                lock.release()
+
+            clone['size'] = get_size(clone['path'])
+            maintained.append(dict(state, user=clone['user'], name=clone['name']))
+            logging.info(
+                'Maintained clone \'%s\' of user \'%s\': %d -> %d loose objects, %d -> %d packs',
+                clone['name'], clone['user'],
+                state['before']['loose_objects'], state['after']['loose_objects'],
+                state['before']['packs'], state['after']['packs']
+            )
+        return maintained
+
+    def build_report(self, clones, evicted, maintained):
+        """
+        Build usage report of given clones.
+
+        Arguments:
+        clones -- Remaining clones (see find_clones), with their 'size'.
+        evicted -- Evicted clones.
+        maintained -- Maintenance results (see maintain)
+        """
+        users = {}
+        for clone in clones:
+            usage = users.setdefault(clone['user'], {'size': 0, 'clones': []})
+            usage['size'] += clone['size']
+            usage['clones'].append({'name': clone['name'], 'size': clone['size'], 'accessed': clone['accessed']})
+
+        return {
+            'timestamp': time.time(),
+            'size': sum(usage['size'] for usage in users.values()),
+            'max_size': self.max_size,
+            'evicted': [{'user': clone['user'], 'name': clone['name'], 'size': clone['size']} for clone in evicted],
+            'maintained': maintained,
+            'users': users
+        }
+
+    def write_usage(self, report):
+        """
+        Write usage report so every worker can serve it.
+        """
+        tmp_path = '%s.%d.tmp' % (self.get_usage_path(), os.getpid())
+        with open(tmp_path, 'w') as usage_file:
+            json.dump(report, usage_file)
+        os.rename(tmp_path, self.get_usage_path())
+
+    def read_usage(self):
+        """
+        Read last usage report.
+
+        Returns:
+        A dictionnary with 'timestamp', total 'size', 'max_size', clones
+        'evicted' and 'maintained' by last collection and 'users' (user ->
+        'size' and 'clones'), or None if workspace was never measured.
+        """
+        try:
+            with open(self.get_usage_path(), 'r') as usage_file:
+                return json.load(usage_file)
+        except (IOError, ValueError):
+            return None
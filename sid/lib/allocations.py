@@ -0,0 +1,172 @@
+"""
+This module contains an allocation tracker based on snapshots of the objects
+tracked by the garbage collector.
+
+Python 2 has no allocation tracing (tracemalloc): snapshots count live
+objects per type, sized with sys.getsizeof (shallow sizes, objects which
+can't hold references such as strings or numbers are only accounted through
+their containers). Comparing snapshots taken before and after a workload
+shows which types of objects are leaking.
+"""
+
+import gc
+import sys
+import threading
+
+__max_snapshots__ = 8
+
+class SnapshotNotFoundException(Exception):
+    """
+    Exception raised when a snapshot doesn't exist (or has been dropped).
+    """
+    pass
+
+class AllocationTracker(object):
+    """
+    Take snapshots of live objects of current process and aggregate them per
+    type or per module defining their type.
+    """
+
+    def __init__(self, max_snapshots=__max_snapshots__):
+        """
+        Construct an allocation tracker.
+
+        Arguments:
+        max_snapshots -- Number of snapshots kept in memory (oldest are dropped)
+        """
+        self.max_snapshots = max_snapshots
+        self.snapshots = {}
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """
+        Drop every snapshot.
+        """
+        with self.lock:
+            self.snapshots.clear()
+
+    def snapshot(self):
+        """
+        Take a snapshot of live objects: a dictionnary of type -> [size, count].
+        Unreachable objects are collected first so they are not counted.
+
+        Returns:
+        Snapshot identifier.
+        """
+        gc.collect()
+
+        types = {}
+        for obj in gc.get_objects():
+            counters = types.get(type(obj))
+            if counters is None:
+                counters = types[type(obj)] = [0, 0]
+            try:
+                counters[0] += sys.getsizeof(obj)
+            except TypeError: # pragma: no cover
+                # Size of some extension objects is not known
+                pass
+            counters[1] += 1
+
+        snapshot = dict((AllocationTracker.get_type_name(cls), counters) for cls, counters in types.items())
+
+        with self.lock:
+            self.last_id += 1
+            self.snapshots[self.last_id] = snapshot
+            for identifier in sorted(self.snapshots)[:-self.max_snapshots]:
+                del self.snapshots[identifier]
+            return self.last_id
+
+    def get_snapshot(self, identifier):
+        """
+        Return a snapshot from its identifier.
+
+        Raises:
+        SnapshotNotFoundException
+        """
+        with self.lock:
+            if identifier not in self.snapshots:
+                raise SnapshotNotFoundException('Snapshot %d not found' % identifier)
+            return self.snapshots[identifier]
+
+    @staticmethod
+    def get_type_name(cls):
+        """
+        Return full name of a type ('<module>.<name>')
+        """
+        return '%s.%s' % (getattr(cls, '__module__', None) or '?', getattr(cls, '__name__', repr(cls)))
+
+    @staticmethod
+    def aggregate(snapshot, group):
+        """
+        Return a dictionnary of group -> [size, count].
+
+        Arguments:
+        snapshot -- Snapshot (see snapshot)
+        group -- 'type' or 'module' (module defining the type)
+        """
+        if group == 'type':
+            return snapshot
+
+        groups = {}
+        for name, (size, count) in snapshot.items():
+            counters = groups.setdefault(name.rsplit('.', 1)[0], [0, 0])
+            counters[0] += size
+            counters[1] += count
+        return groups
+
+    def statistics(self, identifier, group='type', limit=20):
+        """
+        Return top groups of a snapshot.
+
+        Arguments:
+        identifier -- Snapshot identifier.
+        group -- Group objects per 'type' or per 'module'.
+        limit -- Maximum number of returned groups.
+        """
+        groups = self.aggregate(self.get_snapshot(identifier), group)
+        top = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+
+        return {
+            'snapshot': identifier,
+            'total_size': sum(size for size, _ in groups.values()),
+            'total_count': sum(count for _, count in groups.values()),
+            'statistics': [
+                {'group': name, 'size': size, 'count': count} for name, (size, count) in top
+            ]
+        }
+
+    def compare(self, identifier, base_identifier, group='type', limit=20):
+        """
+        Return differences of live objects between two snapshots, largest
+        differences first.
+
+        Arguments:
+        identifier -- Snapshot identifier.
+        base_identifier -- Identifier of the older snapshot.
+        group -- Group objects per 'type' or per 'module'.
+        limit -- Maximum number of returned groups.
+        """
+        groups = self.aggregate(self.get_snapshot(identifier), group)
+        base_groups = self.aggregate(self.get_snapshot(base_identifier), group)
+
+        differences = []
+        for name in set(groups) | set(base_groups):
+            size, count = groups.get(name, (0, 0))
+            base_size, base_count = base_groups.get(name, (0, 0))
+            differences.append({
+                'group': name,
+                'size': size,
+                'size_diff': size - base_size,
+                'count': count,
+                'count_diff': count - base_count
+            })
+        differences.sort(key=lambda item: abs(item['size_diff']), reverse=True)
+
+        return {
+            'snapshot': identifier,
+            'base_snapshot': base_identifier,
+            'size_diff': sum(item['size_diff'] for item in differences),
+            'count_diff': sum(item['count_diff'] for item in differences),
+            'statistics': differences[:limit]
+        }
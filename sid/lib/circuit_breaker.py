@@ -0,0 +1,116 @@
+"""
+This module contains a circuit breaker of remote operations.
+
+After a number of consecutive failures, a remote is considered unavailable:
+operations are refused at once instead of waiting for their timeout. Once
+in a while, a single operation is let through as a probe; the remote is
+available again as soon as an operation succeeds.
+"""
+
+import time
+import threading
+
+class CircuitBreaker(object):
+    """
+    Consecutive failures counter of a remote.
+
+    A circuit breaker can be shared by many threads (such as deployment jobs).
+    """
+
+    def __init__(self, name, max_failures=5, reset_timeout=30.0):
+        """
+        Construct a circuit breaker.
+
+        Arguments:
+        name -- Name of the remote.
+        max_failures -- Consecutive failures which open the circuit.
+        reset_timeout -- Delay between two probes when circuit is open, in seconds.
+        """
+        self.name = name
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        """
+        Return True if remote is considered unavailable.
+        """
+        return self.failures >= self.max_failures
+
+    def allow(self):
+        """
+        Return True if an operation can be started. When the circuit is
+        open, a single operation per 'reset_timeout' is allowed as a probe.
+        """
+        with self.lock:
+            if not self.is_open():
+                return True
+
+            now = time.time()
+            if now >= self.retry_at:
+                self.retry_at = now + self.reset_timeout
+                return True
+            return False
+
+    def succeed(self):
+        """
+        Record a successful operation; it closes the circuit.
+        """
+        with self.lock:
+            self.failures = 0
+
+    def fail(self):
+        """
+        Record a failed operation.
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures == self.max_failures:
+                self.retry_at = time.time() + self.reset_timeout
+
+    def get_retry_after(self):
+        """
+        Return delay before next probe, in seconds.
+        """
+        return max(0.0, self.retry_at - time.time()) if self.is_open() else 0.0
+
+    def to_dict(self):
+        """
+        Return state of the circuit breaker as a dictionnary.
+        """
+        return {
+            'name': self.name,
+            'open': self.is_open(),
+            'failures': self.failures,
+            'retry_after': self.get_retry_after()
+        }
+
+class CircuitBreakers(object):
+    """
+    Circuit breakers of every remote, created on demand.
+    """
+
+    def __init__(self, max_failures=5, reset_timeout=30.0):
+        """
+        Construct a registry of circuit breakers.
+
+        Arguments: (see CircuitBreaker)
+        """
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Return circuit breaker of given remote.
+
+        Arguments:
+        name -- Name of the remote (such as its base URL)
+        """
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name, self.max_failures, self.reset_timeout)
+            return self.breakers[name]
@@ -5,11 +5,19 @@ This module contains helper classes and functions to manipulate Git repositories
 
 import os
 import re
+import json
+import time
+import tempfile
+import threading
 import pygit2
+from sid.lib.metrics import timed, record_transfer
 
 __forbidden_pattern__ = r'^Remote error: FATAL: \S* any \S* \S* DENIED by fallthru'
 __http_error__ = r'^Unexpected HTTP status code: (\d*)'
+__non_fast_forward_pattern__ = r'.*non-fastforwardable'
 __tag_prefix__ = u'refs/tags/'
+__commit_counts_file__ = u'sid-commit-counts.json'
+__commit_counts_size__ = 16
 
 class RepositoryNotFoundException(Exception):
     """
@@ -41,15 +49,185 @@ class SignatureException(Exception):
     """
     pass
 
+class PushRejectedException(Exception):
+    """
+    Exception raised when remote rejected pushed references (such as a
+    non-fast-forward update).
+    """
+    pass
+
+class RemoteUnavailableException(Exception):
+    """
+    Exception raised when remote is considered unavailable (see
+    sid.lib.circuit_breaker) and operation has not been attempted.
+    """
+
+    def __init__(self, message, retry_after=0.0):
+        """
+        Construct a RemoteUnavailableException.
+
+        Arguments:
+        message -- Error message.
+        retry_after -- Delay before remote is tried again, in seconds.
+        """
+        super(RemoteUnavailableException, self).__init__(message)
+        self.retry_after = retry_after
+
+class TransferTimeoutException(RemoteUnavailableException):
+    """
+    Exception raised when a fetch or a push has been aborted because it
+    exceeded its deadline.
+    """
+    pass
+
 class GitAutomaticMergeNotAvailable(Exception):
     """
     Exception raised when we cannot automatically merge.
     """
-    pass
+    # Number of remote commits which could not be merged (when known)
+    behind = 0
+
+class GitMergeConflictException(GitAutomaticMergeNotAvailable):
+    """
+    Exception raised when a merge failed because of conflicting changes.
+    """
+
+    def __init__(self, message, conflicts):
+        """
+        Construct a GitMergeConflictException.
+
+        Arguments:
+        message -- Error message.
+        conflicts -- List of conflicts (see Repository.merge_commit)
+        """
+        super(GitMergeConflictException, self).__init__(message)
+        self.conflicts = conflicts
+
+class TransferStats(object):
+    """
+    Statistics of a fetch or a push, recorded from libgit2 callbacks.
+
+    Phases of a fetch are 'negotiation' (until first object received),
+    'transfer' (until every object received) and 'indexing' (until every
+    delta resolved, then references update). Phases of a push are 'packing'
+    (until first object sent), 'upload' (until every object sent) and
+    'update' (remote references update).
+    """
+
+    def __init__(self, operation):
+        """
+        Construct empty statistics.
+
+        Arguments:
+        operation -- 'fetch' or 'push'.
+        """
+        self.operation = operation
+        self.total_objects = 0
+        self.received_objects = 0
+        self.indexed_objects = 0
+        self.local_objects = 0
+        self.total_deltas = 0
+        self.indexed_deltas = 0
+        self.received_bytes = 0
+        self.pushed_objects = 0
+        self.pushed_bytes = 0
+        self.references = {}
+        self.started = time.time()
+        self.finished = None
+        self.marks = {}
+
+    def mark(self, name):
+        """
+        Record the first time an event of the transfer happened.
+
+        Arguments:
+        name -- Event name.
+        """
+        if name not in self.marks:
+            self.marks[name] = time.time()
+
+    def update(self, progress):
+        """
+        Update statistics from a fetch progress (pygit2.TransferProgress).
+
+        Arguments:
+        progress -- Fetch progress.
+        """
+        self.total_objects = progress.total_objects
+        self.received_objects = progress.received_objects
+        self.indexed_objects = progress.indexed_objects
+        self.local_objects = progress.local_objects
+        self.total_deltas = progress.total_deltas
+        self.indexed_deltas = progress.indexed_deltas
+        self.received_bytes = progress.received_bytes
+
+        if self.received_objects:
+            self.mark('first_object')
+        if self.received_objects >= self.total_objects:
+            self.mark('objects_done')
+
+    def finish(self):
+        """
+        Mark transfer as finished.
+        """
+        self.finished = time.time()
+
+    def get_phases(self):
+        """
+        Return duration of each phase of the transfer (see class documentation)
+        """
+        finished = self.finished if self.finished is not None else time.time()
+
+        if self.operation == 'fetch':
+            bounds = [('negotiation', 'first_object'), ('transfer', 'objects_done'), ('indexing', None)]
+        else:
+            bounds = [('packing', 'first_object'), ('upload', 'objects_done'), ('update', None)]
+
+        phases = {}
+        previous = self.started
+        for phase, mark in bounds:
+            end = self.marks.get(mark, previous) if mark else finished
+            phases[phase] = max(end - previous, 0.0)
+            previous = end
+        return phases
+
+    def to_dict(self):
+        """
+        Return statistics as a dictionnary.
+        """
+        stats = {
+            'operation': self.operation,
+            'duration': (self.finished if self.finished is not None else time.time()) - self.started,
+            'phases': self.get_phases()
+        }
+        if self.operation == 'fetch':
+            stats.update({
+                'total_objects': self.total_objects,
+                'received_objects': self.received_objects,
+                'indexed_objects': self.indexed_objects,
+                'local_objects': self.local_objects,
+                'total_deltas': self.total_deltas,
+                'indexed_deltas': self.indexed_deltas,
+                'received_bytes': self.received_bytes
+            })
+        else:
+            stats.update({
+                'total_objects': self.total_objects,
+                'pushed_objects': self.pushed_objects,
+                'pushed_bytes': self.pushed_bytes,
+                'references': self.references
+            })
+        return stats
 
 class OAuthCallback(pygit2.RemoteCallbacks):
     """
     Abstract OAuth mechanism for SID warehouse.
+
+    It also records statistics of transfers (see TransferStats) and aborts
+    transfers exceeding their deadline: libgit2 has no timeout, so progress
+    callbacks raise TransferTimeoutException, which makes libgit2 abort the
+    transfer. Since a callback object can be shared by many threads,
+    statistics and deadlines are recorded per thread.
     """
 
     def __init__(self, user, token):
@@ -60,14 +238,90 @@ class OAuthCallback(pygit2.RemoteCallbacks):
 
         self.user = user
         self.token = token
+        self.local = threading.local()
+
+    def begin(self, operation, timeout=None):
+        """
+        Start recording statistics of a new transfer.
+
+        Arguments:
+        operation -- 'fetch' or 'push'.
+        timeout -- Maximum duration of the transfer in seconds (default: no limit)
+        """
+        self.local.stats = TransferStats(operation)
+        self.local.deadline = self.local.stats.started + timeout if timeout else None
+        return self.local.stats
+
+    def check_deadline(self):
+        """
+        Abort current transfer of this thread if it exceeded its deadline.
+
+        Raises:
+        TransferTimeoutException
+        """
+        deadline = getattr(self.local, 'deadline', None)
+        if deadline is not None and time.time() > deadline:
+            stats = self.get_stats()
+            self.local.deadline = None
+            raise TransferTimeoutException(
+                '%s exceeded its deadline' % (stats.operation.capitalize() if stats else 'Transfer')
+            )
+
+    def get_stats(self):
+        """
+        Return statistics of current transfer of this thread (if any).
+        """
+        return getattr(self.local, 'stats', None)
 
     def credentials(self, url, username_from_url, allowed_types): # pylint: disable=E0202
         """
         Return credentials as UserPass object. Instead of putting "real" password
         it's using OAuth token.
         """
+        self.check_deadline()
         return pygit2.UserPass(self.user, self.token)
 
+    def sideband_progress(self, string): # pylint: disable=E0202,W0613
+        """
+        Abort transfer if remote is too slow to send objects.
+        """
+        self.check_deadline()
+
+    def transfer_progress(self, stats): # pylint: disable=E0202
+        """
+        Record fetch progress.
+        """
+        current = self.get_stats()
+        if current is not None:
+            current.update(stats)
+        self.check_deadline()
+
+    def push_transfer_progress(self, objects_pushed, total_objects, bytes_pushed):
+        """
+        Record push progress.
+        """
+        current = self.get_stats()
+        if current is not None:
+            current.pushed_objects = objects_pushed
+            current.total_objects = total_objects
+            current.pushed_bytes = bytes_pushed
+            current.mark('first_object')
+            if objects_pushed >= total_objects:
+                current.mark('objects_done')
+        self.check_deadline()
+
+    def push_update_reference(self, refname, message): # pylint: disable=E0202
+        """
+        Record remote's acceptance of a pushed reference. Raise when remote
+        rejected it; exception is propagated by pygit2 to the push caller.
+        """
+        current = self.get_stats()
+        if current is not None:
+            current.references[refname] = message if message else 'ok'
+
+        if message is not None:
+            raise PushRejectedException('Remote rejected \'%s\': %s' % (refname, message))
+
 class Repository(object):# pylint: disable=R0904
     """
     Easy Git repository class.
@@ -85,6 +339,8 @@ class Repository(object):# pylint: disable=R0904
         self.sign = None
         self.path = path
         self.callbacks = None
+        self.timeouts = {}
+        self.circuit_breaker = None
 
     def initialize(self):
         """
@@ -157,6 +413,7 @@ class Repository(object):# pylint: disable=R0904
         for path in paths:
             self.add_file(path)
 
+    @timed('commit')
     def commit(self, message, user=None, parents=None, allow_empty=False): # pylint: disable=W0613
         """
         Commit changes.
@@ -184,13 +441,20 @@ class Repository(object):# pylint: disable=R0904
         tree = self.repo.index.write_tree()
 
         # Create commit
-        self.repo.create_commit(
+        oid = self.repo.create_commit(
             'HEAD', # Reference name
             user, user, # Author and committer
             message, # Commit message
             tree, # Commit tree
             parents) # Parent commits
 
+        # Keep commit count up to date (see count_commits)
+        if len(parents) <= 1:
+            counts = self._read_commit_counts()
+            parent_count = counts.get(str(parents[0])) if parents else 0
+            if parent_count is not None:
+                self._write_commit_counts(counts, oid, parent_count + 1)
+
     def commit_all(self, message, user=None, parents=None):
         """
         Commit all changes. (see Repository#commit())
@@ -211,7 +475,7 @@ class Repository(object):# pylint: disable=R0904
         SignatureException if not any signature found.
         """
         try:
-            self.repo.default_signature
+            return self.repo.default_signature
         except KeyError as error:
             raise SignatureException(error.message)
 
@@ -271,6 +535,26 @@ class Repository(object):# pylint: disable=R0904
         """
         self.callbacks = callbacks
 
+    def set_timeouts(self, timeouts):
+        """
+        Set deadlines of remote operations. Deadlines are only enforced by
+        OAuthCallback callbacks.
+
+        Arguments:
+        timeouts -- Dictionnary of operation ('fetch' or 'push') -> maximum
+                    duration in seconds (None for no limit)
+        """
+        self.timeouts = dict(timeouts or {})
+
+    def set_circuit_breaker(self, circuit_breaker):
+        """
+        Set circuit breaker of the remote (see sid.lib.circuit_breaker).
+
+        Arguments:
+        circuit_breaker -- Circuit breaker (None to disable it)
+        """
+        self.circuit_breaker = circuit_breaker
+
     def create_branch(self, branch_name, commit):
         """
         Create new branch based on given commit.
@@ -298,40 +582,131 @@ class Repository(object):# pylint: disable=R0904
 
         return branch
 
+    @timed('fetch')
     def fetch_all(self, remote_name):
         """
         Fetch changes from given remote.
 
         Arguments:
         remote_name -- Remote name.
+
+        Returns:
+        Transfer statistics (see TransferStats)
         """
         self.assert_is_open()
 
         remote = self.get_remote(remote_name)
+        stats = self._begin_transfer('fetch')
+        try:
+            progress = remote.fetch(callbacks=self.callbacks)
+
+            # Final figures are also returned by libgit2
+            if progress is not None:
+                stats.update(progress)
+        except pygit2.GitError as git_error: # pylint: disable=E1101
+            err = Repository.handle_git_error(git_error)
+            self._report_remote(err)
+            raise err
+        except TransferTimeoutException as error:
+            self._report_remote(error)
+            raise
+        else:
+            self._report_remote()
+        finally:
+            self._end_transfer(stats)
+
+        return stats
+
+    def fetch_local(self, path, refspecs):
+        """
+        Fetch references of another local repository (such as a scratch
+        clone) without declaring any remote. Objects are copied from the
+        file system: neither callbacks nor circuit breaker are involved.
+
+        Arguments:
+        path -- Path of the local repository.
+        refspecs -- List of refspecs (such as '+refs/heads/master:refs/x')
+        """
+        self.assert_is_open()
+
         try:
-            remote.fetch(callbacks=self.callbacks)
+            self.repo.remotes.create_anonymous(path).fetch(refspecs)
         except pygit2.GitError as git_error: # pylint: disable=E1101
             raise Repository.handle_git_error(git_error)
 
-        return remote # almost useful to return fetched remote
+    def delete_reference(self, ref_name):
+        """
+        Delete a reference, if it exists.
+
+        Arguments:
+        ref_name -- Full name of the reference.
+        """
+        self.assert_is_open()
+
+        try:
+            self.repo.lookup_reference(ref_name).delete()
+        except KeyError:
+            pass
 
-    def pull(self, remote_name, branch_name='master'):
+    @timed('pull')
+    def pull(self, remote_name, branch_name='master', merge=True):
         """
         Pull changes from given remote repository.
 
         Arguments:
         remote_name -- Name of remote to pull.
         branch_name -- Name of remote branch to pull.
+        merge -- Merge diverged histories (default: True), otherwise only
+                 fast-forward is allowed.
         """
         self.assert_is_open()
 
         # Retrieve and fetch remote
         self.fetch_all(remote_name)
 
+        # Apply fetched changes
+        self.merge_remote(remote_name, branch_name, merge)
+
+    def merge_remote(self, remote_name, branch_name='master', merge=True):
+        """
+        Apply changes previously fetched from given remote repository.
+
+        Arguments:
+        remote_name -- Name of fetched remote.
+        branch_name -- Name of remote branch to merge.
+        merge -- Merge diverged histories (default: True), otherwise only
+                 fast-forward is allowed.
+
+        Raises:
+        GitAutomaticMergeNotAvailable if histories diverged and merge is not allowed.
+        GitMergeConflictException if merge failed because of conflicts.
+        """
+        self.merge_reference(
+            'refs/remotes/%s/%s' % (remote_name, branch_name),
+            'Merge remote-tracking branch \'%s/%s\'' % (remote_name, branch_name),
+            branch_name,
+            merge
+        )
+
+    def merge_reference(self, ref_name, message, branch_name='master', merge=True):
+        """
+        Apply commits of a reference to given local branch (fast-forward
+        when possible). Nothing is done if reference doesn't exist.
+
+        Arguments:
+        ref_name -- Full name of the reference to merge.
+        message -- Message of the merge commit (if histories diverged)
+        branch_name -- Local branch (default: 'master')
+        merge -- Merge diverged histories (default: True), otherwise only
+                 fast-forward is allowed.
+
+        Raises: (see merge_remote)
+        """
+        self.assert_is_open()
+
         # Lookup remote reference, oid and commit
-        remote_ref = 'refs/remotes/%s/%s' % (remote_name, branch_name)
         try:
-            remote_oid = self.repo.lookup_reference(remote_ref).target
+            remote_oid = self.repo.lookup_reference(ref_name).target
             remote_commit = self.repo.get(remote_oid)
         except KeyError:
             # Remote branch doesn't exist; this is the case on new repository,
@@ -360,13 +735,63 @@ class Repository(object):# pylint: disable=R0904
             # Set HEAD
             self.repo.set_head(local_branch.name)
 
-        # NOTE: We currently NOT support merge during pull.
+        # Histories diverged, try to merge them
         elif merge_result & pygit2.GIT_MERGE_ANALYSIS_NORMAL: # pylint: disable=E1101
-            raise GitAutomaticMergeNotAvailable('Merge when pulling is not implemented')
+            if not merge:
+                raise GitAutomaticMergeNotAvailable('Local and remote histories diverged')
+
+            self.merge_commit(remote_commit, message)
 
         else:
             raise AssertionError('Unknown merge analysis result')
 
+    def merge_commit(self, commit, message, user=None):
+        """
+        Merge given commit into HEAD. Merge is computed in memory; the working
+        directory is only updated and committed if there is not any conflict.
+
+        Arguments:
+        commit -- Commit to be merged.
+        message -- Merge commit message.
+        user -- Commit user (default: default_signature)
+
+        Raises:
+        GitMergeConflictException with the list of conflicts. Each conflict
+        is a dictionnary with 'path' and 'ancestor', 'ours' and 'theirs' oids
+        (None when the file doesn't exist on given side).
+        """
+        self.assert_is_open()
+
+        head_commit = self.repo.get(self.repo.head.target)
+        index = self.repo.merge_commits(head_commit, commit)
+
+        if index.conflicts is not None:
+            conflicts = []
+            for ancestor, ours, theirs in index.conflicts:
+                entry = ours or theirs or ancestor
+                conflicts.append({
+                    'path': entry.path,
+                    'ancestor': ancestor.hex if ancestor else None,
+                    'ours': ours.hex if ours else None,
+                    'theirs': theirs.hex if theirs else None
+                })
+            raise GitMergeConflictException('Merge failed with %d conflicts' % len(conflicts), conflicts)
+
+        # Use default signature if user is not given
+        if user is None:
+            user = self.sign if self.sign else self.get_default_signature()
+
+        # Update working directory then commit merged tree
+        tree = index.write_tree(self.repo)
+        self.repo.checkout_tree(self.repo.get(tree))
+        self.repo.create_commit(
+            'HEAD', # Reference name
+            user, user, # Author and committer
+            message, # Commit message
+            tree, # Commit tree
+            [head_commit.id, commit.id]) # Parent commits
+
+    @timed('push')
     def push(self, remote_name='origin', branch_name='master'):
         """
         Push changes to given remote.
@@ -374,20 +799,82 @@ class Repository(object):# pylint: disable=R0904
         Keyword arguments:
         remote_name -- Remote to be pushed.
         branch_name -- Branch to be pushed.
+
+        Returns:
+        Transfer statistics (see TransferStats)
         """
         self.assert_is_open()
 
         remote = self.get_remote(remote_name)
+        stats = self._begin_transfer('push')
         try:
             remote.push([self.get_branch(branch_name).name], callbacks=self.callbacks)
         except pygit2.GitError as git_error: # pylint: disable=E1101
             err = Repository.handle_git_error(git_error)
+            self._report_remote(err)
 
             if isinstance(git_error, ForbiddenException):
                 # Automatically discard changes by fetching changes
                 self.reset_hard('refs/remotes/%s/%s' % (remote_name, branch_name))
 
             raise err
+        except (TransferTimeoutException, PushRejectedException) as error:
+            self._report_remote(error)
+            raise
+        else:
+            self._report_remote()
+        finally:
+            self._end_transfer(stats)
+
+        return stats
+
+    def _begin_transfer(self, operation):
+        """
+        Start recording statistics of a transfer, with its deadline.
+
+        Arguments:
+        operation -- 'fetch' or 'push'.
+
+        Raises:
+        RemoteUnavailableException if circuit breaker of the remote is open.
+        """
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            raise RemoteUnavailableException(
+                'Remote \'%s\' is unavailable' % self.circuit_breaker.name,
+                self.circuit_breaker.get_retry_after()
+            )
+
+        if isinstance(self.callbacks, OAuthCallback):
+            return self.callbacks.begin(operation, self.timeouts.get(operation))
+        return TransferStats(operation)
+
+    def _report_remote(self, error=None):
+        """
+        Report outcome of a transfer to circuit breaker of the remote. Errors
+        returned by the remote itself (such as forbidden or rejected push)
+        prove it is available; others (such as network errors or timeouts)
+        are failures.
+
+        Arguments:
+        error -- Error of the transfer (default: None, transfer succeeded)
+        """
+        if self.circuit_breaker is None:
+            return
+
+        if error is None or isinstance(error, (ForbiddenException, PushRejectedException)):
+            self.circuit_breaker.succeed()
+        else:
+            self.circuit_breaker.fail()
+
+    def _end_transfer(self, stats):
+        """
+        Finish recording statistics of a transfer and report them.
+
+        Arguments:
+        stats -- Transfer statistics.
+        """
+        stats.finish()
+        record_transfer(self.path, stats.to_dict())
 
     def checkout(self, ref_name):
         """
@@ -398,7 +885,7 @@ class Repository(object):# pylint: disable=R0904
         """
         self.repo.checkout(self.repo.lookup_reference(ref_name))
 
-    def ahead_behind(self, remote_name='origin', branch_name='master'):
+    def ahead_behind(self, remote_name='origin', branch_name='master', fetch=True):
         """
         Calculate how many different commits are in the non-common parts of
         the history between the two given ids.
@@ -406,11 +893,13 @@ class Repository(object):# pylint: disable=R0904
         Arguments:
         remote_name -- Targeted remote (optional, default='origin')
         branch_name -- Remote branch (optional, default='origin')
+        fetch -- Fetch changes from remote first (optional, default=True)
         """
         self.assert_is_open()
 
         # First fetch changes from remote
-        self.fetch_all(remote_name)
+        if fetch:
+            self.fetch_all(remote_name)
 
         # Get head target
         try:
@@ -422,12 +911,138 @@ class Repository(object):# pylint: disable=R0904
         try:
             remote_id = self.repo.revparse_single('refs/remotes/%s/%s' % (remote_name, branch_name)).id
         except KeyError:
-            # If there is not any remote target, we sum number of commits ahead
-            return sum(1 for _ in self.repo.walk(self.repo.head.target, pygit2.GIT_SORT_TOPOLOGICAL)), 0 # pylint: disable=E1101
+            # If there is not any remote target, every commit is ahead
+            return self.count_commits(local_id), 0
 
         # Calculate diff
         return self.repo.ahead_behind(local_id, remote_id)
 
+    def count_commits(self, oid):
+        """
+        Count commits reachable from given commit.
+
+        Counts are cached in the repository: commits made by commit() are
+        counted from their parent in constant time. Other commits (such as
+        merges) are counted from the closest cached ancestor, walking only
+        commits which are not reachable from it.
+
+        Arguments:
+        oid -- Commit identifier.
+        """
+        self.assert_is_open()
+
+        counts = self._read_commit_counts()
+        if oid.hex in counts:
+            return counts[oid.hex]
+
+        walker = self.repo.walk(oid, pygit2.GIT_SORT_NONE) # pylint: disable=E1101
+        base = 0
+        for known_hex, known_count in sorted(counts.items(), key=lambda item: -item[1]):
+            known_oid = pygit2.Oid(hex=known_hex) # pylint: disable=E1101
+            try:
+                is_ancestor = self.repo.merge_base(oid, known_oid) == known_oid
+            except (KeyError, ValueError):
+                is_ancestor = False
+            if is_ancestor:
+                walker.hide(known_oid)
+                base = known_count
+                break
+
+        count = base + sum(1 for _ in walker)
+        self._write_commit_counts(counts, oid, count)
+        return count
+
+    def _read_commit_counts(self):
+        """
+        Read cached commit counts (commit hexadecimal identifier -> count)
+        """
+        try:
+            with open(os.path.join(self.repo.path, __commit_counts_file__), 'r') as counts_file:
+                return json.load(counts_file)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_commit_counts(self, counts, oid, count):
+        """
+        Cache commit count of a commit, only most recent counts are kept.
+
+        Counts are keyed by commit identifier, which never changes: a count
+        read by another thread or worker is never wrong, at worst missing.
+        Counts are merged with the latest cached ones then replaced
+        atomically, so concurrent writers only lose entries they both added.
+
+        Arguments:
+        counts -- Cached commit counts (see _read_commit_counts)
+        oid -- Commit identifier.
+        count -- Number of commits reachable from it.
+        """
+        counts = dict(counts)
+        counts.update(self._read_commit_counts())
+        counts[oid.hex] = count
+
+        # Tips with the highest counts are the most recent ones
+        if len(counts) > __commit_counts_size__:
+            counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:__commit_counts_size__])
+
+        try:
+            handle, tmp_path = tempfile.mkstemp(prefix=__commit_counts_file__, suffix='.tmp', dir=self.repo.path)
+        except (IOError, OSError):
+            # Cache is only an optimization
+            return
+
+        try:
+            with os.fdopen(handle, 'w') as counts_file:
+                json.dump(counts, counts_file)
+            os.rename(tmp_path, os.path.join(self.repo.path, __commit_counts_file__))
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def sync(self, remote_name='origin', branch_name='master'):
+        """
+        Synchronize local branch with given remote using a single fetch:
+        remote changes are applied (fast-forward when possible, otherwise
+        merged in memory, see merge_remote) then local changes are pushed.
+
+        Arguments:
+        remote_name -- Targeted remote (optional, default='origin')
+        branch_name -- Branch to synchronize (optional, default='master')
+
+        Returns:
+        A tuple (ahead, behind) computed before synchronization.
+
+        Raises:
+        GitMergeConflictException if remote changes conflict with local
+        ones; its 'behind' attribute is the number of remote commits which
+        could not be merged. Nothing is pushed then.
+        PushRejectedException (see push)
+        """
+        self.assert_is_open()
+
+        self.fetch_all(remote_name)
+
+        # Nothing committed locally, simply take remote branch
+        if self.is_empty():
+            self.merge_remote(remote_name, branch_name)
+            return 0, 0
+
+        # Compare with already fetched references
+        ahead, behind = self.ahead_behind(remote_name, branch_name, fetch=False)
+
+        if behind:
+            try:
+                self.merge_remote(remote_name, branch_name)
+            except GitMergeConflictException as error:
+                error.behind = behind
+                raise
+
+        if ahead:
+            self.push(remote_name, branch_name)
+
+        return ahead, behind
+
     def reset_hard(self, oid):
         """
         Reset repository to given OID.
@@ -442,6 +1057,42 @@ class Repository(object):# pylint: disable=R0904
 
         self.repo.reset(oid, pygit2.GIT_RESET_HARD) # pylint: disable=E1101
 
+    def diff_trees(self, old_revision, new_revision, patch=False):
+        """
+        Compare trees of two revisions, in memory.
+
+        Arguments:
+        old_revision -- Revision (commit, tree, reference, ...) to compare
+                        from, None for an empty tree.
+        new_revision -- Revision to compare to.
+        patch -- Include patch text (default: False)
+
+        Returns:
+        A dictionnary with paths 'added', 'changed' and 'removed' (and
+        'patch' if requested)
+        """
+        self.assert_is_open()
+
+        new_tree = self.repo.revparse_single(new_revision).peel(pygit2.GIT_OBJ_TREE) # pylint: disable=E1101
+        if old_revision is None:
+            diff = new_tree.diff_to_tree(swap=True)
+        else:
+            old_tree = self.repo.revparse_single(old_revision).peel(pygit2.GIT_OBJ_TREE) # pylint: disable=E1101
+            diff = old_tree.diff_to_tree(new_tree)
+
+        changes = {'added': [], 'changed': [], 'removed': []}
+        for delta in diff.deltas:
+            if delta.status == pygit2.GIT_DELTA_ADDED: # pylint: disable=E1101
+                changes['added'].append(delta.new_file.path)
+            elif delta.status == pygit2.GIT_DELTA_DELETED: # pylint: disable=E1101
+                changes['removed'].append(delta.old_file.path)
+            else:
+                changes['changed'].append(delta.new_file.path)
+
+        if patch:
+            changes['patch'] = diff.patch or u''
+        return changes
+
     def get_tags(self):
         """
         List tags of this repository.
@@ -462,5 +1113,7 @@ class Repository(object):# pylint: disable=R0904
             return ForbiddenException()
         elif re.match(__forbidden_pattern__, error.message):
             return ForbiddenException()
+        elif re.match(__non_fast_forward_pattern__, error.message):
+            return PushRejectedException(error.message)
         else:
             return error
@@ -0,0 +1,236 @@
+"""
+This module contains maintenance of local Git repositories.
+
+Local copies receive many small fetches and commits: loose objects, small
+packs and loose references pile up and slow down opening repositories and
+walking histories. Maintenance compacts them with Git command line tools
+('pack-refs', 'repack', 'commit-graph' and 'prune'), at the lowest CPU and
+I/O priorities when 'nice' and 'ionice' are available.
+"""
+
+import os
+import time
+import json
+import logging
+import subprocess
+from distutils.spawn import find_executable
+from sid.lib.git import Repository
+from sid.lib.metrics import REGISTRY
+
+__state_file__ = u'sid-maintenance.json'
+__open_samples__ = 3
+
+# Tasks in execution order: name -> Git command
+__tasks__ = (
+    ('pack-refs', ['pack-refs', '--all']),
+    ('repack', ['-c', 'pack.threads=1', 'repack', '-a', '-d', '-l', '-q']),
+    ('commit-graph', ['commit-graph', 'write', '--reachable']),
+    ('prune', ['prune', '--expire=2.weeks.ago'])
+)
+
+MAINTENANCE_DURATION = REGISTRY.histogram(
+    'sid_maintenance_duration_seconds',
+    'Duration of repository maintenance tasks.',
+    ('task', 'status')
+)
+
+MAINTENANCE_OPEN_TIME = REGISTRY.histogram(
+    'sid_maintenance_open_seconds',
+    'Time needed to open a repository before and after maintenance.',
+    ('stage',),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+MAINTENANCE_LOOSE_OBJECTS = REGISTRY.histogram(
+    'sid_maintenance_loose_objects',
+    'Loose objects of a repository before and after maintenance.',
+    ('stage',),
+    (0, 10, 100, 1000, 10000, 100000)
+)
+
+class MaintenanceException(Exception):
+    """
+    Exception raised when a maintenance task failed.
+    """
+    pass
+
+def get_object_stats(path):
+    """
+    Count objects and references of a repository from its files.
+
+    Arguments:
+    path -- Repository working directory.
+
+    Returns:
+    A dictionnary with 'loose_objects', 'loose_size', 'packs',
+    'pack_size' and 'loose_refs'.
+    """
+    git_dir = os.path.join(path, '.git')
+    objects_dir = os.path.join(git_dir, 'objects')
+    stats = {'loose_objects': 0, 'loose_size': 0, 'packs': 0, 'pack_size': 0, 'loose_refs': 0}
+
+    if os.path.isdir(objects_dir):
+        for name in os.listdir(objects_dir):
+            directory = os.path.join(objects_dir, name)
+            if len(name) != 2 or not os.path.isdir(directory):
+                continue
+            for object_name in os.listdir(directory):
+                stats['loose_objects'] += 1
+                stats['loose_size'] += os.path.getsize(os.path.join(directory, object_name))
+
+        pack_dir = os.path.join(objects_dir, 'pack')
+        if os.path.isdir(pack_dir):
+            for name in os.listdir(pack_dir):
+                if name.endswith('.pack'):
+                    stats['packs'] += 1
+                    stats['pack_size'] += os.path.getsize(os.path.join(pack_dir, name))
+
+    for _, _, files in os.walk(os.path.join(git_dir, 'refs')):
+        stats['loose_refs'] += len(files)
+
+    return stats
+
+def measure_open(path):
+    """
+    Measure time needed to open a repository and resolve its HEAD (best
+    of a few samples).
+
+    Arguments:
+    path -- Repository working directory.
+
+    Returns:
+    Duration in seconds, None if repository cannot be opened.
+    """
+    best = None
+    for _ in range(__open_samples__):
+        started = time.time()
+        repository = Repository(path)
+        try:
+            repository.open()
+            if not repository.is_empty():
+                repository.repo.revparse_single('HEAD')
+        except Exception: # pylint: disable=W0703
+            return None
+        duration = time.time() - started
+        best = duration if best is None else min(best, duration)
+    return best
+
+def get_command_prefix(throttle=True):
+    """
+    Return command prefix lowering priorities of maintenance tasks.
+
+    Arguments:
+    throttle -- Run tasks with idle I/O class and lowest CPU priority.
+    """
+    prefix = []
+    if throttle:
+        if find_executable('ionice'):
+            prefix += ['ionice', '-c', '3']
+        if find_executable('nice'):
+            prefix += ['nice', '-n', '19']
+    return prefix + ['git']
+
+def needs_maintenance(stats, max_loose_objects=256, max_packs=8, max_loose_refs=128):
+    """
+    Return True if a repository has to be compacted.
+
+    Arguments:
+    stats -- Object statistics (see get_object_stats)
+    max_loose_objects -- Loose objects allowed.
+    max_packs -- Packs allowed.
+    max_loose_refs -- Loose references allowed.
+    """
+    return (stats['loose_objects'] > max_loose_objects or
+            stats['packs'] > max_packs or
+            stats['loose_refs'] > max_loose_refs)
+
+def read_state(path):
+    """
+    Read result of last maintenance of a repository (see maintain), None
+    if it was never maintained.
+    """
+    try:
+        with open(os.path.join(path, '.git', __state_file__), 'r') as state_file:
+            return json.load(state_file)
+    except (IOError, ValueError):
+        return None
+
+def run_task(path, name, command, throttle=True):
+    """
+    Run a maintenance task in a repository.
+
+    Arguments:
+    path -- Repository working directory.
+    name -- Task name.
+    command -- Git command arguments.
+    throttle -- (see get_command_prefix)
+
+    Returns:
+    Duration of the task in seconds.
+
+    Raises:
+    MaintenanceException if task failed.
+    """
+    started = time.time()
+    process = subprocess.Popen(
+        get_command_prefix(throttle) + command,
+        cwd=path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    _, error = process.communicate()
+    duration = time.time() - started
+
+    status = 'ok' if process.returncode == 0 else 'failed'
+    MAINTENANCE_DURATION.observe(duration, task=name, status=status)
+    if process.returncode != 0:
+        raise MaintenanceException('Task \'%s\' failed: %s' % (name, error.strip()))
+    return duration
+
+def maintain(path, throttle=True):
+    """
+    Compact a repository and record how much it improved.
+
+    Arguments:
+    path -- Repository working directory.
+    throttle -- (see get_command_prefix)
+
+    Returns:
+    A dictionnary with 'timestamp', object statistics and open time
+    'before' and 'after' maintenance, duration of each task and
+    'failures' (task name -> error message). It's also stored in the
+    repository (see read_state)
+    """
+    before = dict(get_object_stats(path), open_time=measure_open(path))
+
+    tasks = {}
+    failures = {}
+    for name, command in __tasks__:
+        try:
+            tasks[name] = run_task(path, name, command, throttle)
+        except (MaintenanceException, OSError) as error:
+            # Older Git versions don't support every task, go on with others
+            logging.warning('Maintenance of \'%s\': %s', path, error)
+            failures[name] = str(error)
+
+    after = dict(get_object_stats(path), open_time=measure_open(path))
+
+    for stage, stats in (('before', before), ('after', after)):
+        MAINTENANCE_LOOSE_OBJECTS.observe(stats['loose_objects'], stage=stage)
+        if stats['open_time'] is not None:
+            MAINTENANCE_OPEN_TIME.observe(stats['open_time'], stage=stage)
+
+    state = {
+        'timestamp': time.time(),
+        'before': before,
+        'after': after,
+        'tasks': tasks,
+        'failures': failures
+    }
+
+    tmp_path = os.path.join(path, '.git', '%s.%d.tmp' % (__state_file__, os.getpid()))
+    with open(tmp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.rename(tmp_path, os.path.join(path, '.git', __state_file__))
+
+    return state
@@ -0,0 +1,412 @@
+"""
+This module contains a minimal metrics registry made of histograms.
+
+Metrics of a process can be dumped in a directory shared by many processes
+(such as forked API workers), collected back and formatted according to
+Prometheus text exposition format.
+"""
+
+import os
+import json
+import glob
+import time
+import threading
+import functools
+import contextlib
+
+__default_buckets__ = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram(object):
+    """
+    Histogram of observed values per set of labels.
+    """
+
+    def __init__(self, name, description, labels=(), buckets=__default_buckets__):
+        """
+        Construct an histogram.
+
+        Arguments:
+        name -- Metric name.
+        description -- Metric help text.
+        labels -- Names of labels.
+        buckets -- Upper bounds of buckets.
+        """
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Observe a value.
+
+        Arguments:
+        value -- Observed value.
+
+        Keyword arguments:
+        Value of each label of this histogram.
+        """
+        key = tuple(labels.get(label, '') for label in self.labels)
+
+        with self.lock:
+            # Cumulative bucket counters followed by sum and count
+            counters = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counters[index] += 1
+            counters[-2] += value
+            counters[-1] += 1
+
+    def dump(self):
+        """
+        Return a JSON serializable state of this histogram.
+        """
+        with self.lock:
+            return {
+                'description': self.description,
+                'labels': self.labels,
+                'buckets': self.buckets,
+                'values': [[list(key), list(counters)] for key, counters in self.values.items()]
+            }
+
+class Registry(object):
+    """
+    Registry of metrics of current process.
+    """
+
+    def __init__(self):
+        """
+        Construct an empty registry.
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name, description, labels=(), buckets=__default_buckets__):
+        """
+        Get an histogram from its name or create it.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, description, labels, buckets)
+            return self.metrics[name]
+
+    def dump(self):
+        """
+        Return a JSON serializable state of all metrics.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return dict((metric.name, metric.dump()) for metric in metrics)
+
+    def write(self, path):
+        """
+        Write metrics of this process in given file. File is replaced
+        atomically to never let a reader see a partial state.
+
+        Arguments:
+        path -- File path.
+        """
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'w') as metrics_file:
+            json.dump(self.dump(), metrics_file)
+        os.rename(tmp_path, path)
+
+    @staticmethod
+    def collect(directory):
+        """
+        Read and merge metrics written by many processes in given directory.
+
+        Arguments:
+        directory -- Directory where processes are writing their metrics.
+        """
+        merged = {}
+
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            try:
+                with open(path, 'r') as metrics_file:
+                    dump = json.load(metrics_file)
+            except (IOError, ValueError):
+                # File removed or replaced meanwhile, skip it
+                continue
+
+            for name, metric in dump.items():
+                target = merged.setdefault(name, {
+                    'description': metric['description'],
+                    'labels': metric['labels'],
+                    'buckets': metric['buckets'],
+                    'values': {}
+                })
+                for labels, counters in metric['values']:
+                    labels = tuple(labels)
+                    if labels in target['values']:
+                        target['values'][labels] = [a + b for a, b in zip(target['values'][labels], counters)]
+                    else:
+                        target['values'][labels] = counters
+
+        for metric in merged.values():
+            metric['values'] = [[list(key), counters] for key, counters in metric['values'].items()]
+
+        return merged
+
+    @staticmethod
+    def format(dump):
+        """
+        Format dumped metrics according to Prometheus text exposition format.
+
+        Arguments:
+        dump -- Metrics (see Registry.dump and Registry.collect)
+        """
+        lines = []
+
+        for name in sorted(dump):
+            metric = dump[name]
+            lines.append('# HELP %s %s' % (name, metric['description']))
+            lines.append('# TYPE %s histogram' % name)
+
+            for key, counters in sorted(metric['values']):
+                labels = ['%s="%s"' % (label, _escape(value)) for label, value in zip(metric['labels'], key)]
+
+                # Bucket counters are already cumulative
+                for bound, count in zip(metric['buckets'], counters):
+                    bound_label = 'le="%s"' % repr(float(bound))
+                    lines.append('%s_bucket{%s} %d' % (name, ','.join(labels + [bound_label]), count))
+                lines.append('%s_bucket{%s} %d' % (name, ','.join(labels + ['le="+Inf"']), counters[-1]))
+                lines.append('%s_sum{%s} %s' % (name, ','.join(labels), repr(float(counters[-2]))))
+                lines.append('%s_count{%s} %d' % (name, ','.join(labels), counters[-1]))
+
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    """
+    Escape label value for text exposition format.
+    """
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+REGISTRY = Registry()
+
+PHASE_DURATION = REGISTRY.histogram(
+    'sid_phase_duration_seconds',
+    'Duration of request phases (authentication, Git operations, encoding, ...).',
+    ('phase',)
+)
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'sid_request_duration_seconds',
+    'Duration of HTTP requests per route.',
+    ('handler', 'method', 'code')
+)
+
+TRANSFER_BYTES = REGISTRY.histogram(
+    'sid_transfer_bytes',
+    'Bytes received by fetches and sent by pushes.',
+    ('operation',),
+    tuple(1024 * 4 ** power for power in range(11))
+)
+
+TRANSFER_OBJECTS = REGISTRY.histogram(
+    'sid_transfer_objects',
+    'Objects received by fetches and sent by pushes.',
+    ('operation',),
+    (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+)
+
+TRANSFER_PHASE_DURATION = REGISTRY.histogram(
+    'sid_transfer_phase_duration_seconds',
+    'Duration of fetch and push phases.',
+    ('operation', 'phase')
+)
+
+_local = threading.local()
+
+class Trace(object):
+    """
+    Phase durations and annotations of a single request.
+    """
+
+    def __init__(self):
+        """
+        Construct an empty trace.
+        """
+        self.phases = []
+        self.annotations = {}
+        self.repositories = {}
+        self.cache = {}
+        self.transfers = []
+
+    def add(self, phase, duration):
+        """
+        Add duration of a phase.
+
+        Arguments:
+        phase -- Phase name.
+        duration -- Duration in seconds.
+        """
+        self.phases.append((phase, duration))
+
+    def get_durations(self):
+        """
+        Return list of (phase, duration) where durations of a phase repeated
+        many times are summed. Phases are listed by order of appearance.
+        """
+        durations = []
+        indexes = {}
+        for phase, duration in self.phases:
+            if phase in indexes:
+                durations[indexes[phase]][1] += duration
+            else:
+                indexes[phase] = len(durations)
+                durations.append([phase, duration])
+        return [tuple(item) for item in durations]
+
+    def annotate(self, **annotations):
+        """
+        Add annotations (user, repository, ...) to this trace.
+        """
+        self.annotations.update(annotations)
+
+def stop_trace(trace=None):
+    """
+    Stop tracing phases of current thread.
+
+    Arguments:
+    trace -- Only stop if current trace is the given one (optional)
+    """
+    if trace is None or getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+
+def current_trace():
+    """
+    Return trace of current thread if any.
+    """
+    return getattr(_local, 'trace', None)
+
+@contextlib.contextmanager
+def traced(trace):
+    """
+    Context manager which sets given trace as trace of current thread,
+    previous one is restored on exit. Requests processed by the IOLoop are
+    interleaved: used as a tornado StackContext, it's entered again every
+    time a callback of the request runs (see sid.api.http.server_timing)
+
+    Arguments:
+    trace -- Trace of the request.
+    """
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+def run_traced(trace, func, *args, **kwargs):
+    """
+    Call a function with given trace as trace of current thread, such as a
+    function run by an executor on behalf of a request.
+
+    Arguments:
+    trace -- Trace of the request (handler 'trace' attribute)
+    func -- Function to be called with remaining arguments.
+    """
+    with traced(trace):
+        return func(*args, **kwargs)
+
+def annotate(**annotations):
+    """
+    Annotate trace of current thread if any (see Trace.annotate)
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.annotate(**annotations)
+
+def trace_repository(name, cached):
+    """
+    Record in trace of current thread a repository used by the request.
+
+    Arguments:
+    name -- Repository name.
+    cached -- True if a local copy of the repository already existed.
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.repositories[name] = 'hit' if cached else 'miss'
+
+def cache_status(name, hit):
+    """
+    Record in trace of current thread whether a cache has been hit.
+
+    Arguments:
+    name -- Cache name.
+    hit -- True on cache hit, False on cache miss.
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.cache[name] = 'hit' if hit else 'miss'
+
+def record_transfer(repository, stats):
+    """
+    Record statistics of a fetch or a push in metrics and in trace of
+    current thread.
+
+    Arguments:
+    repository -- Repository path.
+    stats -- Transfer statistics (see sid.lib.git.TransferStats.to_dict)
+    """
+    operation = stats['operation']
+    if operation == 'fetch':
+        transferred_bytes, objects = stats['received_bytes'], stats['received_objects']
+    else:
+        transferred_bytes, objects = stats['pushed_bytes'], stats['pushed_objects']
+
+    TRANSFER_BYTES.observe(transferred_bytes, operation=operation)
+    TRANSFER_OBJECTS.observe(objects, operation=operation)
+    for phase, duration in stats['phases'].items():
+        TRANSFER_PHASE_DURATION.observe(duration, operation=operation, phase=phase)
+
+    trace = current_trace()
+    if trace is not None:
+        transfer = dict(stats, repository=repository)
+        trace.transfers.append(transfer)
+
+        key = 'bytes_fetched' if operation == 'fetch' else 'bytes_pushed'
+        trace.annotations[key] = trace.annotations.get(key, 0) + transferred_bytes
+
+class timed(object): # pylint: disable=C0103
+    """
+    Measure duration of a phase. Can be used as a context manager or as a
+    function decorator.
+
+    Example:
+    > with timed('fetch'):
+    >     remote.fetch()
+    """
+
+    def __init__(self, phase):
+        """
+        Construct a phase timer.
+
+        Arguments:
+        phase -- Phase name.
+        """
+        self.phase = phase
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.time() - self.started
+        PHASE_DURATION.observe(duration, phase=self.phase)
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add(self.phase, duration)
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs): # pylint: disable=C0111
+            with timed(self.phase):
+                return func(*args, **kwargs)
+        return wrapper
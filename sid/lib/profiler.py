@@ -0,0 +1,96 @@
+"""
+This module contains a low overhead sampling profiler.
+
+A background thread periodically samples the stack of the profiled thread.
+Samples are aggregated as "collapsed stacks" (one line per stack with its
+number of samples) which can be rendered by flame graph tools.
+"""
+
+import sys
+import time
+import threading
+import collections
+
+__default_interval__ = 0.005
+
+class ProfilerBusyException(Exception):
+    """
+    Exception raised when a profiler is already running.
+    """
+    pass
+
+class SamplingProfiler(object):
+    """
+    Sample stack of a thread at a fixed interval.
+    """
+
+    # Only one profiler at a time, samples would be biased by each other
+    running = threading.Lock()
+
+    def __init__(self, thread_id=None, interval=__default_interval__):
+        """
+        Construct a sampling profiler.
+
+        Arguments:
+        thread_id -- Identifier of profiled thread (default: current thread)
+        interval -- Interval between two samples in seconds.
+        """
+        self.thread_id = thread_id if thread_id is not None else threading.current_thread().ident
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        """
+        Start sampling.
+
+        Raises:
+        ProfilerBusyException if another profiler is running.
+        """
+        if not SamplingProfiler.running.acquire(False):
+            raise ProfilerBusyException('A profiler is already running')
+
+        self.sampler = threading.Thread(target=self._sample, name='sid-profiler')
+        self.sampler.daemon = True
+        self.sampler.start()
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        self.stopped.set()
+        self.sampler.join()
+        SamplingProfiler.running.release()
+
+    def _sample(self):
+        """
+        Sampling loop executed by the sampler thread.
+        """
+        while not self.stopped.is_set():
+            frame = sys._current_frames().get(self.thread_id) # pylint: disable=W0212
+            if frame is not None:
+                self.samples[SamplingProfiler.collapse(frame)] += 1
+            del frame
+            time.sleep(self.interval)
+
+    @staticmethod
+    def collapse(frame):
+        """
+        Format a stack as a single line; from outermost to innermost frame.
+
+        Arguments:
+        frame -- Innermost frame of the stack.
+        """
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append('%s:%s:%d' % (frame.f_globals.get('__name__', '?'), code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def get_collapsed(self):
+        """
+        Return samples as collapsed stacks, most sampled first.
+        """
+        return ''.join('%s %d\n' % (stack, count) for stack, count in self.samples.most_common())
@@ -4,9 +4,20 @@ This module contains SID Template object.
 
 import os
 from urlparse import urlparse
+import pygit2
 from milhoja import Milhoja
 from sid.lib.git import Repository
 
+__renders_prefix__ = u'refs/renders/'
+__empty_tree__ = u'4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+__initial_message__ = u'Initializing project.'
+
+class ProjectException(Exception):
+    """
+    Exception linked to project mechanism.
+    """
+    pass
+
 class Project(Repository):
     """
     This class represents a SID project. It's basically a Git repository with
@@ -45,7 +56,7 @@ class Project(Repository):
         self.assert_is_open()
 
         if self.is_empty:
-            self.commit('Initializing project.')
+            self.commit(__initial_message__)
 
         self.template.install(
             template.path,
@@ -68,6 +79,107 @@ class Project(Repository):
             extra_context=data
         )
 
+    def apply_render(self, path, render, name):
+        """
+        Apply a template render made in a scratch clone of this project (see
+        sid.lib.render): rendered commits are fetched then merged.
+
+        Arguments:
+        path -- Scratch clone.
+        render -- Render result (dictionnary with 'branch' and 'commit')
+        name -- Unique name of the render.
+
+        Raises: (see Repository.merge_reference)
+        """
+        self.assert_is_open()
+
+        ref_name = __renders_prefix__ + name
+        self.fetch_local(path, ['+%s:%s' % (render['branch'], ref_name)])
+        try:
+            self.merge_reference(ref_name, 'Merge template render \'%s\'' % name)
+        finally:
+            self.delete_reference(ref_name)
+
+    def get_base_tree(self):
+        """
+        Return hexadecimal identifier of the tree a template is installed on
+        (tree of HEAD, empty tree for an empty project)
+        """
+        self.assert_is_open()
+
+        if self.is_empty():
+            return __empty_tree__
+        return self.repo.get(self.repo.head.target).tree.hex
+
+    def apply_cached_render(self, path, ref_name, name):
+        """
+        Apply a cached template render (see sid.lib.render.RenderCache)
+        without rendering anything. Cached commits were made on another
+        clone: commits following the one the template was installed on are
+        replayed on HEAD with the signature of this project, then merged as
+        a render made in a scratch clone (see apply_render).
+
+        Arguments:
+        path -- Repository of the render cache.
+        ref_name -- Reference of the cached render in this repository.
+        name -- Unique name of the render.
+
+        Raises: (see Repository.merge_reference)
+        """
+        self.assert_is_open()
+
+        # Installations on an empty project start with an initial commit
+        # (see install_template), which tree is the empty one.
+        if self.is_empty():
+            self.commit(__initial_message__)
+
+        local_ref = __renders_prefix__ + name
+        self.fetch_local(path, ['+%s:%s' % (ref_name, local_ref)])
+        try:
+            head = self.repo.head.target
+            cached_oid = self.repo.lookup_reference(local_ref).target
+            base = self._find_render_base(cached_oid, self.repo.get(head).tree.id)
+
+            self.repo.lookup_reference(local_ref).set_target(self._replay_commits(cached_oid, base, head))
+            self.merge_reference(local_ref, 'Merge template render \'%s\'' % name)
+        finally:
+            self.delete_reference(local_ref)
+
+    def _find_render_base(self, oid, tree):
+        """
+        Return identifier of the last commit with given tree in first parent
+        history of a render: the one template was installed on.
+        """
+        commit = self.repo.get(oid)
+        while commit.tree.id != tree:
+            if not commit.parents:
+                raise ProjectException('Cached render is not based on tree %s' % tree)
+            commit = commit.parents[0]
+        return commit.id
+
+    def _replay_commits(self, oid, base, head):
+        """
+        Replay commits of a render following its base commit on given head,
+        keeping their trees, messages and topology.
+
+        Returns:
+        Identifier of the replayed commit of given oid.
+        """
+        user = self.sign if self.sign else self.get_default_signature()
+
+        replayed = {base: head}
+        walker = self.repo.walk(oid, pygit2.GIT_SORT_TOPOLOGICAL | pygit2.GIT_SORT_REVERSE) # pylint: disable=E1101
+        walker.hide(base)
+        for commit in walker:
+            replayed[commit.id] = self.repo.create_commit(
+                None, # Reference is set once every commit is replayed
+                user, user, # Author and committer
+                commit.message, # Commit message
+                commit.tree.id, # Commit tree
+                [replayed[parent] for parent in commit.parent_ids if parent in replayed]
+            )
+        return replayed[oid]
+
     def has_template(self):
         """
         Return True if a template is installed otherwise False.
@@ -0,0 +1,320 @@
+"""
+This module contains rendering of templates in worker processes.
+
+Milhoja renders Cookiecutter templates in Python: installing or upgrading a
+template is CPU bound and would block any thread of an API worker. Renders
+are executed by forked processes, each one in a scratch clone of the
+project; the resulting commit is then fetched by the API worker (see
+sid.lib.project.Project.apply_render). A render exceeding its deadline is
+killed without leaving anything in the project.
+
+Rendered installations are cached in a bare repository shared by workers
+(see RenderCache): a template version installed with the same data on the
+same tree (such as a new project) is committed from the cached tree without
+rendering anything.
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import logging
+import tempfile
+import threading
+import multiprocessing
+import pygit2
+from sid.lib.git import Repository, RepositoryNotFoundException
+from sid.lib.project import Project
+from sid.lib.template import Template
+from sid.lib.metrics import REGISTRY
+from sid.lib import maintenance
+
+__scratch_dir__ = u'sid-renders'
+__cache_prefix__ = u'refs/renders/'
+
+RENDER_DURATION = REGISTRY.histogram(
+    'sid_render_duration_seconds',
+    'Duration of template renders.',
+    ('operation', 'status'),
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+
+class RenderException(Exception):
+    """
+    Exception raised when a template could not be rendered.
+    """
+    pass
+
+class RenderTimeoutException(RenderException):
+    """
+    Exception raised when a render exceeded its deadline.
+    """
+    pass
+
+def create_scratch(project):
+    """
+    Create an empty scratch directory for a render of given project. It's
+    located in project Git directory, so it's never mistaken for a clone of
+    the workspace and objects can be hard linked.
+
+    Arguments:
+    project -- Opened project.
+    """
+    scratch_dir = os.path.join(project.repo.path, __scratch_dir__)
+    if not os.path.isdir(scratch_dir):
+        try:
+            os.makedirs(scratch_dir)
+        except OSError: # pragma: no cover
+            # Directory created concurrently by another worker
+            pass
+    return tempfile.mkdtemp(dir=scratch_dir)
+
+def remove_scratch(scratch):
+    """
+    Remove a scratch directory (see create_scratch)
+    """
+    shutil.rmtree(scratch, ignore_errors=True)
+
+def render_template(scratch, project_path, template_path, version, data, upgrade, signature):
+    """
+    Install or upgrade a template in a scratch clone of a project. This
+    function is executed by a render process (see RenderPool)
+
+    Arguments:
+    scratch -- Empty scratch directory.
+    project_path -- Path of the project local copy.
+    template_path -- Path of the template local copy.
+    version -- Template version.
+    data -- Template data.
+    upgrade -- Upgrade installed template instead of installing it.
+    signature -- Tuple (name, email) of commits author.
+
+    Returns:
+    A dictionnary with 'branch' (full name) and 'commit' (hexadecimal
+    identifier) of the rendered commit in scratch clone.
+    """
+    pygit2.clone_repository(project_path, scratch)
+
+    project = Project(scratch)
+    project.open()
+    project.set_default_signature(*signature)
+
+    if upgrade:
+        project.upgrade_template(version, data)
+    else:
+        template = Template(template_path)
+        template.open()
+        project.install_template(template, version, data)
+
+    # Make sure nothing rendered is left out of the commit
+    if project.repo.status():
+        project.commit_all('Rendering template version %s.' % version)
+
+    return {
+        'branch': project.repo.head.name,
+        'commit': project.repo.head.target.hex
+    }
+
+def _run(connection, func, args):
+    """
+    Entry point of a render process: send outcome of the function to the
+    API worker. Errors are sent as messages since they may not be picklable.
+    """
+    try:
+        connection.send((True, func(*args)))
+    except Exception as error: # pylint: disable=W0703
+        connection.send((False, '%s: %s' % (error.__class__.__name__, error)))
+    finally:
+        connection.close()
+
+class RenderPool(object):
+    """
+    Bounded pool of render processes. Each render is executed by its own
+    forked process, so a render exceeding its deadline is killed without
+    disturbing others.
+    """
+
+    def __init__(self, max_workers=2, timeout=300):
+        """
+        Construct a render pool.
+
+        Arguments:
+        max_workers -- Maximum number of renders running concurrently.
+        timeout -- Deadline of a render in seconds (0 for no limit)
+        """
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.timeout = timeout or None
+
+    def run(self, operation, func, *args):
+        """
+        Execute a function in a render process and wait for its result.
+        This function is blocking, it has to be called from a job thread.
+
+        Arguments:
+        operation -- Operation name ('install', 'upgrade', ...) for metrics.
+        func -- Function to execute with remaining arguments. Its result
+                must be picklable.
+
+        Raises:
+        RenderTimeoutException if deadline expired.
+        RenderException if function failed.
+        """
+        with self.slots:
+            started = time.time()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_run, args=(sender, func, args))
+            process.daemon = True
+            process.start()
+            sender.close()
+
+            try:
+                if not receiver.poll(self.timeout):
+                    process.terminate()
+                    RENDER_DURATION.observe(time.time() - started, operation=operation, status='timeout')
+                    raise RenderTimeoutException('Render exceeded %d seconds' % self.timeout)
+
+                try:
+                    succeeded, result = receiver.recv()
+                except EOFError:
+                    # Process died without any outcome (such as killed)
+                    succeeded, result = False, None
+            finally:
+                receiver.close()
+                process.join()
+
+            if result is None and not succeeded:
+                result = 'Render process exited with code %s' % process.exitcode
+
+        RENDER_DURATION.observe(
+            time.time() - started,
+            operation=operation,
+            status='ok' if succeeded else 'failed'
+        )
+        if not succeeded:
+            raise RenderException(result)
+        return result
+
+def get_data_hash(data):
+    """
+    Return a hash of template data which doesn't depend on keys order or
+    JSON formatting.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=True)
+    return hashlib.sha256(canonical).hexdigest()
+
+class RenderCache(object):
+    """
+    Rendered trees of template installations, stored in a bare repository
+    shared by workers. Entries are references named after their key: a
+    template version (commit identifier), the tree the template was
+    installed on and a hash of template data. References are never packed:
+    their modification time tracks their last use.
+    """
+
+    def __init__(self, path, max_entries=1024):
+        """
+        Construct a render cache.
+
+        Arguments:
+        path -- Bare repository of the cache (created on first use)
+        max_entries -- Maximum number of cached renders.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.stored = 0
+
+    @staticmethod
+    def get_key(template_oid, base_tree, data):
+        """
+        Return key of a render.
+
+        Arguments:
+        template_oid -- Identifier of the template version commit.
+        base_tree -- Identifier of the tree template is installed on.
+        data -- Template data.
+        """
+        return hashlib.sha256(u'\n'.join([
+            str(template_oid),
+            str(base_tree),
+            get_data_hash(data)
+        ]).encode('utf-8')).hexdigest()
+
+    def get_ref_name(self, key):
+        """
+        Return reference of a cached render.
+        """
+        return __cache_prefix__ + key
+
+    def open(self):
+        """
+        Open the cache repository, create it if needed.
+        """
+        repository = Repository(self.path)
+        try:
+            repository.open()
+        except RepositoryNotFoundException:
+            pygit2.init_repository(self.path, bare=True)
+            repository.open()
+        return repository
+
+    def lookup(self, key):
+        """
+        Return True if a render is cached. Cached renders are marked as
+        recently used.
+        """
+        path = os.path.join(self.path, self.get_ref_name(key))
+        if not os.path.exists(path):
+            return False
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, scratch, branch):
+        """
+        Cache a render made in a scratch clone.
+
+        Arguments:
+        key -- Render key (see get_key)
+        scratch -- Scratch clone.
+        branch -- Rendered branch (full name)
+        """
+        self.open().fetch_local(scratch, ['+%s:%s' % (branch, self.get_ref_name(key))])
+
+        self.stored += 1
+        if self.stored % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Forget least recently used renders beyond 'max_entries', then
+        remove their objects. Objects fetched recently are kept since they
+        may belong to a render being stored.
+        """
+        refs_dir = os.path.join(self.path, __cache_prefix__)
+        if not os.path.isdir(refs_dir):
+            return
+
+        entries = []
+        for name in os.listdir(refs_dir):
+            try:
+                entries.append((os.path.getmtime(os.path.join(refs_dir, name)), name))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort(reverse=True)
+        for _, name in entries[self.max_entries:]:
+            try:
+                os.remove(os.path.join(refs_dir, name))
+            except OSError:
+                pass
+
+        try:
+            maintenance.run_task(self.path, 'prune', ['prune', '--expire=1.hour.ago'])
+        except (maintenance.MaintenanceException, OSError) as error:
+            logging.warning('Pruning render cache: %s', error)
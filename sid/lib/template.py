@@ -6,12 +6,22 @@ import os
 import re
 import json
 import collections
+import threading
 import urlparse
+import pygit2
 import jsonschema
 from sid.lib.git import Repository, __tag_prefix__
+from sid.lib.metrics import timed, cache_status
+from sid.lib.versions import VersionIndex, VersionSpecException
 
 __cookiecutter_file__ = u'cookiecutter.json'
 __default_version_pattern__ = r'\S'
+__version_indexes_size__ = 128
+
+# Version indexes per template path: (tag references signature, index).
+# Templates are used by the IOLoop, job and executor threads.
+_version_indexes = collections.OrderedDict()
+_version_indexes_lock = threading.Lock()
 
 class TemplateException(Exception):
     """
@@ -30,7 +40,9 @@ class Template(Repository):
         """
         super(Template, self).__init__(path)
         self.version_pattern = version_pattern
+        self.version_regex = re.compile(version_pattern)
 
+    @timed('validate')
     def validate(self, data):
         """
         Validate template parameters using JSON template generated from cookicutter.json
@@ -57,12 +69,112 @@ class Template(Repository):
 
     def get_versions(self):
         """
-        List available version of a given template.
+        List available version of a given template, sorted by version
+        number (see sid.lib.versions)
+        """
+        return self.get_version_index().versions
+
+    def get_version_index(self):
+        """
+        Return index of available versions. Indexes are shared by every
+        Template object of the same local copy and rebuilt when tags change.
         """
         self.assert_is_open()
 
-        prog = re.compile(self.version_pattern)
-        return [tag for tag in self.get_tags() if prog.match(tag)]
+        signature = self.get_tags_signature()
+        with _version_indexes_lock:
+            cached = _version_indexes.get(self.path)
+        if cached is not None and cached[0] == signature:
+            cache_status('versions', True)
+            return cached[1]
+
+        cache_status('versions', False)
+        index = VersionIndex(tag for tag in self.list_tag_references() if self.version_regex.match(tag))
+
+        with _version_indexes_lock:
+            _version_indexes.pop(self.path, None)
+            _version_indexes[self.path] = (signature, index)
+            while len(_version_indexes) > __version_indexes_size__:
+                _version_indexes.popitem(last=False)
+
+        return index
+
+    def get_tags_signature(self):
+        """
+        Return a value which changes whenever a tag is created, moved or
+        deleted: modification times of packed references and of every
+        directory of loose tag references.
+        """
+        signature = []
+        packed_refs = os.path.join(self.repo.path, 'packed-refs')
+        if os.path.exists(packed_refs):
+            stat = os.stat(packed_refs)
+            signature.append((packed_refs, stat.st_mtime, stat.st_size))
+
+        for directory, _, _ in os.walk(os.path.join(self.repo.path, __tag_prefix__)):
+            signature.append((directory, os.stat(directory).st_mtime))
+
+        return tuple(signature)
+
+    def list_tag_references(self):
+        """
+        List tag names from 'refs/tags/' namespace only (loose and packed
+        references) instead of every reference of the repository.
+        """
+        tags = set()
+
+        tags_dir = os.path.join(self.repo.path, __tag_prefix__)
+        for directory, _, files in os.walk(tags_dir):
+            for name in files:
+                if not name.endswith('.lock'):
+                    tags.add(os.path.relpath(os.path.join(directory, name), tags_dir).replace(os.sep, '/'))
+
+        try:
+            with open(os.path.join(self.repo.path, 'packed-refs'), 'r') as packed_refs:
+                for line in packed_refs:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1].startswith(__tag_prefix__):
+                        tags.add(parts[1][len(__tag_prefix__):].decode('utf-8'))
+        except IOError:
+            pass
+
+        return tags
+
+    def has_version(self, version):
+        """
+        Return True if given version is available.
+        """
+        return version in self.get_version_index()
+
+    def resolve_version(self, spec):
+        """
+        Resolve a version specification: an exact version, 'latest' or a
+        range such as '^1.2' (see sid.lib.versions.parse_spec)
+
+        Returns:
+        Highest matching version, None if not any version matches.
+
+        Raises:
+        TemplateException if specification is invalid.
+        """
+        try:
+            return self.get_version_index().resolve(spec)
+        except VersionSpecException as error:
+            raise TemplateException(error.message)
+
+    def get_version_oid(self, version):
+        """
+        Return identifier of the commit tagged with given version.
+
+        Raises:
+        TemplateException if version is not available.
+        """
+        self.assert_is_open()
+
+        try:
+            return self.repo.lookup_reference(__tag_prefix__ + version).peel(pygit2.GIT_OBJ_COMMIT).id # pylint: disable=E1101
+        except (KeyError, ValueError):
+            raise TemplateException('Given version not available')
 
     def checkout_version(self, version):
         """
@@ -73,7 +185,7 @@ class Template(Repository):
         """
         self.assert_is_open()
 
-        if version not in self.get_versions():
+        if not self.has_version(version):
             raise TemplateException('Given version not available')
 
         self.checkout(__tag_prefix__ + version)
@@ -0,0 +1,223 @@
+"""
+This module contains semantic versioning helpers and the version index of
+templates.
+
+Versions are tag names. The version number is the last part of the name
+made of numbers ('1.2.3', 'v1.2', 'releases/1.2.3-rc.1'): tags are sorted by
+version number, pre-releases coming before releases. Tags without any
+version number come first, sorted by name.
+"""
+
+import re
+
+__version_pattern__ = re.compile(
+    r'^(?P<prefix>.*?)v?(?P<major>\d+)(?:\.(?P<minor>\d+))?(?:\.(?P<patch>\d+))?'
+    r'(?:-(?P<prerelease>[0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$'
+)
+__comparator_pattern__ = re.compile(r'^(?P<operator>>=|<=|>|<|==|=|\^|~)?\s*(?P<version>\S+)$')
+__latest__ = u'latest'
+
+class VersionSpecException(Exception):
+    """
+    Exception raised when a version specification cannot be parsed.
+    """
+    pass
+
+def parse_version(tag):
+    """
+    Parse version number of a tag.
+
+    Arguments:
+    tag -- Tag name.
+
+    Returns:
+    A tuple (major, minor, patch, prerelease) where prerelease is a tuple
+    of identifiers (empty for releases), None if tag has no version number.
+    """
+    matches = __version_pattern__.match(tag)
+    if matches is None or matches.group('prefix')[-1:] in tuple('0123456789.'):
+        return None
+
+    prerelease = matches.group('prerelease')
+    return (
+        int(matches.group('major')),
+        int(matches.group('minor') or 0),
+        int(matches.group('patch') or 0),
+        tuple(int(part) if part.isdigit() else part for part in prerelease.split('.')) if prerelease else ()
+    )
+
+def version_key(version):
+    """
+    Return sort key of a parsed version (see parse_version)
+    """
+    major, minor, patch, prerelease = version
+
+    # Releases come after their pre-releases; numeric identifiers come
+    # before alphanumeric ones
+    prerelease_key = (1,) if not prerelease else (0,) + tuple(
+        (0, part, u'') if isinstance(part, int) else (1, 0, part) for part in prerelease
+    )
+    return (major, minor, patch, prerelease_key)
+
+def sort_key(tag):
+    """
+    Return sort key of a tag (see module documentation)
+    """
+    version = parse_version(tag)
+    if version is None:
+        return (0, (), tag)
+    return (1, version_key(version), tag)
+
+def parse_spec(spec):
+    """
+    Parse a version range such as '>=1.2,<2', '^1.2.0', '~1.2' or '1.x'.
+
+    Arguments:
+    spec -- Version range (comparators separated by commas or spaces)
+
+    Returns:
+    A list of (operator, version) where operator is one of '>=', '>', '<='
+    and '<'.
+
+    Raises:
+    VersionSpecException
+    """
+    constraints = []
+    for comparator in re.split(r'\s*,\s*|\s+(?=[<>=^~])', spec.strip()):
+        matches = __comparator_pattern__.match(comparator.strip())
+        if matches is None:
+            raise VersionSpecException('Invalid version range \'%s\'' % spec)
+
+        operator = matches.group('operator') or '='
+        version = matches.group('version')
+
+        # Wildcards ('1.x', '1.2.*') are ranges
+        wildcard = re.match(r'^v?(\d+)(?:\.(\d+))?\.[xX*]$', version)
+        if wildcard is not None and operator == '=':
+            major = int(wildcard.group(1))
+            if wildcard.group(2) is None:
+                constraints += [('>=', (major, 0, 0, ())), ('<', (major + 1, 0, 0, ()))]
+            else:
+                minor = int(wildcard.group(2))
+                constraints += [('>=', (major, minor, 0, ())), ('<', (major, minor + 1, 0, ()))]
+            continue
+
+        parsed = parse_version(version)
+        if parsed is None:
+            raise VersionSpecException('Invalid version \'%s\' in range \'%s\'' % (version, spec))
+        major, minor, patch, _ = parsed
+
+        # Omitted parts ('^1', '~1.2') widen ranges
+        parts = __version_pattern__.match(version)
+        has_minor = parts.group('minor') is not None
+        has_patch = parts.group('patch') is not None
+
+        if operator == '^':
+            # Compatible changes: changes of the first non-zero part are not
+            # ('^1.2.3' is <2.0.0, '^0.2.3' is <0.3.0, '^0.0.3' is <0.0.4)
+            if major > 0 or not has_minor:
+                upper = (major + 1, 0, 0, ())
+            elif minor > 0 or not has_patch:
+                upper = (0, minor + 1, 0, ())
+            else:
+                upper = (0, 0, patch + 1, ())
+            constraints += [('>=', parsed), ('<', upper)]
+        elif operator == '~':
+            # Patch changes only (minor changes if minor is omitted)
+            upper = (major, minor + 1, 0, ()) if has_minor else (major + 1, 0, 0, ())
+            constraints += [('>=', parsed), ('<', upper)]
+        elif operator in ('=', '=='):
+            constraints += [('>=', parsed), ('<=', parsed)]
+        else:
+            constraints.append((operator, parsed))
+
+    return constraints
+
+def matches_spec(version, constraints):
+    """
+    Return True if a parsed version satisfies parsed constraints (see
+    parse_version and parse_spec). Pre-releases only match constraints
+    explicitly mentioning a pre-release.
+    """
+    key = version_key(version)
+    if version[3] and not any(constraint[3] for _, constraint in constraints):
+        return False
+
+    for operator, constraint in constraints:
+        bound = version_key(constraint)
+        if operator == '>=' and not key >= bound:
+            return False
+        if operator == '>' and not key > bound:
+            return False
+        if operator == '<=' and not key <= bound:
+            return False
+        if operator == '<' and not key < bound:
+            return False
+    return True
+
+class VersionIndex(object):
+    """
+    Sorted versions of a template with constant time membership checks.
+    """
+
+    def __init__(self, tags):
+        """
+        Construct an index.
+
+        Arguments:
+        tags -- Version tags.
+        """
+        self.versions = sorted(tags, key=sort_key)
+        self.lookup = frozenset(self.versions)
+        self.parsed = dict((tag, parse_version(tag)) for tag in self.versions)
+
+    def __contains__(self, version):
+        """
+        Return True if given version exists.
+        """
+        return version in self.lookup
+
+    def __len__(self):
+        """
+        Return number of versions.
+        """
+        return len(self.versions)
+
+    def latest(self):
+        """
+        Return latest release (latest pre-release if there is not any
+        release), None if there is not any version.
+        """
+        for tag in reversed(self.versions):
+            if self.parsed[tag] is not None and not self.parsed[tag][3]:
+                return tag
+        return self.versions[-1] if self.versions else None
+
+    def select(self, spec):
+        """
+        List versions matching a version range (see parse_spec), sorted.
+
+        Raises:
+        VersionSpecException
+        """
+        constraints = parse_spec(spec)
+        return [
+            tag for tag in self.versions
+            if self.parsed[tag] is not None and matches_spec(self.parsed[tag], constraints)
+        ]
+
+    def resolve(self, spec):
+        """
+        Return the version designated by an exact tag, 'latest' or the
+        highest version of a range; None if not any version matches.
+
+        Raises:
+        VersionSpecException
+        """
+        if spec in self.lookup:
+            return spec
+        if spec == __latest__:
+            return self.latest()
+
+        selected = self.select(spec)
+        return selected[-1] if selected else None
@@ -5,10 +5,16 @@ under a Git repository. Mixing sid.api.git.GitRepository and pyolite2.Pyolite.
 
 import os
 import re
+import time
+import random
+import pyolite2
 from pyolite2 import Pyolite, Rule
-from sid.lib.git import Repository
+from sid.lib.git import Repository, PushRejectedException
+from sid.lib.metrics import timed
 
 __gitolite_main_file__ = 'conf/gitolite.conf'
+__save_retries__ = 3
+__save_backoff__ = 0.1
 
 class RepositoryPatchException(Exception):
     """
@@ -16,6 +22,13 @@ class RepositoryPatchException(Exception):
     """
     pass
 
+class WarehouseConflictException(Exception):
+    """
+    Exception raised when pending changes cannot be saved on top of
+    concurrent changes of remote repository.
+    """
+    pass
+
 class Warehouse(Pyolite, Repository):
     """
     A Pyolite configuration under Git repository.
@@ -24,23 +37,136 @@ class Warehouse(Pyolite, Repository):
     def __init__(self, path):
         """ Initialize our Pyolite repository. Open its Git repository. """
         Repository.__init__(self, path)
-        Pyolite.__init__(self, os.path.join(path, __gitolite_main_file__))
+        self.conf_path = os.path.join(path, __gitolite_main_file__)
+        Pyolite.__init__(self, self.conf_path)
+
+        # Mutations applied since last save. They are replayed if remote
+        # repository changed meanwhile.
+        self.mutations = []
 
+    @timed('warehouse_load')
     def load(self):
         # Load Gitolite admin configuration
         Pyolite.load(self)
 
-    def save(self, message, remote='origin'):
-        """ Save Gitolite configuration and commit changes. """
+    def reload(self):
+        """ Drop in-memory configuration and load it again from disk. """
+        Pyolite.__init__(self, self.conf_path)
+        Pyolite.load(self)
+
+    def create_repo(self, name, patches):
+        """
+        Create and add a repository, then patch it (see patch_pyolite_repo).
+
+        Arguments:
+        name -- Repository name.
+        patches -- An array of JSON patches to be applied on created repository.
+        """
+        repo = pyolite2.Repository(name)
+        self.repos.append(repo)
+        Warehouse.patch_pyolite_repo(repo, patches)
+
+        self.mutations.append((Warehouse.create_repo, (name, list(patches))))
+        return repo
+
+    def patch_repo(self, name, patches):
+        """
+        Patch an existing repository (see patch_pyolite_repo).
+
+        Arguments:
+        name -- Repository name.
+        patches -- An array of JSON patches to be applied on the repository.
+        """
+        repo = self.repos[name]
+        Warehouse.patch_pyolite_repo(repo, patches)
+
+        self.mutations.append((Warehouse.patch_repo, (name, list(patches))))
+        return repo
+
+    def remove_repo(self, name):
+        """
+        Remove an existing repository.
+
+        Arguments:
+        name -- Repository name.
+        """
+        self.repos.remove(name)
+
+        self.mutations.append((Warehouse.remove_repo, (name,)))
+
+    @timed('warehouse_save')
+    def save(self, message, remote='origin', branch='master'):
+        """
+        Save Gitolite configuration, commit and push changes.
+
+        If push is rejected because remote changed meanwhile, pending mutations
+        are replayed on top of the new remote tip and push is retried with an
+        exponential backoff. It's blocking, backoff included: API handlers
+        run it in an executor (see AbstractWarehouseHandler.save_warehouse)
+
+        Raises:
+        WarehouseConflictException if changes could not be saved.
+        """
+        attempt = 0
+
+        while True:
+            # Save Gitolite configuration
+            Pyolite.save(self)
+
+            # Commit all changes made in Git repository
+            self.commit_all(message)
+
+            # Push to remote
+            try:
+                self.push(remote, branch)
+                break
+            except PushRejectedException:
+                if attempt >= __save_retries__:
+                    self.discard(remote, branch)
+                    raise WarehouseConflictException('Remote configuration changed too often, please retry later.')
+
+            # Let concurrent writer finish before retrying
+            time.sleep(__save_backoff__ * (2 ** attempt) * random.uniform(0.5, 1.5))
+            attempt += 1
 
-        # Save Gitolite configuration
-        Pyolite.save(self)
+            self.rebase(remote, branch)
 
-        # Commit all changes made in Git repository
-        self.commit_all(message)
+        self.mutations = []
+
+    def rebase(self, remote='origin', branch='master'):
+        """
+        Fetch remote changes and replay pending mutations on top of them.
+
+        Raises:
+        WarehouseConflictException if a mutation cannot be applied anymore.
+        """
+        mutations = self.mutations
+
+        self.discard(remote, branch)
+
+        try:
+            for mutation, args in mutations:
+                mutation(self, *args)
+        except (pyolite2.errors.RepositoryDuplicateException,
+                pyolite2.errors.RepositoryNotFoundException,
+                RepositoryPatchException) as error:
+            self.discard(remote, branch, fetch=False)
+            raise WarehouseConflictException('Conflict with concurrent changes (%s)' % error)
+
+    def discard(self, remote='origin', branch='master', fetch=True):
+        """
+        Discard local commits and pending mutations: reset local copy on
+        remote branch and reload configuration.
+
+        Arguments:
+        fetch -- Fetch remote changes first (default: True)
+        """
+        if fetch:
+            self.fetch_all(remote)
 
-        # Push to remote
-        self.push(remote)
+        self.reset_hard('refs/remotes/%s/%s' % (remote, branch))
+        self.reload()
+        self.mutations = []
 
     @staticmethod
     def patch_pyolite_repo(repo, patches):
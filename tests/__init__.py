@@ -0,0 +1,3 @@
+"""
+SID API tests.
+"""
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of sid.api.idempotency: scopes of idempotency keys.
+"""
+
+import pytest
+from sid.api.idempotency import get_scope
+
+@pytest.mark.parametrize('key', [
+    'ascii-key',
+    'cl\xc3\xa9',
+    u'cl\xe9',
+    '\xff\xfe'
+])
+def test_scope_of_any_key(key):
+    """
+    Scope is computed for keys which are not ASCII, given as bytes (such as
+    header values) or as unicode.
+    """
+    scope = get_scope('client', 'POST', '/projects', key)
+    assert len(scope) == 64
+
+def test_scope_encoding():
+    """
+    A key gives the same scope as bytes or as unicode.
+    """
+    assert get_scope('client', 'POST', '/projects', 'cl\xc3\xa9') == \
+        get_scope(u'client', u'POST', u'/projects', u'cl\xe9')
+
+@pytest.mark.parametrize('other', [
+    ('other', 'POST', '/projects', 'key'),
+    ('client', 'PUT', '/projects', 'key'),
+    ('client', 'POST', '/templates', 'key'),
+    ('client', 'POST', '/projects', 'other')
+])
+def test_scopes_differ(other):
+    """
+    Keys of different clients, methods or resources never collide.
+    """
+    assert get_scope('client', 'POST', '/projects', 'key') != get_scope(*other)
@@ -0,0 +1,92 @@
+"""
+Tests of sid.api.monitoring: requests recorded by an application built by
+create_app.
+"""
+
+import json
+import logging
+import pytest
+
+pytest.importorskip('pygit2')
+pytest.importorskip('pyolite2')
+pytest.importorskip('milhoja')
+
+from tornado.testing import AsyncHTTPTestCase # pylint: disable=C0413
+from sid.api import monitoring # pylint: disable=C0413
+from sid.api.http_server import create_app # pylint: disable=C0413
+from sid.lib.metrics import current_trace # pylint: disable=C0413
+
+class TrafficLogTest(AsyncHTTPTestCase):
+    """
+    Requests are recorded in traffic log without breaking them.
+    """
+
+    @pytest.fixture(autouse=True)
+    def setup_paths(self, tmpdir):
+        """
+        Use temporary workspace and traffic log.
+        """
+        self.tmpdir = tmpdir # pylint: disable=W0201
+
+    def setUp(self):
+        self.traffic_path = str(self.tmpdir.join('traffic.log'))
+        monitoring.setup_traffic_log(self.traffic_path, 'salt')
+        super(TrafficLogTest, self).setUp()
+
+    def tearDown(self):
+        super(TrafficLogTest, self).tearDown()
+        for handler in list(monitoring.traffic_log.handlers):
+            handler.close()
+            monitoring.traffic_log.removeHandler(handler)
+
+    def get_app(self):
+        return create_app({
+            'app': {
+                'workspace_dir': str(self.tmpdir.join('workspace')),
+                'remote_url': 'http://127.0.0.1:1',
+                'traffic_log_file': self.traffic_path
+            },
+            'auth': {
+                'public_key': ''
+            }
+        })
+
+    def read_traffic(self):
+        """
+        Return recorded requests.
+        """
+        for handler in monitoring.traffic_log.handlers:
+            handler.flush()
+        with open(self.traffic_path, 'r') as traffic:
+            return [json.loads(line) for line in traffic]
+
+    def test_route_recorded(self):
+        """
+        Matched route pattern is recorded with the request.
+        """
+        for _ in range(2):
+            assert self.fetch('/version').code == 200
+        assert self.fetch('/unknown').code == 404
+
+        entries = self.read_traffic()
+        assert [entry['route'] for entry in entries] == [r'/version$', r'/version$', r'.*$']
+        assert [entry['status'] for entry in entries] == [200, 200, 404]
+        assert current_trace() is None
+
+    def test_recording_failure(self):
+        """
+        A request is completed even if it cannot be recorded.
+        """
+        def fail(handler):
+            raise AttributeError(handler)
+
+        original = monitoring.log_traffic
+        monitoring.log_traffic = fail
+        try:
+            logging.disable(logging.ERROR)
+            for _ in range(2):
+                assert self.fetch('/version').code == 200
+        finally:
+            logging.disable(logging.NOTSET)
+            monitoring.log_traffic = original
+        assert current_trace() is None
@@ -0,0 +1,129 @@
+"""
+Tests of sid.lib.project: template renders applied to a project.
+"""
+
+import os
+import pytest
+
+pygit2 = pytest.importorskip('pygit2')
+pytest.importorskip('milhoja')
+
+from sid.lib.project import Project, __initial_message__ # pylint: disable=C0413
+from sid.lib.render import RenderCache # pylint: disable=C0413
+
+__signature__ = ('tester', 'tester@example.com')
+
+def write_files(project, files):
+    """
+    Write (or remove when content is None) files of a project.
+    """
+    for name, content in files.items():
+        path = os.path.join(project.path, name)
+        if content is None:
+            os.remove(path)
+            project.repo.index.remove(name)
+        else:
+            with open(path, 'w') as output:
+                output.write(content)
+    project.commit_all('Writing %s.' % ', '.join(sorted(files)))
+
+def open_project(path, origin=None):
+    """
+    Open a project, cloned from origin if given, otherwise empty.
+    """
+    if origin is None:
+        pygit2.init_repository(path)
+    else:
+        pygit2.clone_repository(origin, path)
+
+    project = Project(path)
+    project.open()
+    project.set_default_signature(*__signature__)
+    return project
+
+def list_files(project):
+    """
+    Return content of working directory files of a project.
+    """
+    files = {}
+    for directory, dirs, names in os.walk(project.path):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'r') as content:
+                files[os.path.relpath(path, project.path)] = content.read()
+    return files
+
+def list_history(project):
+    """
+    Return (message, tree, number of parents) of HEAD history.
+    """
+    return [
+        (commit.message, commit.tree.hex, len(commit.parents))
+        for commit in project.repo.walk(project.repo.head.target, pygit2.GIT_SORT_TOPOLOGICAL) # pylint: disable=E1101
+    ]
+
+def make_render(tmpdir, origin):
+    """
+    Make a render in a scratch clone of origin, as a render process would
+    (see sid.lib.render.render_template): a file is changed, one added and
+    one dropped.
+    """
+    scratch = open_project(str(tmpdir.join('scratch')), origin)
+    if scratch.is_empty():
+        scratch.commit(__initial_message__)
+        write_files(scratch, {'README': 'template\n', 'dropped': 'dropped\n'})
+    else:
+        write_files(scratch, {'README': 'template\n'})
+    write_files(scratch, {'added': 'added\n', 'dropped': None})
+    return scratch
+
+@pytest.mark.parametrize('empty', [True, False])
+def test_cached_render_equals_render(tmpdir, empty):
+    """
+    A render applied from the cache gives the same files and history as the
+    render applied from its scratch clone.
+    """
+    origin = open_project(str(tmpdir.join('origin')))
+    if not empty:
+        write_files(origin, {'README': 'project\n', 'dropped': 'dropped\n'})
+
+    scratch = make_render(tmpdir, origin.path)
+    branch = scratch.repo.head.name
+
+    cache = RenderCache(str(tmpdir.join('cache')))
+    key = cache.get_key('template', origin.get_base_tree(), {})
+    cache.store(key, scratch.path, branch)
+
+    miss = open_project(str(tmpdir.join('miss')), None if empty else origin.path)
+    miss.apply_render(scratch.path, {'branch': branch, 'commit': scratch.repo.head.target.hex}, 'miss')
+
+    hit = open_project(str(tmpdir.join('hit')), None if empty else origin.path)
+    hit.apply_cached_render(cache.path, cache.get_ref_name(key), 'hit')
+
+    assert list_files(hit) == list_files(miss)
+    assert 'dropped' not in list_files(hit)
+    assert list_history(hit) == list_history(miss)
+    assert not hit.repo.status()
+    assert sorted(hit.repo.references) == sorted(miss.repo.references)
+
+def test_cached_render_signature(tmpdir):
+    """
+    Replayed commits are signed by the project, not by the cached render.
+    """
+    origin = open_project(str(tmpdir.join('origin')))
+    write_files(origin, {'README': 'project\n', 'dropped': 'dropped\n'})
+
+    scratch = make_render(tmpdir, origin.path)
+    cache = RenderCache(str(tmpdir.join('cache')))
+    key = cache.get_key('template', origin.get_base_tree(), {})
+    cache.store(key, scratch.path, scratch.repo.head.name)
+
+    hit = open_project(str(tmpdir.join('hit')), origin.path)
+    hit.set_default_signature('other', 'other@example.com')
+    hit.apply_cached_render(cache.path, cache.get_ref_name(key), 'hit')
+
+    head = hit.repo.get(hit.repo.head.target)
+    assert head.author.name == 'other'
+    assert head.parents[0].parents[0].id == origin.repo.head.target
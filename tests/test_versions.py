@@ -0,0 +1,119 @@
+"""
+Tests of sid.lib.versions: version parsing, ranges and index.
+"""
+
+import pytest
+from sid.lib.versions import (
+    VersionIndex,
+    VersionSpecException,
+    parse_spec,
+    parse_version,
+    matches_spec
+)
+
+__tags__ = [
+    '0.0.1', '0.0.2', '0.0.3', '0.1.0', '0.1.5', '0.2.0',
+    '1.0.0', '1.2.0-rc.1', '1.2.0', '1.2.3', '1.3.0', '1.10.0',
+    '2.0.0-beta', '2.0.0', '2.1.0', 'v3.0', 'untagged'
+]
+
+@pytest.mark.parametrize('tag, expected', [
+    ('1.2.3', (1, 2, 3, ())),
+    ('v1.2', (1, 2, 0, ())),
+    ('3', (3, 0, 0, ())),
+    ('releases/1.2.3-rc.1', (1, 2, 3, (u'rc', 1))),
+    ('1.2.3+build.5', (1, 2, 3, ())),
+    ('untagged', None),
+    ('release-1.2a', None)
+])
+def test_parse_version(tag, expected):
+    """
+    Version numbers are parsed from the end of tag names.
+    """
+    assert parse_version(tag) == expected
+
+@pytest.mark.parametrize('spec, expected', [
+    # Caret: changes of the first non-zero part are excluded
+    ('^1.2.3', ['1.2.3', '1.3.0', '1.10.0']),
+    ('^1.2', ['1.2.0', '1.2.3', '1.3.0', '1.10.0']),
+    ('^1', ['1.0.0', '1.2.0', '1.2.3', '1.3.0', '1.10.0']),
+    ('^0.1.0', ['0.1.0', '0.1.5']),
+    ('^0.1', ['0.1.0', '0.1.5']),
+    ('^0.0.2', ['0.0.2']),
+    ('^0.0', ['0.0.1', '0.0.2', '0.0.3']),
+    ('^0', ['0.0.1', '0.0.2', '0.0.3', '0.1.0', '0.1.5', '0.2.0']),
+    # Tilde: patch changes only, minor changes if minor is omitted
+    ('~1.2.0', ['1.2.0', '1.2.3']),
+    ('~1.2', ['1.2.0', '1.2.3']),
+    ('~1', ['1.0.0', '1.2.0', '1.2.3', '1.3.0', '1.10.0']),
+    ('~0.0.2', ['0.0.2', '0.0.3']),
+    # Wildcards
+    ('1.x', ['1.0.0', '1.2.0', '1.2.3', '1.3.0', '1.10.0']),
+    ('1.2.*', ['1.2.0', '1.2.3']),
+    ('0.X', ['0.0.1', '0.0.2', '0.0.3', '0.1.0', '0.1.5', '0.2.0']),
+    # Comparators
+    ('>=1.2,<2', ['1.2.0', '1.2.3', '1.3.0', '1.10.0']),
+    ('>1.2.0 <=1.3.0', ['1.2.3', '1.3.0']),
+    ('<0.1', ['0.0.1', '0.0.2', '0.0.3']),
+    ('=1.2.3', ['1.2.3']),
+    ('==2.1.0', ['2.1.0']),
+    ('1.2.3', ['1.2.3']),
+    ('>=3', ['v3.0']),
+    # Pre-releases only match ranges mentioning one
+    ('>=1.2.0-rc.1,<1.2.1', ['1.2.0-rc.1', '1.2.0']),
+    ('^2.0.0-beta', ['2.0.0-beta', '2.0.0', '2.1.0']),
+    ('>4', [])
+])
+def test_select(spec, expected):
+    """
+    Ranges select matching versions, sorted.
+    """
+    assert VersionIndex(__tags__).select(spec) == expected
+
+@pytest.mark.parametrize('spec', ['', '>=', '^latest', '1.2,>=x', '~', '>=1.2,,<2'])
+def test_invalid_spec(spec):
+    """
+    Invalid ranges are rejected.
+    """
+    with pytest.raises(VersionSpecException):
+        parse_spec(spec)
+
+@pytest.mark.parametrize('version, spec, expected', [
+    ((0, 0, 3, ()), '^0.0.3', True),
+    ((0, 0, 4, ()), '^0.0.3', False),
+    ((0, 1, 0, ()), '^0.0.3', False),
+    ((0, 0, 4, (u'rc', 1)), '^0.0.3', False),
+    ((1, 9, 9, ()), '^1.2.3', True),
+    ((2, 0, 0, ()), '^1.2.3', False),
+    ((1, 2, 9, ()), '~1.2.3', True),
+    ((1, 3, 0, ()), '~1.2.3', False)
+])
+def test_matches_spec(version, spec, expected):
+    """
+    Range bounds are exact.
+    """
+    assert matches_spec(version, parse_spec(spec)) == expected
+
+def test_sort_order():
+    """
+    Tags without version come first, pre-releases before releases and
+    version parts are compared as numbers.
+    """
+    assert VersionIndex(reversed(__tags__)).versions == ['untagged'] + [tag for tag in __tags__ if tag != 'untagged']
+
+@pytest.mark.parametrize('tags, spec, expected', [
+    (__tags__, 'latest', 'v3.0'),
+    (['1.0.0', '2.0.0-rc.1'], 'latest', '1.0.0'),
+    (['2.0.0-rc.1'], 'latest', '2.0.0-rc.1'),
+    ([], 'latest', None),
+    (__tags__, 'untagged', 'untagged'),
+    (__tags__, '^1.2', '1.10.0'),
+    (__tags__, '^0.0.2', '0.0.2'),
+    (__tags__, '~0.0.2', '0.0.3'),
+    (__tags__, '^4', None)
+])
+def test_resolve(tags, spec, expected):
+    """
+    Exact tags, 'latest' and ranges are resolved to one version.
+    """
+    assert VersionIndex(tags).resolve(spec) == expected